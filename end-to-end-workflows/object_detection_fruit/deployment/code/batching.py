@@ -0,0 +1,314 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import queue
+import asyncio
+import threading
+import numpy as np
+import tritonclient.grpc as grpcclient
+from tritonclient.utils import np_to_triton_dtype
+from concurrent.futures import Future, ThreadPoolExecutor
+from optparse import OptionParser
+from deploy import OUTPUT_NAMES, split_detections
+from preprocessing import list_images, load_image
+
+
+# marks that collect() did not take a request meant for the next batch, None is the close sentinel
+_EMPTY = object()
+
+
+"""
+Coalesces single image requests from any number of threads or coroutines into batches. A batch is sent once
+it holds max_batch_size images or its first image has waited max_delay seconds since it was submitted,
+whichever comes first. infer_batch gets a stacked [N, 3, H, W] array and returns one result per image, which
+is handed to the future of the request it came from. Up to max_in_flight batches are dispatched at once;
+images of different sizes go into different batches.
+"""
+
+
+class MicroBatcher:
+    def __init__(self, infer_batch, max_batch_size=8, max_delay=0.005, max_in_flight=2):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.dispatcher = ThreadPoolExecutor(max_in_flight)
+        self.batches, self.images = 0, 0
+        self.closed = False
+        # closed is checked and requests are queued under one lock, so nothing is queued after the sentinel
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, image):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self.requests.put((image, future, time.perf_counter()))
+        return future
+
+    def __call__(self, image):
+        return self.submit(image).result()
+
+    async def infer_async(self, image):
+        return await asyncio.wrap_future(self.submit(image))
+
+    """
+    Returns the batch started by first and the request that ended it early, the close sentinel or an image
+    of another size, or _EMPTY. Once the deadline has passed, requests already queued still join the batch.
+    """
+
+    def collect(self, first):
+        batch = [first]
+        deadline = first[2] + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self.requests.get(timeout=timeout)
+                else:
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None or request[0].shape != first[0].shape:
+                return batch, request
+            batch.append(request)
+        return batch, _EMPTY
+
+    def run(self):
+        carry = _EMPTY
+        while True:
+            request = self.requests.get() if carry is _EMPTY else carry
+            if request is None:
+                return
+            batch, carry = self.collect(request)
+            # cancelled requests are dropped before they cost any inference
+            batch = [r for r in batch if r[1].set_running_or_notify_cancel()]
+            if batch:
+                self.slots.acquire()
+                self.batches += 1
+                self.images += len(batch)
+                self.dispatcher.submit(self.dispatch, batch)
+
+    def dispatch(self, batch):
+        try:
+            results = self.infer_batch(np.stack([image for image, _, _ in batch]))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            if len(results) != len(batch):
+                # zip would leave the futures past the shorter list waiting forever
+                e = RuntimeError(
+                    f"infer_batch returned {len(results)} results for {len(batch)} images"
+                )
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.requests.put(None)
+        self.thread.join()
+        self.dispatcher.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+"""
+Returns an infer_batch function for MicroBatcher that sends each batch to a Triton model and returns the
+detections of every image.
+"""
+
+
+def triton_infer_batch(client, model_name, score_thresh=0.0):
+    outputs = [grpcclient.InferRequestedOutput(name) for name in OUTPUT_NAMES]
+
+    def infer_batch(images):
+        datatype = np_to_triton_dtype(images.dtype)
+        inputs = [grpcclient.InferInput("input", images.shape, datatype)]
+        inputs[0].set_data_from_numpy(images)
+        result = client.infer(model_name, inputs, outputs=outputs)
+        outputs_np = {name: result.as_numpy(name) for name in OUTPUT_NAMES}
+        detections = split_detections(range(len(images)), outputs_np, score_thresh)
+        return [detections[i] for i in range(len(images))]
+
+    return infer_batch
+
+
+"""
+Parses command line options. Runs producer threads that each send images one at a time, once straight to the
+server and once through a MicroBatcher, and compares the throughput.
+"""
+
+
+def parse_input():
+    usage = "usage: batching.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d", "--image_dir", dest="image_dir", help="Directory of images to send"
+    )
+    parser.add_option(
+        "-u",
+        "--url",
+        dest="url",
+        default="0.0.0.0:9001",
+        help="Triton gRPC address",
+    )
+    parser.add_option(
+        "--model_name",
+        dest="model_name",
+        default="fasterrcnn_resnet50",
+        help="Model name in the Triton model repository",
+    )
+    parser.add_option(
+        "--producers",
+        dest="producers",
+        type="int",
+        default=8,
+        help="Threads sending one image per call",
+    )
+    parser.add_option(
+        "--requests",
+        dest="requests",
+        type="int",
+        default=200,
+        help="Images sent in total",
+    )
+    parser.add_option(
+        "-b",
+        "--max_batch_size",
+        dest="max_batch_size",
+        type="int",
+        default=8,
+        help="Largest batch the batcher sends",
+    )
+    parser.add_option(
+        "--max_delay",
+        dest="max_delay",
+        type="float",
+        default=5.0,
+        help="Milliseconds the first image of a batch may wait for more",
+    )
+    parser.add_option(
+        "--in_flight",
+        dest="in_flight",
+        type="int",
+        default=2,
+        help="Batches the batcher keeps in flight",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Images are resized to size x size before inference",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def run_producers(infer, images, num_producers, num_requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def produce(worker):
+        for i in range(worker, num_requests, num_producers):
+            start = time.perf_counter()
+            infer(images[i % len(images)])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=produce, args=(i,)) for i in range(num_producers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    options, args = parse_input()
+    if options.image_dir:
+        paths = list_images(options.image_dir)
+        images = [load_image(path, options.size) for path in paths]
+    else:
+        rng = np.random.default_rng(0)
+        shape = (3, options.size, options.size)
+        images = [rng.random(shape, dtype=np.float32) for _ in range(8)]
+
+    client = grpcclient.InferenceServerClient(url=options.url)
+    infer_batch = triton_infer_batch(client, options.model_name)
+    print(f"{options.producers} producers, {options.requests} images")
+    print(f"{'':>10}{'p50 ms':>10}{'p95 ms':>10}{'images/s':>10}{'batch':>8}")
+
+    latencies, elapsed = run_producers(
+        lambda image: infer_batch(image[np.newaxis])[0],
+        images,
+        options.producers,
+        options.requests,
+    )
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    rate = options.requests / elapsed
+    print(f"{'single':>10}{p50:>10.1f}{p95:>10.1f}{rate:>10.1f}{1:>8.1f}")
+
+    with MicroBatcher(
+        infer_batch, options.max_batch_size, options.max_delay / 1000, options.in_flight
+    ) as batcher:
+        latencies, elapsed = run_producers(
+            batcher, images, options.producers, options.requests
+        )
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    rate = options.requests / elapsed
+    mean_batch = batcher.images / batcher.batches
+    print(f"{'batched':>10}{p50:>10.1f}{p95:>10.1f}{rate:>10.1f}{mean_batch:>8.1f}")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from optparse import OptionParser
+from preprocessing import DTYPES, BatchBuffer, list_images
+
+
+"""
+Parses command line options. Compares the preprocessing deploy.py used to do per image with filling a reused
+batch buffer, on the images of a directory or on random frames.
+"""
+
+
+def parse_input():
+    usage = "usage: benchmark_preprocess.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d", "--image_dir", dest="image_dir", help="Directory of images to preprocess"
+    )
+    parser.add_option(
+        "--width",
+        dest="width",
+        type="int",
+        default=1920,
+        help="Width of the random frames used without --image_dir",
+    )
+    parser.add_option(
+        "--height",
+        dest="height",
+        type="int",
+        default=1080,
+        help="Height of the random frames used without --image_dir",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Images are resized to size x size",
+    )
+    parser.add_option(
+        "--batch_sizes",
+        dest="batch_sizes",
+        default="1,4,8",
+        help="Comma separated batch sizes",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=20,
+        help="Timed batches per configuration",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def legacy_batch(images, size):
+    batch = []
+    for image_bgr in images:
+        image_bgr = cv2.resize(image_bgr, (size, size))
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        image = np.float32(image_rgb)
+        image = image / 255
+        image = np.moveaxis(image, -1, 0)  # HWC to CHW
+        batch.append(np.float32(image[np.newaxis, :]))
+    return np.concatenate(batch)
+
+
+def measure(fill, iterations):
+    fill()  # warm up
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fill()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fill()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return 1000 * float(np.median(times)), peak / 1024**2
+
+
+def main():
+    options, args = parse_input()
+    if options.image_dir:
+        images = [cv2.imread(path) for path in list_images(options.image_dir)]
+    else:
+        rng = np.random.default_rng(0)
+        shape = (options.height, options.width, 3)
+        images = [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(8)]
+
+    height, width = images[0].shape[:2]
+    print(f"{width}x{height} to {options.size}x{options.size}")
+    print(f"{'method':>18}{'batch':>6}{'ms/batch':>10}{'ms/image':>10}{'alloc MB':>10}")
+    for batch_size in [int(b) for b in options.batch_sizes.split(",")]:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        methods = {"legacy": lambda: legacy_batch(batch, options.size)}
+        for dtype in DTYPES:
+            for letterbox in (False, True):
+                buffer = BatchBuffer(batch_size, options.size, DTYPES[dtype], letterbox)
+
+                def fill(buffer=buffer):
+                    for row, image in enumerate(batch):
+                        buffer.put(row, image)
+
+                name = f"buffer {dtype}" + (" letterbox" if letterbox else "")
+                methods[name] = fill
+        for name, fill in methods.items():
+            ms, peak = measure(fill, options.iterations)
+            print(
+                f"{name:>18}{batch_size:>6}{ms:>10.1f}{ms / batch_size:>10.2f}"
+                f"{peak:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
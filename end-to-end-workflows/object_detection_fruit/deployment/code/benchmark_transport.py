@@ -0,0 +1,182 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import numpy as np
+import tritonclient.grpc as grpcclient
+from optparse import OptionParser
+from deploy import PipelinedClient, open_shared_memory
+from standin_server import StandInServicer, serve
+
+
+TRANSPORTS = ["grpc", "shm"]
+
+
+"""
+Parses command line options. Without --url a stand-in server is started in this process, which answers with
+fake detections so the numbers are dominated by moving the tensors.
+"""
+
+
+def parse_input():
+    usage = "usage: benchmark_transport.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-u",
+        "--url",
+        dest="url",
+        help="Benchmark against this server instead of a local stand-in",
+    )
+    parser.add_option(
+        "-p",
+        "--port",
+        dest="port",
+        type="int",
+        default=9150,
+        help="Port for the local stand-in server",
+    )
+    parser.add_option(
+        "--model_name",
+        dest="model_name",
+        default="fasterrcnn_resnet50",
+        help="Model name in the Triton model repository",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Image size of the sent batches",
+    )
+    parser.add_option(
+        "--batch_sizes",
+        dest="batch_sizes",
+        default="1,4",
+        help="Comma separated batch sizes",
+    )
+    parser.add_option(
+        "--in_flight",
+        dest="in_flight",
+        type="int",
+        default=1,
+        help="Requests kept in flight, 1 measures plain request latency",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=50,
+        help="Timed requests per configuration",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+"""
+Sends iterations requests through the pipeline and returns the latencies of the successful ones, the errors
+of the failed ones and the elapsed time. Failed requests are not latency samples and do not count towards
+the throughput.
+"""
+
+
+def run_requests(pipeline, images, iterations):
+    latencies, errors = [], []
+
+    def collect(wait):
+        for _, latency, _, error in pipeline.completed(wait):
+            if error is None:
+                latencies.append(latency)
+            else:
+                errors.append(error)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        pipeline.submit([i] * len(images), images)
+        collect(wait=False)
+    collect(wait=True)
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    options, args = parse_input()
+    server = None
+    url = options.url
+    if url is None:
+        server = serve(StandInServicer(options.model_name), options.port)
+        url = f"localhost:{options.port}"
+
+    batch_sizes = [int(b) for b in options.batch_sizes.split(",")]
+    rng = np.random.default_rng(0)
+    print(f"{url}, {options.size}x{options.size}, {options.in_flight} in flight")
+    print(
+        f"{'transport':>10}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}{'images/s':>10}"
+        f"{'MB/s':>10}{'errors':>8}"
+    )
+    for batch_size in batch_sizes:
+        shape = (batch_size, 3, options.size, options.size)
+        images = rng.random(shape, dtype=np.float32)
+        for transport in TRANSPORTS:
+            client = grpcclient.InferenceServerClient(url=url)
+            pool = None
+            if transport == "shm":
+                pool = open_shared_memory(
+                    client, url, options.in_flight, batch_size, options.size
+                )
+                if pool is None:
+                    continue
+            pipeline = PipelinedClient(
+                client, options.model_name, options.in_flight, pool
+            )
+            run_requests(pipeline, images, 2)  # warm up
+            latencies, errors, elapsed = run_requests(
+                pipeline, images, options.iterations
+            )
+            p50, p95 = np.nan, np.nan
+            if latencies:
+                p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+            throughput = batch_size * len(latencies) / elapsed
+            megabytes = images.nbytes * len(latencies) / elapsed / 1024**2
+            print(
+                f"{transport:>10}{batch_size:>6}{p50:>10.1f}{p95:>10.1f}"
+                f"{throughput:>10.1f}{megabytes:>10.0f}{len(errors):>8}"
+            )
+            if errors:
+                print(f"  first error: {errors[0]}")
+            if pool is not None:
+                pool.close()
+            client.close()
+
+    if server is not None:
+        server.stop(grace=1).wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,19 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import os
+import json
+import time
+import queue
+import socket
+import threading
+import collections
+import itertools
+import functools
 import tritonclient.grpc as grpcclient
+import tritonclient.utils.shared_memory as shm
+from tritonclient.utils import np_to_triton_dtype
+from concurrent.futures import ThreadPoolExecutor
 from optparse import OptionParser
 
 # load image data
@@ -38,6 +50,21 @@ import numpy as np
 from matplotlib import pyplot as plt
 
 import subprocess
+from preprocessing import DTYPES, BatchBuffer, list_images, to_original
+
+
+OUTPUT_NAMES = ["boxes", "scores", "labels", "num_detections"]
+# detections per image are padded to the architecture's limit, 300 is the largest of the supported ones
+MAX_DETECTIONS = 300
+OUTPUT_LAYOUT = {
+    "boxes": (np.float32, (MAX_DETECTIONS, 4)),
+    "scores": (np.float32, (MAX_DETECTIONS,)),
+    "labels": (np.int64, (MAX_DETECTIONS,)),
+    "num_detections": (np.int64, ()),
+}
+COMMANDS = ["bench"]
+BACKENDS = ["triton", "onnx"]
+SERVER_STAGES = ["queue", "compute_input", "compute_infer", "compute_output"]
 
 
 def install(name):
@@ -45,46 +72,529 @@ def install(name):
 
 
 """
-Parses command line options. Requires input sample png
+Parses command line options. Requires input sample png, or an image directory or camera to stream from. The
+bench command instead drives load against the endpoint for a fixed duration and reports latencies.
 """
 
 
 def parse_input():
-    usage = "usage: deploy.py [options] arg1 "
+    usage = "usage: deploy.py [bench] [options]"
     parser = OptionParser(usage)
     parser.add_option(
         "-p", "--png", dest="png", help="Directory location for single sample image."
     )
+    parser.add_option(
+        "-d",
+        "--image_dir",
+        dest="image_dir",
+        help="Stream every image of this directory through the server",
+    )
+    parser.add_option(
+        "--camera",
+        dest="camera",
+        help="Stream frames from this camera index or video URL",
+    )
+    parser.add_option(
+        "--max_frames",
+        dest="max_frames",
+        type="int",
+        help="Stop a camera stream after this many frames",
+    )
+    parser.add_option(
+        "-u",
+        "--url",
+        dest="url",
+        default="0.0.0.0:9001",
+        help="Triton gRPC address",
+    )
+    parser.add_option(
+        "--model_name",
+        dest="model_name",
+        default="fasterrcnn_resnet50",
+        help="Model name in the Triton model repository",
+    )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=4,
+        help="Images per request when streaming",
+    )
+    parser.add_option(
+        "--in_flight",
+        dest="in_flight",
+        type="int",
+        default=4,
+        help="Requests kept in flight at once when streaming",
+    )
+    parser.add_option(
+        "--workers",
+        dest="workers",
+        type="int",
+        default=4,
+        help="Threads decoding and preprocessing images when streaming",
+    )
+    parser.add_option(
+        "--shm",
+        dest="shm",
+        action="store_true",
+        default=False,
+        help="Pass streamed tensors through system shared memory when the server is on this host",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Images are resized to size x size before inference",
+    )
+    parser.add_option(
+        "--letterbox",
+        dest="letterbox",
+        action="store_true",
+        default=False,
+        help="Keep the aspect ratio when resizing streamed images and pad the borders",
+    )
+    parser.add_option(
+        "--dtype",
+        dest="dtype",
+        type="choice",
+        choices=list(DTYPES),
+        default="fp32",
+        help="Input type of the model when streaming: fp32 or fp16",
+    )
+    parser.add_option(
+        "--score_thresh",
+        dest="score_thresh",
+        type="float",
+        default=0.5,
+        help="Drop streamed detections with a lower score",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        dest="output",
+        help="Write streamed detections or bench results to this JSON file instead of printing them",
+    )
+    parser.add_option(
+        "--backend",
+        dest="backend",
+        type="choice",
+        choices=BACKENDS,
+        default="triton",
+        help="Endpoint for bench: triton (Triton or standin_server.py at --url) or onnx (local --onnx)",
+    )
+    parser.add_option(
+        "--onnx",
+        dest="onnx",
+        help="model.onnx run in process by the onnx backend",
+    )
+    parser.add_option(
+        "--concurrency",
+        dest="concurrency",
+        type="int",
+        default=1,
+        help="Requests bench keeps outstanding, each sent as soon as the previous one returns",
+    )
+    parser.add_option(
+        "--rate",
+        dest="rate",
+        type="float",
+        help="Send bench requests at this many per second instead, regardless of responses",
+    )
+    parser.add_option(
+        "--max_threads",
+        dest="max_threads",
+        type="int",
+        default=64,
+        help="Most requests outstanding at once with --rate, requests due beyond that are dropped",
+    )
+    parser.add_option(
+        "--duration",
+        dest="duration",
+        type="float",
+        default=10.0,
+        help="Seconds of measured load in bench",
+    )
+    parser.add_option(
+        "--warmup",
+        dest="warmup",
+        type="float",
+        default=2.0,
+        help="Seconds of load before bench starts measuring",
+    )
     (options, args) = parser.parse_args()
+    if args and args[0] not in COMMANDS:
+        parser.error(f"unknown command {args[0]}, choose from: {', '.join(COMMANDS)}")
     return options, args
 
 
-def main():
-    options, args = parse_input()
-    target_width, target_height = 1024, 1024
+"""
+Yields (name, source) pairs, source being an image path or an already decoded camera frame. Paths are decoded
+by the worker threads; camera frames have to be read in order here.
+"""
+
+
+def image_source(options):
+    if options.image_dir:
+        for path in list_images(options.image_dir):
+            yield os.path.basename(path), path
+        return
+
+    camera = int(options.camera) if options.camera.isdigit() else options.camera
+    capture = cv2.VideoCapture(camera)
+    frame = 0
+    try:
+        while options.max_frames is None or frame < options.max_frames:
+            ok, image_bgr = capture.read()
+            if not ok:
+                break
+            yield f"frame_{frame:06d}", image_bgr
+            frame += 1
+    finally:
+        capture.release()
+
+
+"""
+Runs the tasks of items on pool, keeping up to depth of them queued ahead, and yields the results in order.
+"""
+
+
+def prefetch(pool, items, depth):
+    pending = collections.deque()
+    for name, task in items:
+        pending.append((name, pool.submit(task)))
+        if len(pending) >= depth:
+            name, future = pending.popleft()
+            yield name, future.result()
+    while pending:
+        name, future = pending.popleft()
+        yield name, future.result()
+
+
+"""
+Preprocesses sample i straight into row i % batch_size of a ring of batch buffers. A buffer is only
+refilled after its batch was submitted, which copies the data out, as long as the ring holds more batches
+than the prefetch depth spans.
+"""
+
+
+class BufferRing:
+    def __init__(self, count, batch_size, size, dtype, letterbox):
+        self.batch_size = batch_size
+        self.buffers = [
+            BatchBuffer(batch_size, size, dtype, letterbox) for _ in range(count)
+        ]
+
+    def buffer(self, index):
+        return self.buffers[(index // self.batch_size) % len(self.buffers)]
+
+    def fill(self, index, source):
+        image_bgr = cv2.imread(source) if isinstance(source, str) else source
+        self.buffer(index).put(index % self.batch_size, image_bgr)
+
+    def tasks(self, items):
+        for index, (name, source) in enumerate(items):
+            yield name, functools.partial(self.fill, index, source)
+
+
+def to_batches(samples, ring):
+    names = []
+    for index, (name, _) in enumerate(samples):
+        names.append(name)
+        if len(names) == ring.batch_size:
+            yield names, ring.buffer(index)
+            names = []
+    if names:
+        yield names, ring.buffer(index)
+
+
+"""
+One request's worth of system shared memory: an input region sized for a full batch and an output region
+holding every output at a fixed offset. Both are registered with the server once and reused.
+"""
+
+
+class SharedMemorySlot:
+    def __init__(self, client, name, batch_size, size):
+        self.client = client
+        self.input_region = f"{name}_input"
+        self.output_region = f"{name}_output"
+        self.input_bytes = batch_size * 3 * size * size * 4
+        self.outputs, self.offsets = [], {}
+        offset = 0
+        for name, (dtype, shape) in OUTPUT_LAYOUT.items():
+            nbytes = batch_size * int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self.outputs.append(grpcclient.InferRequestedOutput(name))
+            self.outputs[-1].set_shared_memory(self.output_region, nbytes, offset)
+            self.offsets[name] = offset
+            offset += nbytes
+
+        self.handles = {}
+        try:
+            for region, nbytes in [
+                (self.input_region, self.input_bytes),
+                (self.output_region, offset),
+            ]:
+                self.handles[region] = shm.create_shared_memory_region(
+                    region, "/" + region, nbytes
+                )
+                client.register_system_shared_memory(region, "/" + region, nbytes)
+        except Exception:
+            self.close()
+            raise
+
+    def write(self, infer_input, images):
+        if images.nbytes > self.input_bytes:
+            raise ValueError(
+                f"batch of {images.nbytes} bytes does not fit the {self.input_bytes} byte region"
+            )
+        shm.set_shared_memory_region(self.handles[self.input_region], [images])
+        infer_input.set_shared_memory(self.input_region, images.nbytes)
+
+    def read(self, result):
+        outputs = {}
+        for name, (dtype, _) in OUTPUT_LAYOUT.items():
+            shape = list(result.get_output(name).shape)
+            contents = shm.get_contents_as_numpy(
+                self.handles[self.output_region], dtype, shape, self.offsets[name]
+            )
+            # copied out, the region is handed to the next request
+            outputs[name] = np.array(contents)
+        return outputs
+
+    def close(self):
+        for region, handle in self.handles.items():
+            try:
+                self.client.unregister_system_shared_memory(region)
+            except Exception:
+                pass
+            shm.destroy_shared_memory_region(handle)
+
+
+"""
+Hands out up to count slots, created on first use so the pool only takes as much /dev/shm as the requests
+actually in flight need. The first slot is created right away to find out whether the server can map it.
+"""
+
+
+class SharedMemoryPool:
+    def __init__(self, client, count, batch_size, size):
+        self.client = client
+        self.count = count
+        self.batch_size = batch_size
+        self.size = size
+        self.slots = []
+        self.free = queue.Queue()
+        self.lock = threading.Lock()
+        self.free.put(self.create_slot())
+
+    def create_slot(self):
+        name = f"fruit_{os.getpid()}_{len(self.slots)}"
+        slot = SharedMemorySlot(self.client, name, self.batch_size, self.size)
+        self.slots.append(slot)
+        return slot
+
+    def acquire(self):
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.slots) < self.count:
+                return self.create_slot()
+        return self.free.get()
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        with self.lock:
+            for slot in self.slots:
+                slot.close()
+            self.slots = []
+
+
+def is_local(url):
+    host = url.rsplit(":", 1)[0].strip("[]")
+    try:
+        address = socket.gethostbyname(host)
+        local = socket.gethostbyname_ex(socket.gethostname())[2]
+    except socket.gaierror:
+        return False
+    return address.startswith("127.") or address == "0.0.0.0" or address in local
+
+
+"""
+Returns a shared memory pool with one slot per request in flight, or None to send tensors in the gRPC
+messages: when the server is on another host or cannot map the regions, e.g. a container without --ipc=host.
+"""
+
+
+def open_shared_memory(client, url, in_flight, batch_size, size):
+    if not is_local(url):
+        print(f"{url} is not on this host, sending tensors over gRPC")
+        return None
+    try:
+        return SharedMemoryPool(client, in_flight, batch_size, size)
+    except Exception as e:
+        print(f"Shared memory not available ({e}), sending tensors over gRPC")
+        return None
+
+
+"""
+Keeps up to in_flight async gRPC requests outstanding. submit blocks while all slots are taken; responses
+arrive on gRPC threads in whatever order the server finishes them and are queued with the names of the images
+they belong to, so completed() can hand them out of order. With a shared memory pool, tensors go through its
+regions instead of the messages.
+"""
+
+
+class PipelinedClient:
+    def __init__(self, client, model_name, in_flight, pool=None):
+        self.client = client
+        self.model_name = model_name
+        self.pool = pool
+        self.slots = threading.BoundedSemaphore(in_flight)
+        self.responses = queue.Queue()
+        self.pending = 0
+        self.outputs = [grpcclient.InferRequestedOutput(name) for name in OUTPUT_NAMES]
+
+    def submit(self, names, images):
+        self.slots.acquire()
+        datatype = np_to_triton_dtype(images.dtype)
+        inputs = [grpcclient.InferInput("input", images.shape, datatype)]
+        slot, outputs = None, self.outputs
+        if self.pool is None:
+            inputs[0].set_data_from_numpy(images)
+        else:
+            slot = self.pool.acquire()
+            slot.write(inputs[0], images)
+            outputs = slot.outputs
+        self.pending += 1
+        callback = functools.partial(self.on_response, names, slot, time.perf_counter())
+        self.client.async_infer(self.model_name, inputs, callback, outputs=outputs)
+
+    def on_response(self, names, slot, start, result, error):
+        outputs = None
+        if error is None:
+            if slot is None:
+                outputs = {name: result.as_numpy(name) for name in OUTPUT_NAMES}
+            else:
+                outputs = slot.read(result)
+        if slot is not None:
+            self.pool.release(slot)
+        self.responses.put((names, time.perf_counter() - start, outputs, error))
+        self.slots.release()
+
+    def completed(self, wait=False):
+        while self.pending > 0:
+            try:
+                response = self.responses.get(block=wait)
+            except queue.Empty:
+                return
+            self.pending -= 1
+            yield response
+
+
+def split_detections(names, outputs, score_thresh, transforms=None):
+    boxes, scores, labels, counts = [outputs[name] for name in OUTPUT_NAMES]
+    detections = {}
+    for i, name in enumerate(names):
+        keep = scores[i, : counts[i]] >= score_thresh
+        image_boxes = boxes[i, : counts[i]][keep]
+        if transforms is not None:
+            image_boxes = to_original(image_boxes, transforms[i])
+        detections[name] = {
+            "boxes": image_boxes.tolist(),
+            "scores": scores[i, : counts[i]][keep].tolist(),
+            "labels": labels[i, : counts[i]][keep].tolist(),
+        }
+    return detections
+
+
+def stream(options):
+    client = grpcclient.InferenceServerClient(url=options.url)
+    shm_pool = None
+    if options.shm:
+        shm_pool = open_shared_memory(
+            client, options.url, options.in_flight, options.batch_size, options.size
+        )
+    pipeline = PipelinedClient(client, options.model_name, options.in_flight, shm_pool)
+    results, latencies, transforms = {}, [], {}
+
+    # boxes are mapped back to the pixels of each source image
+    def collect(wait):
+        for names, latency, result, error in pipeline.completed(wait):
+            if error is not None:
+                raise error
+            image_transforms = [transforms.pop(name) for name in names]
+            results.update(
+                split_detections(names, result, options.score_thresh, image_transforms)
+            )
+            latencies.append(latency)
+
+    depth = options.workers + options.batch_size * options.in_flight
+    ring = BufferRing(
+        depth // options.batch_size + 2,
+        options.batch_size,
+        options.size,
+        DTYPES[options.dtype],
+        options.letterbox,
+    )
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(options.workers) as pool:
+            samples = prefetch(pool, ring.tasks(image_source(options)), depth)
+            for names, buffer in to_batches(samples, ring):
+                transforms.update(zip(names, buffer.transforms))
+                pipeline.submit(names, buffer.batch(len(names)))
+                collect(wait=False)
+        collect(wait=True)
+    finally:
+        # after an error, requests still in flight may write to the regions until they return
+        for _ in pipeline.completed(wait=True):
+            pass
+        if shm_pool is not None:
+            shm_pool.close()
+        client.close()
+    elapsed = time.perf_counter() - start
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f)
+    else:
+        for name in sorted(results):
+            print(f"{name}: {len(results[name]['boxes'])} detections")
+    if latencies:
+        print(
+            f"{len(results)} images in {elapsed:.2f} s ({len(results) / elapsed:.1f} images/s), "
+            f"{len(latencies)} requests, median request {1000 * np.median(latencies):.1f} ms"
+        )
+
+
+def detect_single(options):
+    target_width, target_height = options.size, options.size
 
     # add path to test image
     image_sample = options.png
     image_bgr = cv2.imread(image_sample)
     image_bgr
+    buffer = BatchBuffer(1, options.size)
+    buffer.put(0, image_bgr)
+    image = buffer.array  # batch of one, float NCHW in the 0-1 range
+
     image_bgr = cv2.resize(image_bgr, (target_width, target_height))
     image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    image = np.float32(image_rgb)
-
-    # preprocessing
-    image = image / 255
-    image = np.moveaxis(image, -1, 0)  # HWC to CHW
-
-    image = image[np.newaxis, :]  # add batch dimension
-    image = np.float32(image)
 
     plt.imshow(image_rgb)
 
-    inference_server_url = "0.0.0.0:9001"
+    inference_server_url = options.url
     triton_client = grpcclient.InferenceServerClient(url=inference_server_url)
 
     # find out info about model
-    model_name = "fasterrcnn_resnet50"
+    model_name = options.model_name
     triton_client.get_model_config(model_name)
 
     # create input
@@ -92,12 +602,13 @@ def main():
     inputs = [grpcclient.InferInput(input_name, image.shape, "FP32")]
     inputs[0].set_data_from_numpy(image)
 
-    output_name = "output"
-    outputs = [grpcclient.InferRequestedOutput("output")]
+    # boxes, scores and labels are padded per image, num_detections says how many rows are valid
+    outputs = [grpcclient.InferRequestedOutput(name) for name in OUTPUT_NAMES]
 
     results = triton_client.infer(model_name, inputs, outputs=outputs)
 
-    output = results.as_numpy("output")
+    num_detections = results.as_numpy("num_detections")[0]
+    output = results.as_numpy("boxes")[0][:num_detections]
 
     # annotate
     annotated_image = image_bgr.copy()
@@ -127,5 +638,253 @@ def main():
     plt.imshow(cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB))
 
 
+class TritonEndpoint:
+    def __init__(self, options, slots):
+        self.client = grpcclient.InferenceServerClient(url=options.url)
+        self.model_name = options.model_name
+        self.outputs = [grpcclient.InferRequestedOutput(name) for name in OUTPUT_NAMES]
+        self.pool = None
+        if options.shm:
+            self.pool = open_shared_memory(
+                self.client, options.url, slots, options.batch_size, options.size
+            )
+
+    # the server time of a single request is not known, statistics() gives the totals
+    def infer(self, images):
+        datatype = np_to_triton_dtype(images.dtype)
+        inputs = [grpcclient.InferInput("input", images.shape, datatype)]
+        if self.pool is None:
+            inputs[0].set_data_from_numpy(images)
+            self.client.infer(self.model_name, inputs, outputs=self.outputs)
+            return None
+        slot = self.pool.acquire()
+        try:
+            slot.write(inputs[0], images)
+            result = self.client.infer(self.model_name, inputs, outputs=slot.outputs)
+            slot.read(result)
+        finally:
+            self.pool.release(slot)
+        return None
+
+    def statistics(self):
+        response = self.client.get_inference_statistics(self.model_name)
+        stats = response.model_stats[0].inference_stats
+        totals = {stage: getattr(stats, stage).ns for stage in SERVER_STAGES}
+        totals["success"] = stats.success.ns
+        totals["count"] = stats.success.count
+        return totals
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        self.client.close()
+
+
+class OnnxEndpoint:
+    def __init__(self, options):
+        from onnx_infer import OnnxDetector
+
+        self.detector = OnnxDetector(options.onnx)
+
+    def infer(self, images):
+        start = time.perf_counter()
+        self.detector.infer(images)
+        return time.perf_counter() - start
+
+    def statistics(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def bench_frames(options):
+    if options.image_dir:
+        return [cv2.imread(path) for path in list_images(options.image_dir)[:64]]
+    rng = np.random.default_rng(0)
+    shape = (options.size, options.size, 3)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(8)]
+
+
+"""
+Drives load until end and returns one (preprocess, request, total, server) tuple of seconds per successful
+request, the errors of failed ones and the number of dropped requests.
+Without a rate, concurrency threads each send their next request when the previous one returns. With a
+rate, requests are scheduled at fixed intervals and total counts from the scheduled time. A request whose
+time comes while max_threads requests are still outstanding is dropped rather than queued, so when the
+endpoint falls behind no backlog keeps draining after end and skews the duration and latencies.
+"""
+
+
+def run_load(endpoint, frames, options, end):
+    counter = itertools.count()
+    buffers = threading.local()
+    samples, errors = [], []
+
+    def request(scheduled):
+        if not hasattr(buffers, "buffer"):
+            buffers.buffer = BatchBuffer(
+                options.batch_size, options.size, DTYPES[options.dtype]
+            )
+        start = time.perf_counter()
+        for row in range(options.batch_size):
+            buffers.buffer.put(row, frames[next(counter) % len(frames)])
+        sent = time.perf_counter()
+        try:
+            server = endpoint.infer(buffers.buffer.array)
+        except Exception as e:
+            errors.append(e)
+            return
+        done = time.perf_counter()
+        samples.append((sent - start, done - sent, done - (scheduled or start), server))
+
+    if options.rate is None:
+
+        def closed_loop():
+            while time.perf_counter() < end:
+                request(None)
+
+        threads = [
+            threading.Thread(target=closed_loop) for _ in range(options.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, errors, 0
+
+    in_flight = threading.BoundedSemaphore(options.max_threads)
+    dropped = 0
+
+    def scheduled_request(scheduled):
+        try:
+            request(scheduled)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(options.max_threads) as pool:
+        start = time.perf_counter()
+        for k in itertools.count():
+            scheduled = start + k / options.rate
+            if scheduled >= end:
+                break
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            if not in_flight.acquire(blocking=False):
+                dropped += 1
+                continue
+            pool.submit(scheduled_request, scheduled)
+    return samples, errors, dropped
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return None
+    ms = np.array(seconds) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {"mean": ms.mean(), "p50": p50, "p90": p90, "p99": p99}
+
+
+"""
+Triton only reports cumulative server statistics, so the server time per request is the difference of two
+snapshots divided by the requests in between, and the network time is the mean request time minus that.
+Every report has the same fields, those the backend cannot measure are None.
+"""
+
+
+def bench_report(options, samples, errors, dropped, elapsed, before, after):
+    preprocess, request, total, server = [list(column) for column in zip(*samples)]
+    report = {
+        "backend": options.backend,
+        "endpoint": options.url if options.backend == "triton" else options.onnx,
+        "model_name": options.model_name,
+        "batch_size": options.batch_size,
+        "size": options.size,
+        "dtype": options.dtype,
+        "shm": bool(options.shm),
+        "concurrency": None if options.rate else options.concurrency,
+        "rate": options.rate,
+        "duration_s": elapsed,
+        "requests": len(samples),
+        "errors": len(errors),
+        "dropped": dropped,
+        "throughput": {
+            "requests_per_s": len(samples) / elapsed,
+            "images_per_s": len(samples) * options.batch_size / elapsed,
+        },
+        "latency_ms": {
+            "client_preprocess": latency_summary(preprocess),
+            "request": latency_summary(request),
+            "total": latency_summary(total),
+            "server": None,
+            "network": None,
+        },
+        "server_ms": dict.fromkeys(SERVER_STAGES + ["total"]),
+        "network_ms": None,
+    }
+    if server[0] is not None:
+        report["latency_ms"]["server"] = latency_summary(server)
+        report["latency_ms"]["network"] = latency_summary(
+            [r - s for r, s in zip(request, server)]
+        )
+    elif before is not None and after["count"] > before["count"]:
+        count = after["count"] - before["count"]
+        server_ms = {
+            stage: (after[stage] - before[stage]) / count / 1e6
+            for stage in SERVER_STAGES + ["success"]
+        }
+        server_ms["total"] = server_ms.pop("success")
+        report["server_ms"] = server_ms
+        report["network_ms"] = 1000 * np.mean(request) - server_ms["total"]
+    return report
+
+
+def bench(options):
+    frames = bench_frames(options)
+    if options.backend == "onnx":
+        endpoint = OnnxEndpoint(options)
+    else:
+        # slots are created as requests need them, with --rate only as many as are really in flight
+        slots = options.max_threads if options.rate else options.concurrency
+        endpoint = TritonEndpoint(options, slots)
+
+    try:
+        run_load(endpoint, frames, options, time.perf_counter() + options.warmup)
+        before = endpoint.statistics()
+        start = time.perf_counter()
+        samples, errors, dropped = run_load(
+            endpoint, frames, options, start + options.duration
+        )
+        elapsed = time.perf_counter() - start
+        after = endpoint.statistics()
+    finally:
+        endpoint.close()
+    if not samples:
+        raise RuntimeError(
+            f"no request completed during the benchmark: {errors[0] if errors else ''}"
+        )
+
+    report = bench_report(options, samples, errors, dropped, elapsed, before, after)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+        total = report["latency_ms"]["total"]
+        print(
+            f"{report['throughput']['images_per_s']:.1f} images/s, total latency p50 "
+            f"{total['p50']:.1f} ms, p90 {total['p90']:.1f} ms, p99 {total['p99']:.1f} ms"
+        )
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def main():
+    options, args = parse_input()
+    if args:
+        bench(options)
+    elif options.image_dir or options.camera:
+        stream(options)
+    else:
+        detect_single(options)
+
+
 if __name__ == "__main__":
     main()
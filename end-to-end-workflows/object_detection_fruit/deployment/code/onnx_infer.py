@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import time
+import cv2
+import numpy as np
+import onnxruntime as ort
+from optparse import OptionParser
+from preprocessing import BatchBuffer, list_images, load_image, to_original
+
+
+OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+COMMANDS = ["run", "benchmark"]
+
+
+"""
+Parses command line options. The first argument picks the command: run detects objects in every image of a
+directory, benchmark measures latency and throughput over batch sizes and thread counts.
+"""
+
+
+def parse_input():
+    usage = "usage: onnx_infer.py run|benchmark [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-m", "--model", dest="model", help="Location of the exported model.onnx"
+    )
+    parser.add_option(
+        "-d", "--image_dir", dest="image_dir", help="Directory of images to detect on"
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        dest="output",
+        help="Write the detections of run to this JSON file instead of printing them",
+    )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=1,
+        help="Images per inference call for run",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Images are resized to size x size before inference",
+    )
+    parser.add_option(
+        "--score_thresh",
+        dest="score_thresh",
+        type="float",
+        default=0.5,
+        help="Drop detections with a lower score in run",
+    )
+    parser.add_option(
+        "--intra_threads",
+        dest="intra_threads",
+        type="int",
+        default=0,
+        help="Threads used inside an operator, 0 lets ONNX Runtime decide",
+    )
+    parser.add_option(
+        "--inter_threads",
+        dest="inter_threads",
+        type="int",
+        default=0,
+        help="Threads running independent operators in parallel, 0 or 1 runs them sequentially",
+    )
+    parser.add_option(
+        "--optimization",
+        dest="optimization",
+        type="choice",
+        choices=list(OPTIMIZATION_LEVELS),
+        default="all",
+        help="Graph optimization level: " + ", ".join(OPTIMIZATION_LEVELS),
+    )
+    parser.add_option(
+        "--batch_sizes",
+        dest="batch_sizes",
+        default="1,2,4",
+        help="Comma separated batch sizes for benchmark",
+    )
+    parser.add_option(
+        "--threads",
+        dest="threads",
+        default="1,2,4",
+        help="Comma separated intra-op thread counts for benchmark",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=20,
+        help="Timed inference calls per benchmark configuration",
+    )
+    (options, args) = parser.parse_args()
+    if len(args) != 1 or args[0] not in COMMANDS:
+        parser.error(f"choose a command: {', '.join(COMMANDS)}")
+    return options, args
+
+
+"""
+Wraps an ONNX Runtime CPU session for a model exported by export.py: float [N, 3, H, W] images in, padded
+boxes, scores and labels plus num_detections out. Detections are returned per image with the padding
+removed.
+"""
+
+
+class OnnxDetector:
+    def __init__(
+        self, model_path, intra_threads=0, inter_threads=0, optimization="all"
+    ):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_threads
+        options.inter_op_num_threads = inter_threads
+        if inter_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = OPTIMIZATION_LEVELS[optimization]
+        # the loop over the batch makes the optimizer warn about every weight used inside it
+        options.log_severity_level = 3
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def infer(self, images):
+        boxes, scores, labels, counts = self.session.run(
+            ["boxes", "scores", "labels", "num_detections"], {self.input_name: images}
+        )
+        return [
+            {"boxes": boxes[i, :n], "scores": scores[i, :n], "labels": labels[i, :n]}
+            for i, n in enumerate(counts)
+        ]
+
+
+def run(options):
+    detector = OnnxDetector(
+        options.model,
+        options.intra_threads,
+        options.inter_threads,
+        options.optimization,
+    )
+    paths = list_images(options.image_dir)
+    buffer = BatchBuffer(options.batch_size, options.size)
+    results = {}
+    for start in range(0, len(paths), options.batch_size):
+        batch_paths = paths[start : start + options.batch_size]
+        for row, path in enumerate(batch_paths):
+            buffer.put(row, cv2.imread(path))
+        images = buffer.batch(len(batch_paths))
+        for row, detections in enumerate(detector.infer(images)):
+            keep = detections["scores"] >= options.score_thresh
+            # boxes in source image pixels, as deploy.py stream reports them
+            boxes = to_original(detections["boxes"][keep], buffer.transforms[row])
+            results[os.path.basename(batch_paths[row])] = {
+                "boxes": boxes.tolist(),
+                "scores": detections["scores"][keep].tolist(),
+                "labels": detections["labels"][keep].tolist(),
+            }
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f)
+    else:
+        for name, detections in results.items():
+            print(f"{name}: {len(detections['boxes'])} detections")
+
+
+def percentiles(latencies):
+    return np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+
+
+def benchmark(options):
+    batch_sizes = [int(b) for b in options.batch_sizes.split(",")]
+    images = None
+    if options.image_dir:
+        # every batch is tiled from the first images, so only the largest batch is decoded
+        paths = list_images(options.image_dir)[: max(batch_sizes)]
+        images = np.stack([load_image(path, options.size) for path in paths])
+    rng = np.random.default_rng(0)
+
+    print(f"{options.model}, {options.size}x{options.size}, {options.optimization}")
+    print(
+        f"{'threads':>8}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'images/s':>10}"
+    )
+    for threads in [int(t) for t in options.threads.split(",")]:
+        detector = OnnxDetector(
+            options.model, threads, options.inter_threads, options.optimization
+        )
+        for batch_size in batch_sizes:
+            if images is None:
+                shape = (batch_size, 3, options.size, options.size)
+                batch = rng.random(shape, dtype=np.float32)
+            else:
+                batch = np.resize(images, (batch_size,) + images.shape[1:])
+            detector.infer(batch)  # warm up
+            latencies = []
+            for _ in range(options.iterations):
+                start = time.perf_counter()
+                detector.infer(batch)
+                latencies.append(time.perf_counter() - start)
+            p50, p95, p99 = percentiles(latencies)
+            throughput = batch_size * len(latencies) / sum(latencies)
+            print(
+                f"{threads:>8}{batch_size:>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+                f"{throughput:>10.2f}"
+            )
+
+
+def main():
+    options, args = parse_input()
+    if args[0] == "run":
+        run(options)
+    else:
+        benchmark(options)
+
+
+if __name__ == "__main__":
+    main()
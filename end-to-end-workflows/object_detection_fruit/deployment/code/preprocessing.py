@@ -0,0 +1,136 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import cv2
+import numpy as np
+
+
+DTYPES = {"fp32": np.float32, "fp16": np.float16}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# grey, as commonly used for letterbox borders
+LETTERBOX_FILL = 114 / 255
+# numpy converts float32 to float16 slowly, a table lookup per uint8 value is faster
+FP16_TABLE = (np.arange(256, dtype=np.float32) / 255).astype(np.float16)
+TABLE_ROWS = 64
+
+
+def letterbox_geometry(height, width, size):
+    scale = min(size / width, size / height)
+    new_width, new_height = round(width * scale), round(height * scale)
+    return new_width, new_height, (size - new_width) // 2, (size - new_height) // 2
+
+
+"""
+Preprocesses one BGR uint8 image into out, a [3, size, size] float view of a batch buffer: the resize writes
+into scratch, a uint8 [size, size, 3] array, and a single multiply (a table lookup for fp16) reads scratch
+through a channel reversed, transposed view, scales to 0-1 and casts into out. No full size float
+intermediate is allocated. With letterbox the aspect ratio is kept and the borders are filled with
+LETTERBOX_FILL. Returns (scale_x, scale_y, left, top) to map boxes back to the original image.
+"""
+
+
+def preprocess_into(image_bgr, out, scratch=None, letterbox=False):
+    size = out.shape[1]
+    height, width = image_bgr.shape[:2]
+    if letterbox:
+        new_width, new_height, left, top = letterbox_geometry(height, width, size)
+    else:
+        new_width, new_height, left, top = size, size, 0, 0
+
+    if scratch is not None:
+        scratch = scratch[:new_height, :new_width]
+    resized = cv2.resize(image_bgr, (new_width, new_height), dst=scratch)
+    region = out[:, top : top + new_height, left : left + new_width]
+    source = resized.transpose(2, 0, 1)[::-1]  # HWC BGR to CHW RGB, a view
+    if out.dtype == np.float16:
+        # in row blocks, take converts its indices to a temporary int64 array
+        for row in range(0, new_height, TABLE_ROWS):
+            rows = slice(row, row + TABLE_ROWS)
+            np.take(FP16_TABLE, source[:, rows], out=region[:, rows], mode="clip")
+    else:
+        np.multiply(
+            source, np.float32(1 / 255), out=region, dtype=np.float32, casting="unsafe"
+        )
+
+    if letterbox:
+        out[:, :top] = LETTERBOX_FILL
+        out[:, top + new_height :] = LETTERBOX_FILL
+        out[:, top : top + new_height, :left] = LETTERBOX_FILL
+        out[:, top : top + new_height, left + new_width :] = LETTERBOX_FILL
+    return new_width / width, new_height / height, left, top
+
+
+def preprocess(image_bgr, size):
+    image = np.empty((3, size, size), dtype=np.float32)
+    preprocess_into(image_bgr, image)
+    return image
+
+
+def load_image(path, size):
+    return preprocess(cv2.imread(path), size)
+
+
+def list_images(image_dir):
+    return sorted(
+        os.path.join(image_dir, name)
+        for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def to_original(boxes, transform):
+    scale_x, scale_y, left, top = transform
+    offset = np.array([left, top, left, top], dtype=np.float32)
+    scale = np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+    return (np.asarray(boxes, dtype=np.float32) - offset) / scale
+
+
+"""
+A reusable [batch_size, 3, size, size] input batch with a uint8 resize scratch per row, so rows can be
+filled from different threads. transforms[row] maps the boxes of that row back to its source image.
+"""
+
+
+class BatchBuffer:
+    def __init__(self, batch_size, size, dtype=np.float32, letterbox=False):
+        self.array = np.empty((batch_size, 3, size, size), dtype=dtype)
+        self.scratch = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+        self.letterbox = letterbox
+        self.transforms = [None] * batch_size
+
+    def put(self, row, image_bgr):
+        self.transforms[row] = preprocess_into(
+            image_bgr, self.array[row], self.scratch[row], self.letterbox
+        )
+
+    def batch(self, count):
+        return self.array[:count]
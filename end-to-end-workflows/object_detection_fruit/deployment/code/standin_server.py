@@ -0,0 +1,423 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import mmap
+import time
+import random
+import threading
+import contextlib
+import collections
+import grpc
+import numpy as np
+from concurrent import futures
+from optparse import OptionParser
+from tritonclient.grpc import model_config_pb2, service_pb2, service_pb2_grpc
+from deploy import MAX_DETECTIONS
+
+
+INPUT = ("input", "FP32", [-1, 3, -1, -1])
+OUTPUTS = [
+    ("boxes", "FP32", [-1, MAX_DETECTIONS, 4]),
+    ("scores", "FP32", [-1, MAX_DETECTIONS]),
+    ("labels", "INT64", [-1, MAX_DETECTIONS]),
+    ("num_detections", "INT64", [-1]),
+]
+DTYPES = {"FP32": np.float32, "FP16": np.float16, "INT64": np.int64}
+
+
+"""
+Parses command line options. Without --onnx the server answers with fake detections: one box per image over
+its center whose score is the mean pixel value, so clients can check which image a response belongs to.
+"""
+
+
+def parse_input():
+    usage = "usage: standin_server.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-p", "--port", dest="port", type="int", default=9001, help="gRPC port"
+    )
+    parser.add_option(
+        "--model_name",
+        dest="model_name",
+        default="fasterrcnn_resnet50",
+        help="Name the model is served under",
+    )
+    parser.add_option(
+        "--onnx",
+        dest="onnx",
+        help="Run this model.onnx with ONNX Runtime instead of returning fake detections",
+    )
+    parser.add_option(
+        "--input_dtype",
+        dest="input_dtype",
+        type="choice",
+        choices=["FP32", "FP16"],
+        default="FP32",
+        help="Input type of the served model, FP16 as for a half precision TensorRT engine",
+    )
+    parser.add_option(
+        "--delay",
+        dest="delay",
+        type="float",
+        default=0.0,
+        help="Milliseconds each request takes on top of inference",
+    )
+    parser.add_option(
+        "--jitter",
+        dest="jitter",
+        type="float",
+        default=0.0,
+        help="Up to this many random milliseconds added per request, so responses overtake each other",
+    )
+    parser.add_option(
+        "--image_delay",
+        dest="image_delay",
+        type="float",
+        default=0.0,
+        help="Milliseconds added per image of a batch",
+    )
+    parser.add_option(
+        "--instances",
+        dest="instances",
+        type="int",
+        default=0,
+        help="Requests executed at once like Triton model instances, 0 for no limit",
+    )
+    parser.add_option(
+        "--workers",
+        dest="workers",
+        type="int",
+        default=8,
+        help="Requests handled concurrently",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def fake_detections(images):
+    batch, _, height, width = images.shape
+    boxes = np.zeros((batch, MAX_DETECTIONS, 4), dtype=np.float32)
+    boxes[:, 0] = [width / 4, height / 4, width * 3 / 4, height * 3 / 4]
+    scores = np.zeros((batch, MAX_DETECTIONS), dtype=np.float32)
+    scores[:, 0] = images.reshape(batch, -1).mean(axis=1)
+    labels = np.zeros((batch, MAX_DETECTIONS), dtype=np.int64)
+    labels[:, 0] = 1
+    return boxes, scores, labels, np.ones(batch, dtype=np.int64)
+
+
+class OnnxModel:
+    def __init__(self, model_path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def __call__(self, images):
+        return self.session.run([name for name, _, _ in OUTPUTS], {INPUT[0]: images})
+
+
+"""
+Implements the part of Triton's KServe v2 gRPC service the fruit clients use, with the input and output
+signature of the exported detector. It lets the clients be tested without a GPU or a Triton container.
+"""
+
+
+class StandInServicer(service_pb2_grpc.GRPCInferenceServiceServicer):
+    def __init__(
+        self,
+        model_name,
+        model=fake_detections,
+        delay=0.0,
+        jitter=0.0,
+        image_delay=0.0,
+        instances=0,
+        input_datatype=INPUT[1],
+    ):
+        self.model_name = model_name
+        self.model = model
+        self.delay = delay
+        self.jitter = jitter
+        self.image_delay = image_delay
+        self.input_datatype = input_datatype
+        # a GPU runs one batch per model instance at a time, which is what makes batching pay off
+        self.instances = threading.Semaphore(instances) if instances > 0 else None
+        self.regions = {}
+        self.regions_lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.stats_lock = threading.Lock()
+
+    def ServerLive(self, request, context):
+        return service_pb2.ServerLiveResponse(live=True)
+
+    def ServerReady(self, request, context):
+        return service_pb2.ServerReadyResponse(ready=True)
+
+    def ModelReady(self, request, context):
+        return service_pb2.ModelReadyResponse(ready=request.name == self.model_name)
+
+    def check_model(self, name, context):
+        if name != self.model_name:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"unknown model '{name}'")
+
+    def ModelMetadata(self, request, context):
+        self.check_model(request.name, context)
+        tensor = service_pb2.ModelMetadataResponse.TensorMetadata
+        return service_pb2.ModelMetadataResponse(
+            name=self.model_name,
+            versions=["1"],
+            platform="onnxruntime_onnx",
+            inputs=[
+                tensor(name=INPUT[0], datatype=self.input_datatype, shape=INPUT[2])
+            ],
+            outputs=[
+                tensor(name=name, datatype=datatype, shape=shape)
+                for name, datatype, shape in OUTPUTS
+            ],
+        )
+
+    def ModelConfig(self, request, context):
+        self.check_model(request.name, context)
+        config = model_config_pb2.ModelConfig(
+            name=self.model_name, platform="onnxruntime_onnx"
+        )
+        return service_pb2.ModelConfigResponse(config=config)
+
+    """
+    System shared memory: clients name a POSIX shared memory object (a file in /dev/shm) as a region and then
+    point inputs and outputs at byte ranges of it instead of sending the data in the message.
+    """
+
+    def SystemSharedMemoryRegister(self, request, context):
+        path = os.path.join("/dev/shm", request.key.lstrip("/"))
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"cannot open {path}: {e}")
+        try:
+            region = mmap.mmap(fd, request.offset + request.byte_size)
+        finally:
+            os.close(fd)
+        with self.regions_lock:
+            if request.name in self.regions:
+                region.close()
+                context.abort(
+                    grpc.StatusCode.ALREADY_EXISTS,
+                    f"shared memory region '{request.name}' already registered",
+                )
+            self.regions[request.name] = (request.key, request.offset, region)
+        return service_pb2.SystemSharedMemoryRegisterResponse()
+
+    def SystemSharedMemoryUnregister(self, request, context):
+        with self.regions_lock:
+            names = [request.name] if request.name else list(self.regions)
+            for name in names:
+                if name in self.regions:
+                    self.regions.pop(name)[2].close()
+        return service_pb2.SystemSharedMemoryUnregisterResponse()
+
+    def SystemSharedMemoryStatus(self, request, context):
+        response = service_pb2.SystemSharedMemoryStatusResponse()
+        with self.regions_lock:
+            for name, (key, offset, region) in self.regions.items():
+                if not request.name or request.name == name:
+                    response.regions[name].name = name
+                    response.regions[name].key = key
+                    response.regions[name].offset = offset
+                    response.regions[name].byte_size = len(region) - offset
+        return response
+
+    def shared_memory(self, parameters, nbytes, context):
+        name = parameters["shared_memory_region"].string_param
+        byte_size = parameters["shared_memory_byte_size"].int64_param
+        offset = parameters["shared_memory_offset"].int64_param
+        with self.regions_lock:
+            if name not in self.regions:
+                context.abort(
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    f"shared memory region '{name}' is not registered",
+                )
+            _, region_offset, region = self.regions[name]
+        start = region_offset + offset
+        if nbytes > byte_size or start + nbytes > len(region):
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"{nbytes} bytes do not fit in shared memory region '{name}'",
+            )
+        return memoryview(region)[start : start + nbytes]
+
+    def read_input(self, request, context):
+        if len(request.inputs) != 1 or request.inputs[0].name != INPUT[0]:
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT, "expected one input 'input'"
+            )
+        tensor = request.inputs[0]
+        if (
+            tensor.datatype != self.input_datatype
+            or len(tensor.shape) != 4
+            or tensor.shape[1] != 3
+        ):
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"expected {self.input_datatype} input of shape [-1, 3, -1, -1], got "
+                f"{tensor.datatype} "
+                f"{list(tensor.shape)}",
+            )
+        shape = tuple(tensor.shape)
+        dtype = np.dtype(DTYPES[self.input_datatype])
+        if "shared_memory_region" in tensor.parameters:
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            data = self.shared_memory(tensor.parameters, nbytes, context)
+        else:
+            data = request.raw_input_contents[0]
+        images = np.frombuffer(data, dtype=dtype).reshape(shape)
+        return images.astype(np.float32, copy=False)
+
+    def ModelInfer(self, request, context):
+        self.check_model(request.model_name, context)
+        start = time.perf_counter_ns()
+        with self.instances or contextlib.nullcontext():
+            times = [time.perf_counter_ns()]
+            images = self.read_input(request, context)
+            times.append(time.perf_counter_ns())
+            outputs = dict(zip([name for name, _, _ in OUTPUTS], self.model(images)))
+            wait = self.delay + self.image_delay * len(images)
+            wait += random.uniform(0, self.jitter)
+            if wait > 0:
+                time.sleep(wait / 1000)
+            times.append(time.perf_counter_ns())
+        response = self.write_outputs(request, outputs, context)
+        times.append(time.perf_counter_ns())
+
+        with self.stats_lock:
+            self.stats["count"] += 1
+            self.stats["inferences"] += len(images)
+            self.stats["success"] += times[3] - start
+            self.stats["queue"] += times[0] - start
+            self.stats["compute_input"] += times[1] - times[0]
+            self.stats["compute_infer"] += times[2] - times[1]
+            self.stats["compute_output"] += times[3] - times[2]
+        return response
+
+    def write_outputs(self, request, outputs, context):
+        requested = {output.name: output for output in request.outputs}
+        response = service_pb2.ModelInferResponse(
+            model_name=self.model_name, model_version="1", id=request.id
+        )
+        for name, datatype, _ in OUTPUTS:
+            if requested and name not in requested:
+                continue
+            value = np.ascontiguousarray(outputs[name], dtype=DTYPES[datatype])
+            tensor = response.outputs.add(
+                name=name, datatype=datatype, shape=value.shape
+            )
+            parameters = requested[name].parameters if requested else {}
+            if "shared_memory_region" in parameters:
+                view = self.shared_memory(parameters, value.nbytes, context)
+                view[:] = memoryview(value).cast("B")
+                for key in parameters:
+                    tensor.parameters[key].CopyFrom(parameters[key])
+            else:
+                response.raw_output_contents.append(value.tobytes())
+        return response
+
+    """
+    Cumulative request counts and times like Triton's model statistics, which load generators subtract
+    between two calls to get the server side time per request.
+    """
+
+    def ModelStatistics(self, request, context):
+        if request.name:
+            self.check_model(request.name, context)
+        with self.stats_lock:
+            stats = dict(self.stats)
+        count = stats.get("count", 0)
+        duration = service_pb2.StatisticDuration
+        inference_stats = service_pb2.InferStatistics(
+            **{
+                key: duration(count=count, ns=stats.get(key, 0))
+                for key in [
+                    "success",
+                    "queue",
+                    "compute_input",
+                    "compute_infer",
+                    "compute_output",
+                ]
+            }
+        )
+        model_stats = service_pb2.ModelStatistics(
+            name=self.model_name,
+            version="1",
+            inference_count=stats.get("inferences", 0),
+            execution_count=count,
+            inference_stats=inference_stats,
+        )
+        return service_pb2.ModelStatisticsResponse(model_stats=[model_stats])
+
+
+def serve(servicer, port, workers=8):
+    # full resolution batches are far above gRPC's 4 MB default message size
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=workers),
+        options=[
+            ("grpc.max_send_message_length", -1),
+            ("grpc.max_receive_message_length", -1),
+        ],
+    )
+    service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(servicer, server)
+    server.add_insecure_port(f"0.0.0.0:{port}")
+    server.start()
+    return server
+
+
+def main():
+    options, args = parse_input()
+    model = OnnxModel(options.onnx) if options.onnx else fake_detections
+    servicer = StandInServicer(
+        options.model_name,
+        model,
+        options.delay,
+        options.jitter,
+        options.image_delay,
+        options.instances,
+        options.input_dtype,
+    )
+    server = serve(servicer, options.port, options.workers)
+    print(f"Serving {options.model_name} on port {options.port}")
+    server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
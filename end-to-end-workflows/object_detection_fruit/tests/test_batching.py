@@ -0,0 +1,161 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import queue
+import socket
+import threading
+import numpy as np
+import pytest
+import tritonclient.grpc as grpcclient
+from batching import MicroBatcher, triton_infer_batch
+from standin_server import StandInServicer, serve
+
+
+def image(value, size=4):
+    return np.full((3, size, size), value, dtype=np.float32)
+
+
+def sum_batch(images):
+    return list(images.reshape(len(images), -1).sum(axis=1))
+
+
+def test_close_flushes_partial_batches():
+    batcher = MicroBatcher(sum_batch, max_batch_size=8, max_delay=10.0)
+    futures = [batcher.submit(image(i)) for i in range(3)]
+    futures.append(batcher.submit(image(3, size=2)))
+
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive(), "close() did not return"
+    assert [f.result(timeout=0) for f in futures] == [0, 48, 96, 36]
+    assert batcher.batches == 2
+
+
+def test_submit_racing_close_is_served(monkeypatch):
+    class SlowQueue(queue.Queue):
+        # holds the first image between submit's closed check and the put, where close() could slip in
+        def __init__(self):
+            super().__init__()
+            self.entered, self.release = threading.Event(), threading.Event()
+
+        def put(self, item, *args, **kwargs):
+            if item is not None and not self.entered.is_set():
+                self.entered.set()
+                self.release.wait(timeout=5)
+            super().put(item, *args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(queue, "Queue", SlowQueue)
+        batcher = MicroBatcher(sum_batch, max_batch_size=8, max_delay=10.0)
+    futures = []
+    submitter = threading.Thread(
+        target=lambda: futures.append(batcher.submit(image(1)))
+    )
+    submitter.start()
+    assert batcher.requests.entered.wait(timeout=5)
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    time.sleep(0.1)
+    batcher.requests.release.set()
+    submitter.join(timeout=5)
+    closer.join(timeout=5)
+    assert not closer.is_alive(), "close() did not return"
+    assert futures[0].result(timeout=5) == 48
+
+
+def test_results_go_to_their_callers():
+    with MicroBatcher(sum_batch, max_batch_size=4, max_delay=0.01) as batcher:
+        futures = [batcher.submit(image(i)) for i in range(10)]
+        assert [f.result(timeout=5) for f in futures] == [48.0 * i for i in range(10)]
+
+
+def test_errors_reach_every_caller():
+    def fail(images):
+        raise ValueError("bad batch")
+
+    with MicroBatcher(fail, max_batch_size=2, max_delay=0.01) as batcher:
+        futures = [batcher.submit(image(i)) for i in range(2)]
+        for future in futures:
+            assert isinstance(future.exception(timeout=5), ValueError)
+
+
+def test_missing_results_fail_every_caller():
+    with MicroBatcher(
+        lambda images: sum_batch(images)[:-1], max_batch_size=3, max_delay=1.0
+    ) as batcher:
+        futures = [batcher.submit(image(i)) for i in range(3)]
+        for future in futures:
+            assert isinstance(future.exception(timeout=5), RuntimeError)
+
+
+def test_half_precision_batches():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    server = serve(StandInServicer("fruit", input_datatype="FP16"), port)
+    client = grpcclient.InferenceServerClient(f"localhost:{port}")
+    try:
+        infer_batch = triton_infer_batch(client, "fruit")
+        with MicroBatcher(infer_batch, max_batch_size=2, max_delay=0.01) as batcher:
+            futures = [
+                batcher.submit(image(i / 4).astype(np.float16)) for i in range(4)
+            ]
+            scores = [float(f.result(timeout=5)["scores"][0]) for f in futures]
+    finally:
+        client.close()
+        server.stop(None)
+    assert scores == pytest.approx([i / 4 for i in range(4)])
+
+
+def test_delay_counts_from_submission():
+    # two batches run at once, a third full batch waits for a free slot. The request behind it was
+    # submitted long ago, so it has to be sent as soon as a slot frees up, not wait another max_delay
+    infer_time, max_delay = 0.3, 0.2
+    started = {}
+
+    def slow(images):
+        started[int(images[0, 0, 0, 0])] = time.perf_counter()
+        time.sleep(infer_time)
+        return sum_batch(images)
+
+    with MicroBatcher(
+        slow, max_batch_size=2, max_delay=max_delay, max_in_flight=2
+    ) as b:
+        start = time.perf_counter()
+        futures = [b.submit(image(i)) for i in range(7)]
+        for future in futures:
+            future.result(timeout=5)
+
+    assert started[0] - start < 0.1
+    assert started[4] - start < infer_time + 0.1
+    assert started[6] - start < infer_time + 0.1
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import time
+import numpy as np
+import deploy
+
+
+def parse(monkeypatch, *extra):
+    monkeypatch.setattr(sys, "argv", ["deploy.py", "bench", *extra])
+    options, args = deploy.parse_input()
+    return options
+
+
+def keys(report):
+    return {
+        name: sorted(value) if isinstance(value, dict) else None
+        for name, value in report.items()
+    }
+
+
+def test_report_schema_is_fixed(monkeypatch):
+    # preprocess, request, total and server seconds per request
+    timed = [(0.001, 0.010, 0.011, None), (0.002, 0.020, 0.022, None)]
+    stats = dict.fromkeys(deploy.SERVER_STAGES + ["success"], 0)
+    after = {stage: 1e6 for stage in deploy.SERVER_STAGES + ["success"]}
+    triton = deploy.bench_report(
+        parse(monkeypatch, "--concurrency", "2"),
+        timed,
+        [],
+        0,
+        1.0,
+        {**stats, "count": 0},
+        {**after, "count": 2},
+    )
+    no_stats = deploy.bench_report(
+        parse(monkeypatch, "--rate", "5"), timed, [], 3, 1.0, None, None
+    )
+    onnx = deploy.bench_report(
+        parse(monkeypatch, "--backend", "onnx", "--onnx", "model.onnx"),
+        [(p, r, t, 0.005) for p, r, t, _ in timed],
+        [],
+        0,
+        1.0,
+        None,
+        None,
+    )
+    assert keys(triton) == keys(no_stats) == keys(onnx)
+    assert triton["server_ms"]["total"] == 0.5
+    assert triton["latency_ms"]["server"] is None
+    assert set(no_stats["server_ms"].values()) == {None}
+    assert no_stats["network_ms"] is None
+    assert no_stats["dropped"] == 3
+    assert onnx["latency_ms"]["server"]["mean"] == 5.0
+    assert onnx["server_ms"]["total"] is None
+
+
+class SlowEndpoint:
+    def infer(self, images):
+        time.sleep(0.1)
+        return 0.1
+
+
+def test_rate_drops_requests_beyond_max_threads(monkeypatch):
+    options = parse(monkeypatch, "--rate", "100", "--max_threads", "2", "--size", "8")
+    frames = [np.zeros((8, 8, 3), dtype=np.uint8)]
+    end = time.perf_counter() + 0.5
+    samples, errors, dropped = deploy.run_load(SlowEndpoint(), frames, options, end)
+    # nothing queued behind the two outstanding requests drains after end
+    assert time.perf_counter() - end < 0.15
+    assert not errors
+    assert len(samples) <= 12
+    assert dropped + len(samples) == 50
+    assert max(total for _, _, total, _ in samples) < 0.15
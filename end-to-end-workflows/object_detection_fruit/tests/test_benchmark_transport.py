@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import socket
+import numpy as np
+import tritonclient.grpc as grpcclient
+import benchmark_transport
+from deploy import PipelinedClient
+from standin_server import StandInServicer, fake_detections, serve
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def fails_on_bright_batches(images):
+    # the test sends batches of zeros and of ones
+    if images.mean() > 0.5:
+        raise RuntimeError("model failed")
+    return fake_detections(images)
+
+
+def test_failed_requests_are_not_latency_samples():
+    port = free_port()
+    server = serve(StandInServicer("fruit", fails_on_bright_batches), port)
+    client = grpcclient.InferenceServerClient(url=f"localhost:{port}")
+    try:
+        pipeline = PipelinedClient(client, "fruit", 2)
+        images = np.zeros((2, 3, 16, 16), dtype=np.float32)
+        latencies, errors, _ = benchmark_transport.run_requests(pipeline, images, 3)
+        assert len(latencies) == 3 and errors == []
+        latencies, errors, _ = benchmark_transport.run_requests(pipeline, images + 1, 3)
+        assert latencies == [] and len(errors) == 3
+        assert "model failed" in str(errors[0])
+    finally:
+        client.close()
+        server.stop(None)
+
+
+def test_report_counts_errors(monkeypatch, capsys):
+    def broken(images):
+        raise RuntimeError("model failed")
+
+    port = free_port()
+    server = serve(StandInServicer("fruit", broken), port)
+    argv = ["benchmark_transport.py", "-u", f"localhost:{port}", "--model_name"]
+    argv += ["fruit", "--size", "16", "--batch_sizes", "2", "--iterations", "4"]
+    monkeypatch.setattr(sys, "argv", argv)
+    try:
+        benchmark_transport.main()
+    finally:
+        server.stop(None)
+    out = capsys.readouterr().out
+    rows = [line.split() for line in out.splitlines() if line.split()[:1] == ["grpc"]]
+    # no successful requests, so no latency and no throughput
+    assert rows == [["grpc", "2", "nan", "nan", "0.0", "0", "4"]]
+    assert "first error" in out and "model failed" in out
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import numpy as np
+import pytest
+import torch
+from box_store import (
+    BoxStore,
+    build_box_store,
+    parse_frame_boxes,
+    read_frame_boxes,
+    save_arrays,
+    open_arrays,
+)
+from manifest import frame_paths, load_manifest
+from synthetic_dataset import BBOX_DTYPE, write_dataset
+from train import FruitDataset
+
+
+def test_store_matches_per_frame_files(tmp_path):
+    write_dataset(str(tmp_path), 8, sizes=((64, 48),), max_boxes=4, seed=3)
+    store = BoxStore(build_box_store(str(tmp_path)))
+    frames = load_manifest(str(tmp_path))
+    assert len(store) == len(frames)
+    for i, row in enumerate(frames):
+        _, box_path, label_path = frame_paths(str(tmp_path), row)
+        boxes, labels = read_frame_boxes(box_path, label_path)
+        assert store.offsets[i + 1] - store.offsets[i] == len(boxes)
+        np.testing.assert_array_equal(store[i][0], boxes)
+        np.testing.assert_array_equal(store[i][1], labels)
+    assert store.offsets[-1] == len(store.boxes)
+
+
+def test_dataset_targets_match_with_and_without_store(tmp_path):
+    write_dataset(str(tmp_path), 5, sizes=((32, 32),), seed=4)
+    plain = FruitDataset(str(tmp_path), None)
+    build_box_store(str(tmp_path))
+    packed = FruitDataset(str(tmp_path), None)
+    assert plain.box_store is None and packed.box_store is not None
+    for i in range(len(plain)):
+        for key in ["boxes", "labels", "area"]:
+            assert torch.equal(plain[i][1][key], packed[i][1][key])
+
+
+def test_drops_empty_boxes_and_maps_semantic_ids():
+    dat = np.zeros(3, dtype=BBOX_DTYPE)
+    dat[0] = (7, 0, 0, 10, 10, 0.0)
+    dat[1] = (3, 5, 5, 5, 9, 0.0)  # no width
+    dat[2] = (3, 1, 2, 3, 4, 0.0)
+    labels = {"7": {"class": "kiwi"}, "3": {"class": "apple"}}
+    boxes, classes = parse_frame_boxes(dat, labels)
+    np.testing.assert_array_equal(boxes, [[0, 0, 10, 10], [1, 2, 3, 4]])
+    np.testing.assert_array_equal(classes, [3, 1])
+
+
+def test_unknown_semantic_ids_raise():
+    dat = np.zeros(2, dtype=BBOX_DTYPE)
+    dat[0] = (3, 0, 0, 10, 10, 0.0)
+    dat[1] = (5, 1, 2, 3, 4, 0.0)
+    # 5 sorts between the known ids and 9 past them, neither may borrow a neighbour's class
+    for labels in [
+        {"3": {"class": "apple"}, "7": {"class": "kiwi"}},
+        {"3": {"class": "apple"}},
+    ]:
+        with pytest.raises(KeyError, match=r"Semantic ids \[5\]"):
+            parse_frame_boxes(dat, labels)
+    with pytest.raises(KeyError, match=r"Semantic ids \[3, 5\]"):
+        parse_frame_boxes(dat, {})
+    dat[1]["semanticId"] = 9
+    with pytest.raises(KeyError, match=r"Semantic ids \[9\]"):
+        parse_frame_boxes(dat, {"3": {"class": "apple"}, "7": {"class": "kiwi"}})
+
+
+def test_unused_non_fruit_labels_are_ignored():
+    dat = np.zeros(1, dtype=BBOX_DTYPE)
+    dat[0] = (7, 0, 0, 10, 10, 0.0)
+    labels = {"0": {"class": "BACKGROUND"}, "1": {"class": "UNLABELLED"}}
+    labels["7"] = {"class": "lime"}
+    boxes, classes = parse_frame_boxes(dat, labels)
+    np.testing.assert_array_equal(classes, [4])
+    dat[0]["semanticId"] = 1
+    with pytest.raises(KeyError, match="class UNLABELLED"):
+        parse_frame_boxes(dat, labels)
+
+
+def test_rejects_a_store_of_other_frames(tmp_path):
+    write_dataset(str(tmp_path), 4, sizes=((16, 16),))
+    store_path = build_box_store(str(tmp_path))
+    frames = load_manifest(str(tmp_path))
+    with pytest.raises(ValueError, match="does not match"):
+        BoxStore(store_path, frames[1:])
+
+
+def test_arrays_round_trip_including_empty(tmp_path):
+    path = str(tmp_path / "arrays.npy")
+    arrays = [np.arange(5), np.zeros((0, 4), dtype=np.float32), np.ones((2, 3))]
+    save_arrays(path, arrays)
+    for saved, loaded in zip(arrays, open_arrays(path, 3)):
+        assert loaded.dtype == saved.dtype
+        np.testing.assert_array_equal(loaded, saved)
+    assert not os.path.exists(path + ".tmp")
@@ -0,0 +1,144 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import random
+import numpy as np
+import pytest
+import torch
+from checkpoint import (
+    AsyncCheckpointer,
+    ResumableBatchSampler,
+    load_checkpoint,
+    load_scaler_state,
+    set_rng_state,
+    snapshot,
+)
+from train import create_grad_scaler
+
+
+def batch_sampler():
+    sampler = torch.utils.data.DistributedSampler(
+        range(20), num_replicas=1, rank=0, shuffle=True
+    )
+    return ResumableBatchSampler(torch.utils.data.BatchSampler(sampler, 3, False))
+
+
+def test_resume_skips_trained_batches_once():
+    sampler = batch_sampler()
+    sampler.set_epoch(4)
+    epoch = list(sampler)
+    assert len(epoch) == 7
+
+    resumed = batch_sampler()
+    resumed.set_epoch(4)
+    resumed.skip = 5
+    assert len(resumed) == 2
+    assert list(resumed) == epoch[5:]
+    # the next epoch starts from the beginning again
+    assert list(resumed) == epoch
+
+
+def test_resume_through_a_multiprocess_loader():
+    sampler = batch_sampler()
+    sampler.set_epoch(1)
+    expected = [i for batch in list(sampler)[3:] for i in batch]
+    sampler.skip = 3
+    loader = torch.utils.data.DataLoader(
+        list(range(20)), batch_sampler=sampler, num_workers=2
+    )
+    assert [int(i) for batch in loader for i in batch] == expected
+
+
+def test_checkpoint_restores_training_state(tmp_path):
+    model = torch.nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+    model(torch.ones(1, 3)).sum().backward()
+    optimizer.step()
+    checkpointer = AsyncCheckpointer(str(tmp_path))
+    checkpointer.save(snapshot(model, optimizer, create_grad_scaler("fp32"), 2, 7, 41))
+    expected = (torch.rand(3), np.random.rand(), random.random())
+    checkpointer.close()
+
+    state = load_checkpoint(str(tmp_path), torch.device("cpu"))
+    assert (state["epoch"], state["step"], state["global_step"]) == (2, 7, 41)
+    restored = torch.nn.Linear(3, 2)
+    restored.load_state_dict(state["model"])
+    assert torch.equal(restored.weight, model.weight)
+    assert "momentum_buffer" in state["optimizer"]["state"][0]
+    set_rng_state(state["rng"])
+    assert torch.equal(torch.rand(3), expected[0])
+    assert (np.random.rand(), random.random()) == expected[1:]
+    assert not os.path.exists(tmp_path / "checkpoint.pt.tmp")
+
+
+def fp16_scaler():
+    # enabled without a GPU, as train.py creates it for fp16 on CUDA
+    return torch.amp.GradScaler("cpu", init_scale=1024.0)
+
+
+def test_resume_across_a_precision_change(tmp_path):
+    model = torch.nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    for saved, resumed in [
+        (create_grad_scaler("bf16"), fp16_scaler()),
+        (fp16_scaler(), create_grad_scaler("fp32")),
+    ]:
+        checkpointer = AsyncCheckpointer(str(tmp_path))
+        checkpointer.save(snapshot(model, optimizer, saved, 1, 0, 5))
+        checkpointer.close()
+        state = load_checkpoint(str(tmp_path), torch.device("cpu"))
+        with pytest.warns(UserWarning, match="different precision"):
+            load_scaler_state(resumed, state["scaler"])
+        if resumed.is_enabled():
+            assert resumed.get_scale() == 1024.0
+
+    # the same precision restores the loss scale
+    saved = fp16_scaler()
+    saved.scale(torch.ones(1))
+    saved.update(new_scale=8.0)
+    resumed = fp16_scaler()
+    load_scaler_state(resumed, saved.state_dict())
+    assert resumed.get_scale() == 8.0
+
+
+def test_missing_checkpoint_and_write_errors(tmp_path):
+    assert load_checkpoint(str(tmp_path), torch.device("cpu")) is None
+    checkpointer = AsyncCheckpointer(str(tmp_path))
+    # the rename fails when the target is a directory
+    os.makedirs(checkpointer.path)
+    checkpointer.save({"step": 1})
+    with pytest.raises(OSError):
+        checkpointer.wait()
+    os.rmdir(checkpointer.path)
+    checkpointer.save({"step": 2})
+    checkpointer.close()
+    assert load_checkpoint(str(tmp_path), torch.device("cpu")) == {"step": 2}
@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+import torch
+from box_store import NUM_CLASSES
+from compilation import compile_failures, compile_model, script_model, uncompile
+from models import create_model
+
+
+def tiny_model():
+    model = torch.nn.Module()
+    model.backbone = torch.nn.Linear(4, 2)
+    return model
+
+
+def test_compiled_submodule_matches_eager():
+    torch.manual_seed(0)
+    model = tiny_model()
+    x = torch.rand(3, 4)
+    expected = model.backbone(x)
+    assert compile_model(model) == ["backbone"]
+    assert torch.allclose(model.backbone(x), expected, atol=1e-6)
+    assert compile_failures(model) == []
+
+
+def test_compile_targets_of_the_detectors():
+    faster = create_model("fasterrcnn_mobilenet_v3_large_fpn", NUM_CLASSES, False)
+    assert compile_model(faster) == [
+        "backbone",
+        "rpn.head",
+        "roi_heads.box_head",
+        "roi_heads.box_predictor",
+    ]
+    retina = create_model("retinanet_resnet50_fpn", NUM_CLASSES, False)
+    assert compile_model(retina) == ["backbone", "head"]
+
+
+def test_failed_compilation_falls_back_to_eager(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("unsupported op")
+
+    monkeypatch.setattr(torch, "compile", lambda fn, mode: broken)
+    model = tiny_model()
+    x = torch.rand(3, 4)
+    compile_model(model)
+    with pytest.warns(UserWarning, match="Compiling backbone failed"):
+        out = model.backbone(x)
+    assert torch.equal(out, model.backbone.eager_forward(x))
+    assert compile_failures(model) == ["backbone"]
+
+
+def test_uncompile_restores_the_eager_module(tmp_path):
+    model = tiny_model()
+    compile_model(model)
+    uncompile(model)
+    assert "forward" not in model.backbone.__dict__
+    assert not hasattr(model.backbone, "compile_failed")
+    # the compiled closures would not pickle
+    torch.save(model, tmp_path / "model.pth")
+
+
+def test_scripted_model_matches_eager():
+    torch.manual_seed(0)
+    model = create_model(
+        "fasterrcnn_mobilenet_v3_large_fpn", NUM_CLASSES, False, image_size=64
+    ).eval()
+    # keep the low scoring detections of the random weights so there is something to compare
+    model.roi_heads.score_thresh = 0.0
+    images = [torch.rand(3, 48, 64)]
+    with torch.no_grad():
+        expected = model(images)[0]
+        compile_model(model)
+        scripted = script_model(model)
+        _, detections = scripted(images)
+    assert len(expected["boxes"]) > 0
+    for key in ["boxes", "scores", "labels"]:
+        assert torch.allclose(detections[0][key], expected[key])
@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import json
+import socket
+import pytest
+import torch
+import torch.multiprocessing as mp
+import train
+from distributed import cleanup, init_distributed, is_main_process
+from synthetic_dataset import write_dataset
+
+WORLD_SIZE = 2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def run_rank(rank, port, data_dir, out_dir, extra):
+    os.environ.update(
+        MASTER_ADDR="localhost",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        LOCAL_RANK=str(rank),
+        WORLD_SIZE=str(WORLD_SIZE),
+    )
+    sys.argv = ["train.py", "-d", data_dir, "-o", "model.pth", "-e", "1", "-b", "2"]
+    options, _ = train.parse_input()
+    for name in extra:
+        setattr(options, name, True)
+    rank, world_size, device = init_distributed("gloo")
+    data_loader, _, _ = train.create_data_loaders(options, rank, world_size)
+    ids = [int(t["image_id"]) for _, targets in data_loader for t in targets]
+
+    # every rank steps on different data, DDP averages the gradients so the weights stay equal
+    torch.manual_seed(rank)
+    model = torch.nn.Linear(4, 1)
+    torch.nn.init.zeros_(model.weight)
+    ddp = torch.nn.parallel.DistributedDataParallel(model)
+    optimizer = torch.optim.SGD(ddp.parameters(), lr=0.1)
+    ddp(torch.randn(8, 4)).sum().backward()
+    optimizer.step()
+
+    result = {"ids": ids, "weight": model.weight.tolist(), "main": is_main_process()}
+    with open(os.path.join(out_dir, f"rank{rank}.json"), "w") as f:
+        json.dump(result, f)
+    cleanup()
+
+
+@pytest.mark.parametrize("extra", [[], ["bucket"]])
+def test_ranks_split_the_train_split(tmp_path, extra):
+    data_dir = str(tmp_path / "data")
+    write_dataset(data_dir, 20, sizes=((16, 16),))
+    # forked ranks, spawned ones would make their dataloader workers import torch again
+    mp.start_processes(
+        run_rank,
+        args=(free_port(), data_dir, str(tmp_path), extra),
+        nprocs=WORLD_SIZE,
+        start_method="fork",
+    )
+    results = []
+    for rank in range(WORLD_SIZE):
+        with open(tmp_path / f"rank{rank}.json") as f:
+            results.append(json.load(f))
+
+    train_frames = set(
+        train.split_dataset(train.FruitDataset(data_dir, None))[0].indices
+    )
+    assert len(results[0]["ids"]) == len(results[1]["ids"])
+    assert set(results[0]["ids"]) | set(results[1]["ids"]) == train_frames
+    if not extra:
+        # 14 train frames, 7 per rank
+        assert len(results[0]["ids"]) == 7
+        assert not set(results[0]["ids"]) & set(results[1]["ids"])
+    assert results[0]["weight"] == results[1]["weight"]
+    assert [result["main"] for result in results] == [True, False]
+
+
+def test_plain_launch_runs_as_rank_zero(monkeypatch):
+    monkeypatch.delenv("WORLD_SIZE", raising=False)
+    rank, world_size, device = init_distributed()
+    assert (rank, world_size) == (0, 1)
+    assert is_main_process()
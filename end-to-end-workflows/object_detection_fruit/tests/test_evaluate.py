@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import io
+import numpy as np
+import pytest
+import torch
+from pycocotools.coco import COCO
+from pycocotools.cocoeval import COCOeval
+from evaluate import DetectionAccumulator, evaluate_detections
+
+NUM_CLASSES = 3
+
+
+def random_boxes(rng, n, size=256):
+    xy = rng.uniform(0, size * 0.8, (n, 2))
+    wh = rng.uniform(8, size * 0.3, (n, 2))
+    return np.concatenate([xy, xy + wh], axis=1).astype(np.float32)
+
+
+"""
+Ground truth for a handful of images and detections made of jittered copies of it (some of which miss, some
+with the wrong class) plus unmatched false positives, all with distinct random scores.
+"""
+
+
+def make_fixture(seed, num_images=12):
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(num_images):
+        n = rng.integers(0, 6)
+        gt_boxes = random_boxes(rng, n)
+        gt_labels = rng.integers(1, NUM_CLASSES, n)
+        jitter = rng.normal(0, rng.uniform(0.5, 6), gt_boxes.shape)
+        det_boxes = gt_boxes + jitter.astype(np.float32)
+        det_boxes[:, 2:] = np.maximum(det_boxes[:, 2:], det_boxes[:, :2] + 1)
+        det_labels = np.where(rng.random(n) < 0.1, NUM_CLASSES - gt_labels, gt_labels)
+        extra = rng.integers(0, 4)
+        det_boxes = np.concatenate([det_boxes, random_boxes(rng, extra)])
+        det_labels = np.concatenate([det_labels, rng.integers(1, NUM_CLASSES, extra)])
+        det_scores = rng.random(len(det_labels)).astype(np.float32)
+        images.append((gt_boxes, gt_labels, det_boxes, det_labels, det_scores))
+    return images
+
+
+def evaluate_fixture(images):
+    acc = DetectionAccumulator(len(images))
+    for gt_boxes, gt_labels, det_boxes, det_labels, det_scores in images:
+        detection = {
+            "boxes": torch.from_numpy(det_boxes),
+            "scores": torch.from_numpy(det_scores),
+            "labels": torch.from_numpy(det_labels),
+        }
+        target = {
+            "boxes": torch.from_numpy(gt_boxes),
+            "labels": torch.from_numpy(gt_labels),
+        }
+        acc.add([detection], [target])
+    return evaluate_detections(acc, NUM_CLASSES)
+
+
+def xywh(box):
+    return [
+        float(box[0]),
+        float(box[1]),
+        float(box[2] - box[0]),
+        float(box[3] - box[1]),
+    ]
+
+
+def coco_fixture(images):
+    dataset = {"images": [], "annotations": [], "categories": []}
+    dataset["categories"] = [{"id": c} for c in range(1, NUM_CLASSES)]
+    results = []
+    for image_id, (gt_boxes, gt_labels, det_boxes, det_labels, det_scores) in enumerate(
+        images
+    ):
+        dataset["images"].append({"id": image_id})
+        for box, label in zip(gt_boxes, gt_labels):
+            dataset["annotations"].append(
+                {
+                    "id": len(dataset["annotations"]) + 1,
+                    "image_id": image_id,
+                    "category_id": int(label),
+                    "bbox": xywh(box),
+                    "area": float((box[2] - box[0]) * (box[3] - box[1])),
+                    "iscrowd": 0,
+                }
+            )
+        for box, label, score in zip(det_boxes, det_labels, det_scores):
+            results.append(
+                {
+                    "image_id": image_id,
+                    "category_id": int(label),
+                    "bbox": xywh(box),
+                    "score": float(score),
+                }
+            )
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco = COCO()
+        coco.dataset = dataset
+        coco.createIndex()
+        coco_eval = COCOeval(coco, coco.loadRes(results), "bbox")
+        coco_eval.evaluate()
+        coco_eval.accumulate()
+        coco_eval.summarize()
+    return coco_eval.stats
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_pycocotools(seed):
+    images = make_fixture(seed)
+    metrics = evaluate_fixture(images)
+    stats = coco_fixture(images)
+    # stats are AP@[.5:.95], AP@.5, AP@.75 and, at index 8, AR@100 over all areas
+    assert metrics["mAP"] == pytest.approx(stats[0], abs=1e-6)
+    assert metrics["mAP50"] == pytest.approx(stats[1], abs=1e-6)
+    assert metrics["mAP75"] == pytest.approx(stats[2], abs=1e-6)
+    assert metrics["recall"] == pytest.approx(stats[8], abs=1e-6)
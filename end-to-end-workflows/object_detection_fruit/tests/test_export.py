@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import pytest
+import torch
+import torchvision
+import export
+from box_store import NUM_CLASSES
+from models import ARCHITECTURES, create_model
+from synthetic_dataset import write_dataset
+
+SIZE = 96
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    model = torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(
+        weights=None, weights_backbone=None, num_classes=3, min_size=SIZE, max_size=SIZE
+    )
+    return model.eval()
+
+
+def test_check_passes(monkeypatch, model, tmp_path):
+    torch.save(model, tmp_path / "model.pth")
+    argv = ["export.py", "-d", str(tmp_path / "model.pth"), "-o", str(tmp_path)]
+    argv += ["--size", str(SIZE), "--check"]
+    monkeypatch.setattr(sys, "argv", argv)
+    # exits non zero when the ONNX detections do not match PyTorch
+    export.main()
+    assert (tmp_path / "model.onnx").exists()
+
+
+def test_check_catches_mismatch(model, tmp_path):
+    onnx_path = str(tmp_path / "model.onnx")
+    export.export_onnx(model, onnx_path, SIZE)
+    batches = export.check_batches(None, SIZE)
+    assert export.check_parity(model, onnx_path, batches)
+    with torch.no_grad():
+        model.roi_heads.box_predictor.bbox_pred.bias += 5.0
+    assert not export.check_parity(model, onnx_path, batches)
+
+
+def test_check_without_detections_fails(model, tmp_path):
+    model.roi_heads.score_thresh = 1.1
+    onnx_path = str(tmp_path / "model.onnx")
+    export.export_onnx(model, onnx_path, SIZE)
+    assert not export.check_parity(model, onnx_path, export.check_batches(None, SIZE))
+
+
+def test_check_batches_resize_frames(tmp_path):
+    write_dataset(str(tmp_path), 3, sizes=((80, 60), (120, 200)), seed=1)
+    first, second = export.check_batches(str(tmp_path), SIZE)
+    assert first.shape == (2, 3, SIZE, SIZE)
+    assert second.shape == (1, 3, SIZE // 2, SIZE * 3 // 4)
+    assert first.dtype == torch.float and 0 <= first.min() and first.max() <= 1
+
+
+def score_layers(model):
+    if hasattr(model, "roi_heads"):
+        return [model.rpn.head.cls_logits, model.roi_heads.box_predictor.cls_score]
+    head = model.head.classification_head
+    if hasattr(head, "cls_logits"):
+        return [head.cls_logits]
+    return [layers[-1] for layers in head.module_list]
+
+
+"""
+Untrained detectors are a poor parity test: the MobileNet features vanish with the initial BatchNorm
+statistics and the classification layers start near a constant, so every score ties and top-k and NMS pick
+arbitrarily among equal detections, or nothing passes the score threshold at all. Recomputes the BatchNorm
+statistics on images and draws the classification layers so their logits vary by about one unit.
+"""
+
+
+def spread_scores(model, images):
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.reset_running_stats()
+            module.momentum = None
+    norms = {layer: [] for layer in score_layers(model)}
+
+    def record(layer, inputs, output):
+        dim = 1 if inputs[0].dim() == 4 else -1
+        norms[layer].append(inputs[0].norm(dim=dim).mean())
+
+    hooks = [layer.register_forward_hook(record) for layer in norms]
+    generator = torch.Generator().manual_seed(1)
+    with torch.no_grad():
+        model.backbone.train()
+        model.backbone(model.transform(list(images))[0].tensors)
+        model.eval()
+        model(list(images))
+        for layer, layer_norms in norms.items():
+            weight = torch.randn(layer.weight.shape, generator=generator)
+            layer.weight.copy_(weight * 0.5 / max(layer_norms))
+            layer.bias.zero_()
+    for hook in hooks:
+        hook.remove()
+
+
+@pytest.mark.parametrize("arch", list(ARCHITECTURES))
+def test_every_architecture_exports_with_parity(arch, tmp_path):
+    torch.manual_seed(0)
+    model = create_model(arch, NUM_CLASSES, pretrained=False, image_size=SIZE)
+    batches = export.check_batches(None, SIZE)
+    spread_scores(model, batches[0])
+    with torch.no_grad():
+        scores = model(list(batches[0]))[0]["scores"]
+    assert len(scores) > 0 and len(torch.unique(scores)) > len(scores) // 2
+
+    onnx_path = str(tmp_path / "model.onnx")
+    export.export_onnx(model, onnx_path, SIZE)
+    assert export.check_parity(model, onnx_path, batches)
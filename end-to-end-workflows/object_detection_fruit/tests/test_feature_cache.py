@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import pytest
+import torch
+import torchvision
+from box_store import NUM_CLASSES
+from feature_cache import (
+    CachedFeatureHeads,
+    FeatureCacheDataset,
+    build_feature_cache,
+    dequantize_features,
+    is_cache_valid,
+)
+from image_io import prepare_images
+from synthetic_dataset import write_dataset
+import train
+from train import FruitDataset, collate_fn, split_dataset
+
+
+def train_split(root, num_frames):
+    write_dataset(str(root), num_frames, sizes=((64, 64),), seed=num_frames)
+    return split_dataset(FruitDataset(str(root), None))[0]
+
+
+def small_model():
+    torch.manual_seed(0)
+    return torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(
+        weights=None,
+        weights_backbone=None,
+        num_classes=NUM_CLASSES,
+        min_size=64,
+        max_size=64,
+    )
+
+
+def test_cache_is_tied_to_its_dataset(tmp_path):
+    model = small_model()
+    first = train_split(tmp_path / "first", 10)
+    second = train_split(tmp_path / "second", 6)
+    loader = torch.utils.data.DataLoader(first, batch_size=4, collate_fn=collate_fn)
+    cache_dir = str(tmp_path / "cache")
+    build_feature_cache(model, loader, cache_dir, torch.device("cpu"))
+    assert is_cache_valid(cache_dir, model, first)
+    assert not is_cache_valid(cache_dir, model, second)
+    # same directory, different frames
+    assert not is_cache_valid(cache_dir, model, split_dataset(first.dataset)[1])
+
+
+def test_cached_features_are_int8_and_close(tmp_path):
+    model = small_model()
+    train = train_split(tmp_path / "data", 8)
+    loader = torch.utils.data.DataLoader(train, batch_size=4, collate_fn=collate_fn)
+    cache_dir = str(tmp_path / "cache")
+    build_feature_cache(model, loader, cache_dir, torch.device("cpu"))
+    dataset = FeatureCacheDataset(cache_dir)
+    features, target = dataset[1]
+
+    img, expected_target = train[1]
+    with torch.no_grad():
+        image_list, _ = model.transform(prepare_images([img], "cpu"))
+        expected = model.backbone(image_list.tensors)
+    for name, feature in expected.items():
+        assert features[name].dtype == torch.int8
+        restored = dequantize_features(
+            features[name][None], features["scales"][name][None]
+        )
+        # within one quantization step of every channel
+        step = features["scales"][name][None, :, None, None]
+        assert torch.all((restored - feature).abs() <= step * 0.5 + 1e-6)
+    assert len(target["boxes"]) == len(expected_target["boxes"])
+
+    heads = CachedFeatureHeads(model, dataset.padded_size).train()
+    batch, targets = collate_fn([dataset[0], dataset[1]])
+    losses = heads(list(batch), list(targets))
+    assert all(torch.isfinite(loss) for loss in losses.values())
+
+
+@pytest.mark.parametrize(
+    "extra, error",
+    [
+        (["--bucket"], "cannot be combined with --bucket"),
+        (["--sampling", "balanced"], "cannot be combined with --sampling"),
+        (["--image_cache", "/tmp/cache"], "cannot be combined with --image_cache"),
+        (["--follow"], "without --follow or -s"),
+        (["--arch", "retinanet_resnet50_fpn"], "needs one of"),
+    ],
+)
+def test_head_only_rejects_options_it_would_ignore(monkeypatch, extra, error):
+    argv = ["train.py", "-d", "data", "-o", "model.pth", "--head_only"] + extra
+    monkeypatch.setattr(sys, "argv", argv)
+    options, _ = train.parse_input()
+    with pytest.raises(ValueError, match=error):
+        train.check_head_only(options)
+
+
+def test_head_only_accepts_its_defaults(monkeypatch):
+    argv = ["train.py", "-d", "data", "-o", "model.pth", "--head_only"]
+    monkeypatch.setattr(sys, "argv", argv)
+    train.check_head_only(train.parse_input()[0])
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import torch
+from image_cache import ImageCache
+from synthetic_dataset import write_dataset
+from train import FruitDataset
+
+
+def test_cached_frames_keep_their_own_scale(tmp_path):
+    # both sizes downscale to 32x32, with different box scales
+    write_dataset(str(tmp_path / "data"), 6, sizes=((64, 64), (32, 32)), seed=2)
+    dataset = FruitDataset(str(tmp_path / "data"), None, target_size=32)
+    dataset.image_cache = ImageCache(str(tmp_path / "cache"), 6, (32, 32, 3), 2**20)
+    decoded = [dataset[i] for i in range(len(dataset))]
+    for i, (img, target) in enumerate(decoded):
+        assert dataset.image_cache.get(i) is not None
+        cached_img, cached_target = dataset[i]
+        assert torch.equal(cached_img, img)
+        assert torch.equal(cached_target["boxes"], target["boxes"])
+
+
+def frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_static_cache_keeps_its_first_frames(tmp_path):
+    # room for two frames of a five frame dataset
+    cache = ImageCache(str(tmp_path), 5, (4, 6, 3), 2 * 72)
+    assert cache.capacity == 2
+    for idx in range(5):
+        cache.put(idx, frame(idx))
+    assert cache.get(0)[0][0, 0, 0] == 0
+    assert cache.get(1)[0][0, 0, 0] == 1
+    # frames past the capacity are never admitted, so they cannot evict 0 and 1
+    assert cache.get(2) is None and cache.get(3) is None
+
+
+def test_direct_cache_evicts_by_slot(tmp_path):
+    cache = ImageCache(str(tmp_path), 5, (4, 6, 3), 2 * 72, policy="direct")
+    cache.put(0, frame(10), (0.5, 0.25))
+    image, scale = cache.get(0)
+    assert image[0, 0, 0] == 10 and scale == (0.5, 0.25)
+    cache.put(2, frame(20))
+    assert cache.get(0) is None
+    assert cache.get(2)[0][0, 0, 0] == 20
+    assert cache.get(1) is None
+
+
+def test_cache_survives_reopening_and_skips_other_shapes(tmp_path):
+    cache = ImageCache(str(tmp_path), 3, (4, 6, 3), 2**20, key="a")
+    cache.put(1, frame(7))
+    cache.put(2, frame(8, shape=(6, 4, 3)))
+    assert cache.get(2) is None
+
+    reopened = ImageCache(str(tmp_path), 3, (4, 6, 3), 2**20, key="a")
+    assert reopened.get(1)[0][0, 0, 0] == 7
+    # another dataset or target size starts from empty slots
+    other = ImageCache(str(tmp_path), 3, (4, 6, 3), 2**20, key="b")
+    assert other.get(1) is None
+
+
+def test_zero_capacity_cache_is_a_no_op(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), 3, (1024, 1024, 3), 1024)
+    cache.put(0, frame(1, shape=(1024, 1024, 3)))
+    assert cache.capacity == 0 and cache.get(0) is None
@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import numpy as np
+import torch
+import torchvision
+from PIL import Image
+from image_io import decode_image, prepare_images, read_image, scale_boxes, scaled_size
+from synthetic_dataset import write_dataset
+from train import FruitDataset
+
+
+def test_scaled_size_only_shrinks_the_longer_side():
+    assert scaled_size(1024, 512, 256) == (256, 128)
+    assert scaled_size(300, 600, 300) == (150, 300)
+    assert scaled_size(200, 100, 256) == (200, 100)
+    assert scaled_size(1024, 1024, None) == (1024, 1024)
+
+
+def png(width, height):
+    # the BasicWriter frames are RGBA
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 4), np.uint8)
+    data = io.BytesIO()
+    Image.fromarray(pixels, "RGBA").save(data, format="PNG")
+    return torch.frombuffer(bytearray(data.getvalue()), dtype=torch.uint8)
+
+
+def test_decode_drops_alpha_and_downscales():
+    img, scale = decode_image(png(64, 32))
+    assert img.shape == (3, 32, 64) and img.dtype == torch.uint8
+    assert scale == (1.0, 1.0)
+    img, scale = decode_image(png(64, 32), target_size=16)
+    assert img.shape == (3, 8, 16) and img.dtype == torch.uint8
+    assert scale == (0.25, 0.25)
+
+
+def test_read_image_matches_decode(tmp_path):
+    data = png(40, 20)
+    torchvision.io.write_file(str(tmp_path / "frame.png"), data)
+    img, scale = read_image(str(tmp_path / "frame.png"), 10)
+    expected, expected_scale = decode_image(data, 10)
+    assert torch.equal(img, expected) and scale == expected_scale
+
+
+def test_scale_boxes():
+    boxes = np.array([[10, 20, 30, 40]], dtype=np.float32)
+    assert scale_boxes(boxes, (1.0, 1.0)) is boxes
+    scaled = scale_boxes(boxes, (0.5, 0.25))
+    assert scaled.dtype == np.float32
+    assert scaled.tolist() == [[5, 5, 15, 10]]
+
+
+def test_prepare_images_converts_on_the_device():
+    imgs = [torch.full((3, 2, 2), 255, dtype=torch.uint8)]
+    (img,) = prepare_images(imgs, torch.device("cpu"))
+    assert img.dtype == torch.float32 and torch.all(img == 1.0)
+
+
+def test_dataset_target_size_scales_frames_and_boxes(tmp_path):
+    write_dataset(str(tmp_path), 2, sizes=((64, 32),), seed=1)
+    full = FruitDataset(str(tmp_path), None)
+    small = FruitDataset(str(tmp_path), None, target_size=32)
+    for i in range(len(full)):
+        img, target = full[i]
+        small_img, small_target = small[i]
+        assert img.shape == (3, 32, 64) and small_img.shape == (3, 16, 32)
+        assert torch.allclose(small_target["boxes"], target["boxes"] / 2)
+        assert torch.equal(small_target["labels"], target["labels"])
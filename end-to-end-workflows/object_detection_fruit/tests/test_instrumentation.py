@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import pytest
+import torch
+from instrumentation import PHASES, StepTimer, TrainingLogger, create_profiler
+
+CPU = torch.device("cpu")
+
+
+class Writer:
+    def __init__(self):
+        self.scalars = []
+
+    def add_scalar(self, tag, value, step):
+        self.scalars.append((tag, float(value), step))
+
+    def tags(self, tag):
+        return [(value, step) for name, value, step in self.scalars if name == tag]
+
+
+def run_step(timer_or_logger, sleeps):
+    # sleeps: seconds spent waiting for data, then in each phase after it
+    time.sleep(sleeps[0])
+    timer_or_logger.start_step()
+    for seconds in sleeps[1:]:
+        time.sleep(seconds)
+        timer_or_logger.mark()
+
+
+def test_timer_splits_data_wait_from_compute():
+    timer = StepTimer(CPU)
+    for _ in range(2):
+        run_step(timer, [0.05, 0.0, 0.03, 0.0, 0.0])
+        timer.end_step()
+    timings = timer.collect()
+    assert list(timings) == PHASES
+    assert timings["data"] == pytest.approx(0.05, abs=0.02)
+    assert timings["forward"] == pytest.approx(0.03, abs=0.02)
+    assert timings["h2d"] < 0.01 and timings["optimizer"] < 0.01
+    # collected steps are not counted again
+    assert timer.collect() == dict.fromkeys(PHASES, 0.0)
+
+
+def test_logger_writes_every_log_every_steps(capsys):
+    writer = Writer()
+    logger = TrainingLogger(writer, CPU, log_every=2, num_batches=3)
+    for step in range(1, 4):
+        run_step(logger, [0.0] * 5)
+        losses = {"loss_a": torch.tensor(1.0 * step), "loss_b": torch.tensor(0.5)}
+        logger.end_step(losses, 4, 0, step)
+    assert writer.tags("Loss/train") == [(1.5, 1), (2.5, 2)]
+    assert writer.tags("Loss/loss_a") == [(1.0, 1), (2.0, 2)]
+    assert [step for _, step in writer.tags("Time/data")] == [2]
+    assert "Iteration: 2/3" in capsys.readouterr().out
+
+    logger.flush(0, 3)
+    assert writer.tags("Loss/train")[-1] == (3.5, 3)
+    assert logger.global_step == 3
+    # nothing left to write
+    logger.flush(0, 3)
+    assert len(writer.tags("Loss/train")) == 3
+
+
+def test_profiler_is_optional():
+    with create_profiler(None, None, None, CPU) as profiler:
+        profiler.step()
+
+
+def test_profiler_writes_a_trace(tmp_path):
+    with create_profiler(str(tmp_path), 1, 2, CPU) as profiler:
+        for _ in range(3):
+            torch.ones(8).sum()
+            profiler.step()
+    assert any(name.endswith(".pt.trace.json") for name in os.listdir(tmp_path))
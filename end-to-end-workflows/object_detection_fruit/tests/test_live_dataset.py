@@ -0,0 +1,112 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import torch
+import live_dataset
+from live_dataset import LiveFruitDataset
+from synthetic_dataset import write_dataset
+from train import collate_fn
+
+
+def age(root, seconds):
+    past = time.time() - seconds
+    for name in os.listdir(root):
+        os.utime(os.path.join(root, name), (past, past))
+
+
+def test_admits_settled_complete_frames(tmp_path):
+    write_dataset(str(tmp_path), 4, sizes=((16, 16),))
+    age(tmp_path, 10)
+    # frame 3 is still being written
+    os.utime(tmp_path / "rgb_0003.png")
+    open(tmp_path / "bounding_box_2d_tight_0002.npy", "w").close()
+    os.remove(tmp_path / "bounding_box_2d_tight_labels_0001.json")
+    dataset = LiveFruitDataset(str(tmp_path), None, min_frames=1, settle_time=5.0)
+    dataset.set_epoch(0)
+    assert sorted(frame_id for frame_id, _ in dataset.pool) == [0]
+
+
+def test_rescans_once_per_poll_interval(tmp_path):
+    write_dataset(str(tmp_path), 2, sizes=((16, 16),))
+    age(tmp_path, 10)
+    dataset = LiveFruitDataset(
+        str(tmp_path), None, min_frames=1, settle_time=1.0, poll_interval=60.0
+    )
+    dataset.set_epoch(0)
+    assert len(dataset.pool) == 2
+
+    write_dataset(str(tmp_path / "more"), 3, sizes=((16, 16),))
+    for name in os.listdir(tmp_path / "more"):
+        if "_0002" in name:
+            os.replace(tmp_path / "more" / name, tmp_path / name)
+    age(tmp_path, 10)
+    dataset.set_epoch(1)
+    assert len(dataset.pool) == 2
+    dataset.last_scan -= 60.0
+    dataset.set_epoch(2)
+    assert sorted(frame_id for frame_id, _ in dataset.pool) == [0, 1, 2]
+
+
+def test_waits_for_min_frames(tmp_path, monkeypatch):
+    write_dataset(str(tmp_path), 1, sizes=((16, 16),))
+    age(tmp_path, 10)
+    dataset = LiveFruitDataset(
+        str(tmp_path), None, min_frames=2, settle_time=1.0, poll_interval=0.0
+    )
+
+    def sleep(seconds):
+        # the writer finishes another frame while the dataset waits
+        write_dataset(str(tmp_path / "more"), 2, sizes=((16, 16),))
+        for name in os.listdir(tmp_path / "more"):
+            if "_0001" in name:
+                os.replace(tmp_path / "more" / name, tmp_path / name)
+        age(tmp_path, 10)
+
+    monkeypatch.setattr(live_dataset.time, "sleep", sleep)
+    dataset.set_epoch(0)
+    assert len(dataset.pool) == 2
+
+
+def test_epoch_draws_samples_per_epoch_across_workers(tmp_path):
+    write_dataset(str(tmp_path), 3, sizes=((16, 16),))
+    age(tmp_path, 10)
+    dataset = LiveFruitDataset(
+        str(tmp_path), None, samples_per_epoch=8, min_frames=3, settle_time=1.0
+    )
+    dataset.set_epoch(0)
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=2, num_workers=2, collate_fn=collate_fn
+    )
+    ids = [int(t["image_id"]) for _, targets in loader for t in targets]
+    assert len(ids) == 8
+    assert set(ids) <= {0, 1, 2}
@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import shutil
+import manifest
+from box_store import build_box_store
+from manifest import build_manifest, frame_paths, load_manifest, split_indices
+from samplers import load_class_histogram, load_frame_metadata
+from synthetic_dataset import write_dataset
+from train import FruitDataset
+
+
+def test_skips_incomplete_frames(tmp_path):
+    write_dataset(str(tmp_path), 5, sizes=((16, 16),))
+    os.remove(tmp_path / "bounding_box_2d_tight_labels_0002.json")
+    frames = load_manifest(str(tmp_path))
+    assert list(frames["frame"]) == [0, 1, 3, 4]
+    rgb, npy, labels = frame_paths(str(tmp_path), frames[2])
+    assert rgb == str(tmp_path / "rgb_0003.png")
+    assert npy == str(tmp_path / "bounding_box_2d_tight_0003.npy")
+    assert labels == str(tmp_path / "bounding_box_2d_tight_labels_0003.json")
+
+
+def test_indexes_the_legacy_layout(tmp_path):
+    write_dataset(str(tmp_path), 3, sizes=((16, 16),))
+    for sub_dir, suffix in [("png", ".png"), ("npy", ".npy"), ("json", ".json")]:
+        os.makedirs(tmp_path / sub_dir)
+        for name in os.listdir(tmp_path):
+            if name.endswith(suffix):
+                shutil.move(str(tmp_path / name), str(tmp_path / sub_dir / name))
+    frames = load_manifest(str(tmp_path))
+    assert list(frames["frame"]) == [0, 1, 2]
+    assert frame_paths(str(tmp_path), frames[1])[0] == str(
+        tmp_path / "png/rgb_0001.png"
+    )
+
+
+def test_rebuilds_only_when_files_change(tmp_path, monkeypatch):
+    write_dataset(str(tmp_path / "data"), 3, sizes=((16, 16),))
+    root = str(tmp_path / "data")
+    assert len(load_manifest(root)) == 3
+
+    builds = []
+    original = manifest.build_manifest
+
+    def build_manifest(*args):
+        builds.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(manifest, "build_manifest", build_manifest)
+    assert len(load_manifest(root)) == 3
+    assert not builds
+
+    # directory times may be coarser than the clock
+    time.sleep(0.05)
+    write_dataset(str(tmp_path / "more"), 5, sizes=((16, 16),))
+    for name in os.listdir(tmp_path / "more"):
+        if "_0004" in name:
+            shutil.copy(str(tmp_path / "more" / name), root)
+    frames = load_manifest(root)
+    assert len(builds) == 1
+    assert list(frames["frame"]) == [0, 1, 2, 4]
+
+
+def test_side_files_leave_the_manifest_fresh(tmp_path):
+    root = str(tmp_path)
+    write_dataset(root, 3, sizes=((16, 16),))
+    manifest_path = build_manifest(root)
+    time.sleep(0.05)
+    build_box_store(root)
+    dataset = FruitDataset(root, None)
+    load_frame_metadata(dataset)
+    load_class_histogram(dataset)
+    assert sorted(os.listdir(tmp_path / manifest.INDEX_DIR)) == [
+        "box_store.npy",
+        "class_hist.npy",
+        "frame_meta.npy",
+        "manifest.npy",
+    ]
+    assert not manifest.is_manifest_stale(root, manifest_path)
+
+
+def test_writes_to_a_separate_path(tmp_path):
+    write_dataset(str(tmp_path / "data"), 2, sizes=((16, 16),))
+    path = build_manifest(str(tmp_path / "data"), str(tmp_path / "index.npy"))
+    assert path == str(tmp_path / "index.npy")
+    assert not os.path.exists(tmp_path / "data" / manifest.INDEX_DIR)
+
+
+def test_split_is_disjoint_and_seeded():
+    train, valid, test = split_indices(20)
+    assert (len(train), len(valid), len(test)) == (14, 4, 2)
+    assert sorted(train + valid + test) == list(range(20))
+    assert split_indices(20) == (train, valid, test)
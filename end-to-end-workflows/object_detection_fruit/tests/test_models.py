@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import pytest
+import torch
+import benchmark_models
+from box_store import NUM_CLASSES
+from models import ARCHITECTURES, TWO_STAGE_ARCHS, create_model
+
+
+def class_logits(model, arch):
+    if arch in TWO_STAGE_ARCHS:
+        return model.roi_heads.box_predictor.cls_score.out_features
+    head = model.head.classification_head
+    # SSD heads keep the class count as the number of score columns
+    return getattr(head, "num_classes", getattr(head, "num_columns", None))
+
+
+@pytest.mark.parametrize("arch", list(ARCHITECTURES))
+def test_architectures_detect_the_fruit_classes(arch):
+    torch.manual_seed(0)
+    model = create_model(arch, NUM_CLASSES, pretrained=False, image_size=64).eval()
+    assert model.arch == arch
+    assert class_logits(model, arch) == NUM_CLASSES
+    if arch != "ssdlite320_mobilenet_v3_large":
+        assert model.transform.min_size == (64,) and model.transform.max_size == 64
+    with torch.no_grad():
+        detections = model([torch.rand(3, 48, 64)])
+    assert set(detections[0]) == {"boxes", "scores", "labels"}
+    labels = detections[0]["labels"]
+    assert len(labels) == 0 or (labels.min() >= 1 and labels.max() < NUM_CLASSES)
+
+
+def test_unknown_architecture():
+    with pytest.raises(ValueError, match="Unknown architecture"):
+        create_model("yolo", NUM_CLASSES, pretrained=False)
+
+
+def test_benchmark_prints_a_row_per_model(monkeypatch, tmp_path, capsys):
+    model = create_model("ssdlite320_mobilenet_v3_large", NUM_CLASSES, pretrained=False)
+    torch.save(model, tmp_path / "model.pth")
+    argv = ["benchmark_models.py", "-m", str(tmp_path / "model.pth"), "--size", "64"]
+    argv += ["-b", "2", "--iterations", "1", "--threads", "1"]
+    monkeypatch.setattr(sys, "argv", argv)
+    benchmark_models.main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split() == ["architecture", "params", "(M)", "ms/image", "images/s"]
+    assert lines[2].startswith("ssdlite320_mobilenet_v3_large")
@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import json
+import cv2
+import numpy as np
+import pytest
+import torch
+import torchvision
+import export
+import onnx_infer
+from preprocessing import load_image
+
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    torch.manual_seed(0)
+    model = torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(
+        weights=None, weights_backbone=None, num_classes=3, min_size=SIZE, max_size=SIZE
+    )
+    path = str(tmp_path_factory.mktemp("model") / "model.onnx")
+    export.export_onnx(model.eval(), path, SIZE)
+    return path
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(5):
+        image = rng.integers(0, 256, (48 + 16 * i, 96, 3), dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f"rgb_{i:04d}.png"), image)
+    return tmp_path
+
+
+def parse(monkeypatch, args):
+    monkeypatch.setattr(sys, "argv", ["onnx_infer.py"] + args)
+    return onnx_infer.parse_input()[0]
+
+
+def test_run_reports_source_pixels(monkeypatch, model_path, image_dir, tmp_path):
+    output = str(tmp_path / "detections.json")
+    args = ["run", "-m", model_path, "-d", str(image_dir), "-b", "2", "-o", output]
+    onnx_infer.run(
+        parse(monkeypatch, args + ["--size", str(SIZE), "--score_thresh", "0"])
+    )
+    with open(output) as f:
+        results = json.load(f)
+    assert len(results) == 5
+    assert any(detections["boxes"] for detections in results.values())
+
+    detector = onnx_infer.OnnxDetector(model_path)
+    for name, detections in results.items():
+        height, width = cv2.imread(str(image_dir / name)).shape[:2]
+        expected = detector.infer(load_image(str(image_dir / name), SIZE)[None])[0]
+        scale = np.array([width, height, width, height]) / SIZE
+        np.testing.assert_allclose(
+            detections["boxes"], expected["boxes"].reshape(-1, 4) * scale, rtol=1e-4
+        )
+
+
+def test_benchmark_decodes_only_the_largest_batch(
+    monkeypatch, model_path, image_dir, capsys
+):
+    loaded = []
+
+    def load_image(path, size):
+        loaded.append(path)
+        return np.zeros((3, size, size), dtype=np.float32)
+
+    monkeypatch.setattr(onnx_infer, "load_image", load_image)
+    args = ["benchmark", "-m", model_path, "-d", str(image_dir), "--size", str(SIZE)]
+    args += ["--batch_sizes", "1,2", "--threads", "1", "--iterations", "2"]
+    onnx_infer.benchmark(parse(monkeypatch, args))
+    assert len(loaded) == 2
+    assert len(capsys.readouterr().out.splitlines()) == 4
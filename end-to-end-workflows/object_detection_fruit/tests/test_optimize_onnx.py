@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import onnx
+import pytest
+import torch
+import torchvision
+import export
+import optimize_onnx
+
+SIZE = 96
+
+
+def export_model(path, seed):
+    torch.manual_seed(seed)
+    model = torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(
+        weights=None, weights_backbone=None, num_classes=3, min_size=SIZE, max_size=SIZE
+    )
+    export.export_onnx(model.eval(), str(path), SIZE)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    return export_model(tmp_path_factory.mktemp("onnx") / "model.onnx", 0)
+
+
+def test_node_counts_include_loop_bodies(model_path):
+    model = onnx.load(model_path)
+    top_level = len(model.graph.node)
+    counts = optimize_onnx.node_counts(model)
+    assert sum(counts.values()) > top_level
+    assert counts["Conv"] > 0
+
+
+def test_raise_opset_never_lowers(model_path):
+    model = onnx.load(model_path)
+    assert optimize_onnx.raise_opset(model, 1) is model
+
+
+@pytest.mark.parametrize("level", list(optimize_onnx.OPTIMIZATION_LEVELS))
+def test_optimized_model_matches(model_path, tmp_path, level):
+    output = str(tmp_path / "model_opt.onnx")
+    optimized = optimize_onnx.optimize(model_path, output, 13, level, False)
+    before = optimize_onnx.node_counts(onnx.load(model_path))
+    assert sum(optimize_onnx.node_counts(optimized).values()) < sum(before.values())
+    assert not (tmp_path / "model_opt.onnx.tmp").exists()
+
+    reference = optimize_onnx.create_session(model_path)
+    session = optimize_onnx.create_session(output)
+    sizes = optimize_onnx.batch_sizes(reference)
+    assert sizes == (2, 1)
+    batches = export.check_batches(None, SIZE, sizes)
+    assert optimize_onnx.check_parity(reference, session, batches)
+
+
+def test_parity_catches_other_weights(model_path, tmp_path):
+    other = export_model(tmp_path / "other.onnx", 1)
+    reference = optimize_onnx.create_session(model_path)
+    session = optimize_onnx.create_session(other)
+    batches = export.check_batches(None, SIZE)
+    assert not optimize_onnx.check_parity(reference, session, batches)
+
+
+def test_main_writes_model_opt(monkeypatch, model_path, capsys):
+    argv = ["optimize_onnx.py", "-m", model_path, "--size", str(SIZE)]
+    argv += ["--no_simplify", "--iterations", "1"]
+    monkeypatch.setattr(sys, "argv", argv)
+    # exits non zero when the optimized outputs do not match
+    optimize_onnx.main()
+    out = capsys.readouterr().out
+    assert "detections match the unoptimized model" in out
+    onnx.checker.check_model(model_path.replace("model.onnx", "model_opt.onnx"))
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import torch
+from box_store import NUM_CLASSES
+from checkpoint import ResumableBatchSampler
+from instrumentation import NullProfiler, TrainingLogger
+from models import create_model
+from synthetic_dataset import write_dataset
+from train import (
+    MEMORY_FORMATS,
+    FruitDataset,
+    autocast,
+    collate_fn,
+    create_grad_scaler,
+    train_one_epoch,
+)
+
+CPU = torch.device("cpu")
+
+
+class Writer:
+    def __init__(self):
+        self.losses = []
+
+    def add_scalar(self, tag, value, step):
+        if tag == "Loss/train":
+            self.losses.append(float(value))
+
+
+def test_bf16_channels_last_trains_on_cpu(tmp_path):
+    torch.manual_seed(0)
+    write_dataset(str(tmp_path), 4, sizes=((64, 48),), max_boxes=3, seed=5)
+    sampler = torch.utils.data.BatchSampler(range(4), 2, drop_last=False)
+    data_loader = torch.utils.data.DataLoader(
+        FruitDataset(str(tmp_path), None),
+        batch_sampler=ResumableBatchSampler(sampler),
+        collate_fn=collate_fn,
+    )
+    model = create_model(
+        "fasterrcnn_mobilenet_v3_large_fpn", NUM_CLASSES, False, image_size=64
+    )
+    model.to(CPU, memory_format=MEMORY_FORMATS["channels_last"])
+    conv = model.backbone.body["0"][0]
+    assert conv.weight.is_contiguous(memory_format=torch.channels_last)
+    with autocast(CPU, "bf16"):
+        assert conv(torch.rand(1, 3, 8, 8)).dtype == torch.bfloat16
+
+    # bf16 has the range of fp32 and trains without loss scaling
+    scaler = create_grad_scaler("bf16")
+    assert not scaler.is_enabled()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.001)
+    writer = Writer()
+    logger = TrainingLogger(writer, CPU, log_every=1, num_batches=2)
+    model.train()
+    train_one_epoch(
+        model, optimizer, scaler, data_loader, CPU, 0, "bf16", logger, NullProfiler()
+    )
+    assert len(writer.losses) == 2
+    assert all(math.isfinite(loss) for loss in writer.losses)
+    assert all(torch.isfinite(p).all() for p in model.parameters())
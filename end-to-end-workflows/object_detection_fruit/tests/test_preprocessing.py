@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing import (
+    LETTERBOX_FILL,
+    BatchBuffer,
+    letterbox_geometry,
+    load_image,
+    preprocess,
+    preprocess_into,
+    to_original,
+)
+
+SIZE = 96
+
+
+def image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def reference(image_bgr, width, height):
+    resized = cv2.resize(image_bgr, (width, height))
+    return resized[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255
+
+
+def test_preprocess_matches_the_plain_conversion():
+    bgr = image(200, 150)
+    out = preprocess(bgr, SIZE)
+    assert out.shape == (3, SIZE, SIZE) and out.dtype == np.float32
+    np.testing.assert_allclose(out, reference(bgr, SIZE, SIZE), atol=1e-6)
+
+
+def test_fp16_matches_fp32():
+    # taller than one block of table rows
+    bgr = image(200, 150)
+    out = np.empty((3, SIZE, SIZE), dtype=np.float16)
+    scratch = np.empty((SIZE, SIZE, 3), dtype=np.uint8)
+    assert preprocess_into(bgr, out, scratch) == (SIZE / 200, SIZE / 150, 0, 0)
+    np.testing.assert_allclose(out, preprocess(bgr, SIZE), atol=1e-3)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_letterbox_keeps_the_aspect_ratio(dtype):
+    bgr = image(200, 100)
+    out = np.zeros((3, SIZE, SIZE), dtype=dtype)
+    transform = preprocess_into(bgr, out, letterbox=True)
+    assert letterbox_geometry(100, 200, SIZE) == (96, 48, 0, 24)
+    assert transform == (96 / 200, 48 / 100, 0, 24)
+    fill = np.asarray(LETTERBOX_FILL, dtype=dtype)
+    assert (out[:, :24] == fill).all() and (out[:, 72:] == fill).all()
+    np.testing.assert_allclose(out[:, 24:72], reference(bgr, 96, 48), atol=1e-3)
+
+
+def test_boxes_map_back_to_the_source_image():
+    boxes = np.array([[20, 10, 100, 60]], dtype=np.float32)
+    bgr = image(200, 100)
+    out = np.empty((3, SIZE, SIZE), dtype=np.float32)
+    for letterbox in [False, True]:
+        scale_x, scale_y, left, top = preprocess_into(bgr, out, letterbox=letterbox)
+        model_boxes = boxes * [scale_x, scale_y, scale_x, scale_y] + [left, top] * 2
+        transform = (scale_x, scale_y, left, top)
+        np.testing.assert_allclose(
+            to_original(model_boxes, transform), boxes, rtol=1e-5
+        )
+
+
+def test_load_image_reads_bgr(tmp_path):
+    bgr = image(64, 48)
+    cv2.imwrite(str(tmp_path / "frame.png"), bgr)
+    np.testing.assert_allclose(
+        load_image(str(tmp_path / "frame.png"), SIZE), preprocess(bgr, SIZE)
+    )
+
+
+@pytest.mark.parametrize("letterbox", [False, True])
+def test_batch_buffer_rows_are_independent(letterbox):
+    buffer = BatchBuffer(3, SIZE, np.float16, letterbox)
+    sources = [image(200, 100, seed=1), image(120, 160, seed=2)]
+    for row, bgr in enumerate(sources):
+        buffer.put(row, bgr)
+    batch = buffer.batch(2)
+    assert batch.shape == (2, 3, SIZE, SIZE) and batch.dtype == np.float16
+    for row, bgr in enumerate(sources):
+        expected = np.empty((3, SIZE, SIZE), dtype=np.float16)
+        transform = preprocess_into(bgr, expected, letterbox=letterbox)
+        assert buffer.transforms[row] == transform
+        np.testing.assert_array_equal(batch[row], expected)
+    assert buffer.transforms[2] is None
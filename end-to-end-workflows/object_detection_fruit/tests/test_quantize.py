@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import pytest
+import torch
+import torchvision
+import export
+import quantize
+
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    torch.manual_seed(0)
+    model = torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(
+        weights=None, weights_backbone=None, num_classes=3, min_size=SIZE, max_size=SIZE
+    )
+    path = str(tmp_path_factory.mktemp("model") / "model.onnx")
+    export.export_onnx(model.eval(), path, SIZE, batch_size=2)
+    return path
+
+
+@pytest.mark.parametrize("method", list(quantize.CALIBRATION_METHODS))
+def test_every_method_calibrates(model_path, tmp_path, method):
+    path, batch_size = quantize.prepare_model(model_path, str(tmp_path))
+    images = np.random.default_rng(0).random((5, 3, SIZE, SIZE), dtype=np.float32)
+    input_name = quantize.create_session(path).get_inputs()[0].name
+    reader = quantize.FrameReader(images, input_name, batch_size)
+    output = str(tmp_path / "model_int8.onnx")
+    quantize.quantize(path, output, reader, method)
+    assert quantize.activation_ranges(output)
+    boxes, scores, labels, counts = quantize.create_session(output).run(
+        None, {input_name: images[:batch_size]}
+    )
+    assert counts.shape == (batch_size,)
@@ -0,0 +1,179 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import pytest
+from box_store import NUM_CLASSES
+from samplers import (
+    CLASS_HIST_DTYPE,
+    FRAME_META_DTYPE,
+    BucketBatchSampler,
+    WeightedFrameSampler,
+    frame_weights,
+    load_class_histogram,
+    load_frame_metadata,
+)
+from synthetic_dataset import write_dataset
+from train import FruitDataset
+
+
+def make_meta(sizes, num_boxes):
+    meta = np.zeros(len(sizes), dtype=FRAME_META_DTYPE)
+    meta["frame"] = np.arange(len(sizes))
+    meta["width"], meta["height"] = np.array(sizes).T
+    meta["num_boxes"] = num_boxes
+    return meta
+
+
+def test_batches_share_an_aspect_bucket():
+    # alternating wide and tall frames
+    meta = make_meta([(200, 100), (100, 200)] * 8, np.arange(16) % 5)
+    sampler = BucketBatchSampler(meta, 4, pool_batches=10)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 4
+    assert sorted(i for batch in batches for i in batch) == list(range(16))
+    for batch in batches:
+        assert len({i % 2 for i in batch}) == 1
+        boxes = meta["num_boxes"][batch]
+        assert list(boxes) == sorted(boxes)
+
+
+def test_epochs_reshuffle_deterministically():
+    meta = make_meta([(100, 100)] * 20, np.zeros(20))
+    sampler = BucketBatchSampler(meta, 3, pool_batches=1)
+    first = list(sampler)
+    assert list(sampler) == first
+    sampler.set_epoch(1)
+    assert list(sampler) != first
+
+
+def test_ranks_split_batches_evenly():
+    meta = make_meta([(100, 100)] * 10, np.zeros(10))
+    samplers = [
+        BucketBatchSampler(meta, 3, indices=range(10), num_replicas=3, rank=rank)
+        for rank in range(3)
+    ]
+    per_rank = [list(sampler) for sampler in samplers]
+    # 4 batches over 3 ranks, one batch is repeated to fill the second round
+    assert [len(batches) for batches in per_rank] == [2, 2, 2]
+    seen = {i for batches in per_rank for batch in batches for i in batch}
+    assert seen == set(range(10))
+
+
+def test_drop_last_and_indices():
+    meta = make_meta([(100, 100)] * 10, np.zeros(10))
+    sampler = BucketBatchSampler(meta, 4, indices=[1, 3, 5, 7, 9], drop_last=True)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 1
+    assert len(batches[0]) == 4 and set(batches[0]) <= {1, 3, 5, 7, 9}
+
+
+def test_frame_metadata_is_read_once(tmp_path):
+    write_dataset(str(tmp_path), 4, sizes=((30, 20), (20, 40)), seed=6)
+    dataset = FruitDataset(str(tmp_path), None)
+    meta = load_frame_metadata(dataset)
+    for i in range(len(dataset)):
+        img, target = dataset[i]
+        assert (meta["width"][i], meta["height"][i]) == (img.shape[2], img.shape[1])
+        assert meta["num_boxes"][i] == len(target["boxes"])
+    # cached next to the manifest and reused while the frames match
+    meta["num_boxes"][:] = -1
+    np.save(tmp_path / "index" / "frame_meta.npy", meta)
+    assert (load_frame_metadata(dataset)["num_boxes"] == -1).all()
+
+
+def make_hist(counts):
+    hist = np.zeros(len(counts), dtype=CLASS_HIST_DTYPE)
+    hist["frame"] = np.arange(len(counts))
+    for i, frame_counts in enumerate(counts):
+        hist["counts"][i, : len(frame_counts)] = frame_counts
+    return hist
+
+
+def test_balanced_weights_favour_rare_classes():
+    # class 1 is in three frames, class 2 only in the last one
+    hist = make_hist([[0, 1], [0, 2], [0, 1, 1], [0, 0, 0]])
+    weights = frame_weights(hist, empty_weight=0.5)
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights[0] == weights[1] < weights[2]
+    # the empty frame gets half the mean weight of the others
+    assert weights[3] == pytest.approx(0.5 * weights[:3].mean())
+    assert frame_weights(hist, empty_weight=0)[3] == 0
+
+
+def test_box_weights_and_unknown_mode():
+    hist = make_hist([[0, 1], [0, 4], [0, 0, 9]])
+    weights = frame_weights(hist, mode="boxes")
+    assert weights * 6 == pytest.approx([1, 2, 3])
+    with pytest.raises(ValueError, match="Unknown sampling mode"):
+        frame_weights(hist, mode="uniform")
+
+
+def test_weighted_sampler_draws_in_proportion():
+    sampler = WeightedFrameSampler([0.0, 1.0, 3.0], num_samples=4000, seed=1)
+    counts = np.bincount(list(sampler), minlength=3)
+    assert counts[0] == 0
+    assert 2.5 < counts[2] / counts[1] < 3.5
+    assert list(sampler) == list(sampler)
+    sampler.set_epoch(1)
+    assert list(sampler) != list(
+        WeightedFrameSampler([0.0, 1.0, 3.0], num_samples=4000, seed=1)
+    )
+
+
+def test_weighted_sampler_indices_and_ranks():
+    weights = [1.0, 1.0, 1.0, 1.0, 0.0, 0.0]
+    ranks = [
+        WeightedFrameSampler(weights, indices=[0, 2, 4], num_replicas=2, rank=rank)
+        for rank in range(2)
+    ]
+    assert len(ranks[0]) == len(ranks[1]) == 2
+    for sampler in ranks:
+        assert set(sampler) <= {0, 2}
+    with pytest.raises(ValueError, match="sum to zero"):
+        WeightedFrameSampler(weights, indices=[4, 5])
+
+
+def test_class_histogram_matches_the_targets(tmp_path):
+    write_dataset(str(tmp_path), 5, sizes=((30, 20),), seed=4)
+    dataset = FruitDataset(str(tmp_path), None)
+    hist = load_class_histogram(dataset)
+    assert hist["counts"].shape == (5, NUM_CLASSES)
+    for i in range(len(dataset)):
+        labels = dataset[i][1]["labels"].numpy()
+        assert (
+            hist["counts"][i].tolist()
+            == np.bincount(labels, minlength=NUM_CLASSES).tolist()
+        )
+    # cached next to the manifest and reused while the frames match
+    hist["counts"][:] = 7
+    np.save(tmp_path / "index" / "class_hist.npy", hist)
+    assert (load_class_histogram(dataset)["counts"] == 7).all()
@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import pytest
+import torch
+from manifest import split_indices
+from shards import ShardedFruitDataset, pack_shards, shuffle_buffer
+from synthetic_dataset import write_dataset
+from train import FruitDataset, collate_fn
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_dataset(str(tmp_path / "data"), 10, sizes=((32, 24), (16, 40)), seed=5)
+    return str(tmp_path / "data")
+
+
+def frame_ids(dataset):
+    return [int(target["image_id"]) for _, target in dataset]
+
+
+def test_round_trip_matches_the_directory(data_dir, tmp_path):
+    out_dir = str(tmp_path / "shards")
+    packed = pack_shards(data_dir, out_dir, frames_per_shard=3, split="all")
+    assert [shard["frames"] for shard in packed] == [3, 3, 3, 1]
+
+    dataset = ShardedFruitDataset(out_dir, None, shuffle=False)
+    direct = FruitDataset(data_dir, None)
+    assert len(dataset) == len(direct)
+    streamed = list(dataset)
+    assert frame_ids(streamed) == list(range(10))
+    for (img, target), (expected_img, expected) in zip(streamed, direct):
+        assert torch.equal(img, expected_img)
+        assert torch.equal(target["boxes"], expected["boxes"])
+        assert torch.equal(target["labels"], expected["labels"])
+
+
+def test_packs_only_the_train_split(data_dir, tmp_path):
+    out_dir = str(tmp_path / "shards")
+    pack_shards(data_dir, out_dir, frames_per_shard=4)
+    dataset = ShardedFruitDataset(out_dir, None, shuffle=False)
+    assert dataset.split == "train"
+    assert sorted(frame_ids(dataset)) == sorted(split_indices(10)[0])
+
+
+def test_workers_read_disjoint_shards(data_dir, tmp_path):
+    out_dir = str(tmp_path / "shards")
+    pack_shards(data_dir, out_dir, frames_per_shard=2, split="all")
+    dataset = ShardedFruitDataset(out_dir, None, buffer_size=3)
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=2, num_workers=2, collate_fn=collate_fn
+    )
+    ids = [int(t["image_id"]) for _, targets in loader for t in targets]
+    assert sorted(ids) == list(range(10))
+
+
+def test_ranks_step_together(data_dir, tmp_path, monkeypatch):
+    out_dir = str(tmp_path / "shards")
+    # 4 shards of 3, 3, 3 and 1 frames over two ranks
+    pack_shards(data_dir, out_dir, frames_per_shard=3, split="all")
+    monkeypatch.setattr(torch.distributed, "is_initialized", lambda: True)
+    monkeypatch.setattr(torch.distributed, "get_world_size", lambda: 2)
+    per_rank = []
+    for rank in range(2):
+        monkeypatch.setattr(torch.distributed, "get_rank", lambda: rank)
+        dataset = ShardedFruitDataset(out_dir, None, shuffle=False)
+        per_rank.append(frame_ids(dataset))
+    assert len(per_rank[0]) == len(per_rank[1]) == 4
+    assert not set(per_rank[0]) & set(per_rank[1])
+
+
+def test_epochs_reshuffle_shards(data_dir, tmp_path):
+    out_dir = str(tmp_path / "shards")
+    pack_shards(data_dir, out_dir, frames_per_shard=1, split="all")
+    dataset = ShardedFruitDataset(out_dir, None, buffer_size=1)
+    orders = []
+    for epoch in range(3):
+        dataset.set_epoch(epoch)
+        orders.append(dataset.assigned_shards()[0])
+    assert all(sorted(order) == sorted(orders[0]) for order in orders)
+    assert len({tuple(order) for order in orders}) > 1
+
+
+def test_shuffle_buffer_keeps_every_sample():
+    samples = list(range(50))
+    shuffled = list(shuffle_buffer(iter(samples), 8, random.Random(0)))
+    assert sorted(shuffled) == samples
+    assert shuffled != samples
@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import json
+import socket
+import cv2
+import numpy as np
+import pytest
+import deploy
+from preprocessing import load_image
+from standin_server import StandInServicer, fake_detections, serve
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(7):
+        image = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f"rgb_{i:04d}.png"), image)
+    return tmp_path
+
+
+def start_server(model=fake_detections, jitter=0.0):
+    servicer = StandInServicer("fruit", model, jitter=jitter)
+    port = free_port()
+    server = serve(servicer, port)
+    return server, servicer, f"localhost:{port}"
+
+
+def run_stream(monkeypatch, url, image_dir, output, *extra):
+    argv = ["deploy.py", "-d", str(image_dir), "-u", url, "--model_name", "fruit"]
+    argv += ["-b", "3", "--in_flight", "3", "--size", "32", "--score_thresh", "0"]
+    argv += ["-o", str(output), *extra]
+    monkeypatch.setattr(sys, "argv", argv)
+    options, args = deploy.parse_input()
+    deploy.stream(options)
+
+
+def shm_regions():
+    return [
+        name
+        for name in os.listdir("/dev/shm")
+        if name.startswith(f"fruit_{os.getpid()}_")
+    ]
+
+
+def test_shm_regions_released(monkeypatch, image_dir, tmp_path):
+    server, servicer, url = start_server()
+    try:
+        run_stream(monkeypatch, url, image_dir, tmp_path / "out.json", "--shm")
+    finally:
+        server.stop(None)
+    assert len(json.load(open(tmp_path / "out.json"))) == 7
+    assert shm_regions() == []
+    assert servicer.regions == {}
+
+
+def test_shm_regions_released_on_error(monkeypatch, image_dir, tmp_path):
+    def broken(images):
+        raise RuntimeError("model failed")
+
+    server, servicer, url = start_server(broken)
+    try:
+        with pytest.raises(Exception, match="model failed"):
+            run_stream(monkeypatch, url, image_dir, tmp_path / "out.json", "--shm")
+    finally:
+        server.stop(None)
+    assert shm_regions() == []
+    assert servicer.regions == {}
+
+
+def test_results_map_to_their_images(monkeypatch, image_dir, tmp_path):
+    # the stand-in scores each image with its mean pixel value, jitter makes responses overtake each other
+    server, servicer, url = start_server(jitter=30.0)
+    try:
+        run_stream(monkeypatch, url, image_dir, tmp_path / "out.json")
+    finally:
+        server.stop(None)
+    results = json.load(open(tmp_path / "out.json"))
+    assert sorted(results) == [f"rgb_{i:04d}.png" for i in range(7)]
+    for name, detections in results.items():
+        expected = load_image(str(image_dir / name), 32).mean()
+        assert detections["scores"] == pytest.approx([expected], abs=1e-6)
+        # boxes come back in the pixels of the 64x48 source image
+        np.testing.assert_allclose(detections["boxes"], [[16, 12, 48, 36]], atol=1e-3)
@@ -0,0 +1,182 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import torch
+from optparse import OptionParser
+from box_store import NUM_CLASSES
+from models import create_model
+from compilation import COMPILE_MODES, compile_failures, compile_model, script_model
+
+
+"""
+Parses command line options. Compares eager, torch.compile and TorchScript inference, and eager against
+compiled training steps, for the fruit Faster R-CNN on CPU with random weights and images.
+"""
+
+
+def parse_input():
+    usage = "usage: benchmark_compile.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Width and height of the benchmark images",
+    )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=1,
+        help="Images per inference call and training step",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=10,
+        help="Timed iterations per measurement",
+    )
+    parser.add_option(
+        "--compile_mode",
+        dest="compile_mode",
+        type="choice",
+        choices=COMPILE_MODES,
+        default="default",
+        help="torch.compile mode: " + ", ".join(COMPILE_MODES),
+    )
+    parser.add_option(
+        "--train",
+        dest="train",
+        action="store_true",
+        default=False,
+        help="Also time training steps",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def timed(fn, iterations, warmup=2):
+    # the first warmup call of a compiled model includes compilation
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    for _ in range(warmup - 1):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations, first
+
+
+def build(size):
+    torch.manual_seed(0)
+    return create_model(
+        "fasterrcnn_resnet50_fpn", NUM_CLASSES, pretrained=False, image_size=size
+    )
+
+
+def make_targets(batch_size, size):
+    targets = []
+    for _ in range(batch_size):
+        xy = torch.rand(8, 2) * size * 0.8
+        wh = torch.rand(8, 2) * size * 0.2 + 4
+        boxes = torch.cat([xy, xy + wh], dim=1)
+        targets.append({"boxes": boxes, "labels": torch.randint(1, NUM_CLASSES, (8,))})
+    return targets
+
+
+def train_step(model, optimizer, images, targets):
+    loss_dict = model(images, targets)
+    losses = sum(loss for loss in loss_dict.values())
+    optimizer.zero_grad()
+    losses.backward()
+    optimizer.step()
+
+
+def report(name, result, baseline):
+    seconds, first = result
+    print(
+        f"{name:<24}{1000 * seconds:>10.1f} ms{baseline / seconds:>8.2f}x"
+        f"{first:>10.1f} s first call"
+    )
+
+
+def main():
+    options, args = parse_input()
+    images = [
+        torch.rand(3, options.size, options.size) for _ in range(options.batch_size)
+    ]
+    print(
+        f"fasterrcnn_resnet50_fpn, CPU, {torch.get_num_threads()} threads, "
+        f"{options.batch_size}x{options.size}x{options.size}"
+    )
+
+    with torch.inference_mode():
+        model = build(options.size).eval()
+        eager = timed(lambda: model(images), options.iterations)
+        report("eager inference", eager, eager[0])
+
+        scripted = script_model(build(options.size))
+        report(
+            "torchscript inference",
+            timed(lambda: scripted(images), options.iterations),
+            eager[0],
+        )
+
+    model = build(options.size).eval()
+    compile_model(model, options.compile_mode)
+    with torch.inference_mode():
+        compiled = timed(lambda: model(images), options.iterations)
+    report("compiled inference", compiled, eager[0])
+    if compile_failures(model):
+        print(f"  ran eagerly: {', '.join(compile_failures(model))}")
+
+    if options.train:
+        targets = make_targets(options.batch_size, options.size)
+        results = {}
+        for name in ["eager", "compiled"]:
+            model = build(options.size).train()
+            if name == "compiled":
+                compile_model(model, options.compile_mode)
+            optimizer = torch.optim.SGD(model.parameters(), lr=0.001)
+            results[name] = timed(
+                lambda: train_step(model, optimizer, images, targets),
+                options.iterations,
+            )
+            report(f"{name} training step", results[name], results["eager"][0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import torch
+from optparse import OptionParser
+from box_store import NUM_CLASSES
+from evaluate import evaluate
+from models import ARCHITECTURES, create_model
+from train import FruitDataset, get_transform, collate_fn, split_dataset
+
+
+"""
+Parses command line options. Without models every architecture is built with random weights, which is enough
+to compare speed; pass trained models from train.py together with the dataset to add their validation mAP.
+"""
+
+
+def parse_input():
+    usage = "usage: benchmark_models.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-a",
+        "--archs",
+        dest="archs",
+        default=",".join(ARCHITECTURES),
+        help="Comma separated architectures to benchmark",
+    )
+    parser.add_option(
+        "-m",
+        "--models",
+        dest="models",
+        help="Comma separated models saved by train.py, benchmarked instead of --archs",
+    )
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data, used to evaluate --models",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Width and height of the benchmark images",
+    )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=4,
+        help="Batch size for the throughput measurement",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=10,
+        help="Timed iterations per measurement",
+    )
+    parser.add_option(
+        "--threads",
+        dest="threads",
+        type="int",
+        help="Number of CPU threads, defaults to the torch default",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+@torch.inference_mode()
+def time_inference(model, batch_size, size, iterations, warmup=2):
+    images = [torch.rand(3, size, size) for _ in range(batch_size)]
+    for _ in range(warmup):
+        model(images)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        model(images)
+    return (time.perf_counter() - start) / iterations
+
+
+def load_models(options):
+    if options.models is None:
+        for arch in options.archs.split(","):
+            yield arch, create_model(arch, NUM_CLASSES, pretrained=False)
+        return
+    for path in options.models.split(","):
+        model = torch.load(path, map_location="cpu", weights_only=False)
+        yield getattr(model, "arch", path), model
+
+
+def main():
+    options, args = parse_input()
+    torch.manual_seed(0)
+    if options.threads:
+        torch.set_num_threads(options.threads)
+
+    validloader = None
+    if options.models is not None and options.data_dir is not None:
+        _, valid, _ = split_dataset(
+            FruitDataset(options.data_dir, get_transform(train=False))
+        )
+        validloader = torch.utils.data.DataLoader(
+            valid, batch_size=options.batch_size, num_workers=4, collate_fn=collate_fn
+        )
+
+    print(
+        f"CPU, {options.size}x{options.size} input, {torch.get_num_threads()} threads"
+    )
+    header = f"{'architecture':<36}{'params (M)':>12}{'ms/image':>10}{'images/s':>10}"
+    if validloader is not None:
+        header += f"{'mAP':>8}{'mAP50':>8}"
+    print(header)
+    for name, model in load_models(options):
+        model.eval()
+        params = sum(p.numel() for p in model.parameters()) / 1e6
+        latency = time_inference(model, 1, options.size, options.iterations)
+        batch_time = time_inference(
+            model, options.batch_size, options.size, options.iterations
+        )
+        row = (
+            f"{name:<36}{params:>12.1f}{1000 * latency:>10.1f}"
+            f"{options.batch_size / batch_time:>10.2f}"
+        )
+        if validloader is not None:
+            metrics = evaluate(model, validloader, torch.device("cpu"), NUM_CLASSES)
+            row += f"{metrics['mAP']:>8.3f}{metrics['mAP50']:>8.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import tempfile
+import torch
+import torchvision
+from optparse import OptionParser
+from train import FruitDataset, get_transform, collate_fn
+from image_io import prepare_images
+from box_store import NUM_CLASSES
+from samplers import BucketBatchSampler, load_frame_metadata
+from synthetic_dataset import write_dataset, parse_sizes
+
+
+"""
+Parses command line options. Without a data directory a synthetic BasicWriter dataset with mixed image sizes
+and box counts is written to a temporary directory.
+"""
+
+
+def parse_input():
+    usage = "usage: benchmark_sampler.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data.",
+    )
+    parser.add_option(
+        "-n",
+        "--num_frames",
+        dest="num_frames",
+        type="int",
+        default=64,
+        help="Number of synthetic frames to write when no data_dir is given",
+    )
+    parser.add_option(
+        "--sizes",
+        dest="sizes",
+        default="1024x1024,1280x720,720x1280,1024x512",
+        help="Comma separated WIDTHxHEIGHT sizes of the synthetic frames",
+    )
+    parser.add_option(
+        "--max_boxes",
+        dest="max_boxes",
+        type="int",
+        default=30,
+        help="Maximum number of boxes per synthetic frame",
+    )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=4,
+        help="Training batch size",
+    )
+    parser.add_option(
+        "--steps",
+        dest="steps",
+        type="int",
+        default=10,
+        help="Timed training steps per sampler",
+    )
+    parser.add_option(
+        "--min_size",
+        dest="min_size",
+        type="int",
+        default=512,
+        help="Shorter image side after GeneralizedRCNNTransform resizing",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def run(model, data_loader, steps, warmup=2):
+    padded_pixels = []
+    image_pixels = []
+
+    def record_padding(module, inputs, output):
+        image_list = output[0]
+        batch, _, height, width = image_list.tensors.shape
+        padded_pixels.append(batch * height * width)
+        image_pixels.append(sum(h * w for h, w in image_list.image_sizes))
+
+    hook = model.transform.register_forward_hook(record_padding)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.001)
+    model.train()
+
+    images = 0
+    step = 0
+    start = time.perf_counter()
+    while step < warmup + steps:
+        for imgs, annotations in data_loader:
+            if step == warmup:
+                start = time.perf_counter()
+                images = 0
+                padded_pixels.clear()
+                image_pixels.clear()
+            loss_dict = model(prepare_images(imgs, "cpu"), list(annotations))
+            losses = sum(loss for loss in loss_dict.values())
+            optimizer.zero_grad()
+            losses.backward()
+            optimizer.step()
+            images += len(imgs)
+            step += 1
+            if step == warmup + steps:
+                break
+    elapsed = time.perf_counter() - start
+    hook.remove()
+    padding = 1.0 - sum(image_pixels) / sum(padded_pixels)
+    return images / elapsed, padding
+
+
+def main():
+    options, args = parse_input()
+    torch.manual_seed(0)
+    tmp_dir = None
+    data_dir = options.data_dir
+    if data_dir is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        data_dir = tmp_dir.name
+        write_dataset(
+            data_dir, options.num_frames, parse_sizes(options.sizes), options.max_boxes
+        )
+
+    dataset = FruitDataset(data_dir, get_transform(train=True))
+    meta = load_frame_metadata(dataset)
+    loaders = {
+        "shuffle": torch.utils.data.DataLoader(
+            dataset, batch_size=options.batch_size, shuffle=True, collate_fn=collate_fn
+        ),
+        "bucket": torch.utils.data.DataLoader(
+            dataset,
+            batch_sampler=BucketBatchSampler(meta, options.batch_size),
+            collate_fn=collate_fn,
+        ),
+    }
+
+    results = {}
+    for name, data_loader in loaders.items():
+        model = torchvision.models.detection.fasterrcnn_resnet50_fpn(
+            weights=None,
+            weights_backbone=None,
+            num_classes=NUM_CLASSES,
+            min_size=options.min_size,
+            max_size=options.min_size * 2,
+        )
+        results[name] = run(model, data_loader, options.steps)
+        print(
+            f"{name:>8}: {results[name][0]:.2f} images/sec, "
+            f"{100 * results[name][1]:.1f}% padded pixels"
+        )
+
+    speedup = results["bucket"][0] / results["shuffle"][0]
+    print(f"bucketed batches: {speedup:.2f}x images/sec")
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import numpy as np
+import torch
+from optparse import OptionParser
+from manifest import index_path, load_manifest, frame_paths
+
+
+BOX_STORE_FILE = "box_store.npy"
+
+# torchvision detection models reserve class 0 for the background
+STATIC_LABELS = {
+    "apple": 1,
+    "avocado": 2,
+    "kiwi": 3,
+    "lime": 4,
+    "lychee": 5,
+    "pomegranate": 6,
+    "onion": 7,
+    "strawberry": 8,
+    "lemon": 9,
+    "orange": 10,
+}
+NUM_CLASSES = len(STATIC_LABELS) + 1
+
+# arrays are written back to back in this order, each with its own .npy header
+STORE_ARRAYS = ["frames", "offsets", "boxes", "labels"]
+
+
+"""
+Converts the bounding_box_2d_tight array and labels dict of one frame into float32 [N, 4] boxes in
+x_min, y_min, x_max, y_max order and int64 [N] class ids, dropping boxes with no area.
+"""
+
+
+def parse_frame_boxes(dat, json_labels):
+    boxes = np.stack(
+        [dat["x_min"], dat["y_min"], dat["x_max"], dat["y_max"]], axis=-1
+    ).astype(np.float32)
+    keep = (boxes[:, 3] > boxes[:, 1]) & (boxes[:, 2] > boxes[:, 0])
+
+    ids = dat["semanticId"][keep].astype(np.int64)
+    if len(ids) == 0:
+        return boxes[keep], np.zeros(0, dtype=np.int64)
+    semantic_ids = np.array([int(key) for key in json_labels], dtype=np.int64)
+    order = np.argsort(semantic_ids)
+    sorted_ids = semantic_ids[order]
+    lookup = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+    missing = ids != sorted_ids[lookup] if len(sorted_ids) else np.ones(len(ids), bool)
+    if missing.any():
+        unknown = sorted(set(ids[missing].tolist()))
+        raise KeyError(f"Semantic ids {unknown} of the boxes are not in the labels")
+
+    # only the entries the boxes use need a fruit class, others may be background or unlabelled
+    names = list(json_labels.values())
+    used, inverse = np.unique(lookup, return_inverse=True)
+    classes = np.zeros(len(used), dtype=np.int64)
+    for i, row in enumerate(used):
+        name = names[order[row]].get("class")
+        if name not in STATIC_LABELS:
+            raise KeyError(
+                f"Semantic id {sorted_ids[row]} has class {name}, which is not one of "
+                f"{', '.join(STATIC_LABELS)}"
+            )
+        classes[i] = STATIC_LABELS[name]
+    labels = classes[inverse.reshape(-1)]
+    return boxes[keep], labels
+
+
+def read_frame_boxes(box_path, label_path):
+    with open(label_path, "r") as json_data:
+        json_labels = json.load(json_data)
+    return parse_frame_boxes(np.load(box_path), json_labels)
+
+
+def make_target(boxes, labels, image_id):
+    boxes = torch.from_numpy(boxes)
+    target = {}
+    target["boxes"] = boxes
+    target["labels"] = torch.from_numpy(labels)
+    target["image_id"] = torch.tensor([image_id])
+    target["area"] = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return target
+
+
+def save_arrays(path, arrays):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for array in arrays:
+            np.lib.format.write_array(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def open_arrays(path, count):
+    arrays = []
+    with open(path, "rb") as f:
+        for _ in range(count):
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            if nbytes == 0:
+                arrays.append(np.zeros(shape, dtype=dtype))
+            else:
+                arrays.append(
+                    np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+                )
+            f.seek(offset + nbytes)
+    return arrays
+
+
+"""
+Packs the boxes and class ids of every manifest frame into flat arrays. Boxes of row i of the manifest are
+boxes[offsets[i]:offsets[i + 1]].
+"""
+
+
+def build_box_store(root, store_path=None, manifest_path=None):
+    if store_path is None:
+        store_path = index_path(root, BOX_STORE_FILE)
+    frames = load_manifest(root, manifest_path)
+
+    offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+    all_boxes = []
+    all_labels = []
+    for i, row in enumerate(frames):
+        img_path, box_path, label_path = frame_paths(root, row)
+        boxes, labels = read_frame_boxes(box_path, label_path)
+        all_boxes.append(boxes)
+        all_labels.append(labels)
+        offsets[i + 1] = offsets[i] + len(boxes)
+
+    boxes = np.concatenate(all_boxes + [np.zeros((0, 4), dtype=np.float32)])
+    labels = np.concatenate(all_labels + [np.zeros(0, dtype=np.int64)])
+    save_arrays(store_path, [np.asarray(frames["frame"]), offsets, boxes, labels])
+    return store_path
+
+
+class BoxStore:
+    def __init__(self, store_path, frames=None):
+        arrays = open_arrays(store_path, len(STORE_ARRAYS))
+        self.frames, self.offsets, self.boxes, self.labels = arrays
+        if frames is not None and not np.array_equal(self.frames, frames["frame"]):
+            raise ValueError(
+                f"{store_path} does not match the dataset manifest, rebuild it with box_store.py"
+            )
+        if len(self.labels) and self.labels.min() == 0:
+            raise ValueError(
+                f"{store_path} uses class 0 for apple, rebuild it with box_store.py"
+            )
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return np.array(self.boxes[start:end]), np.array(self.labels[start:end])
+
+    def __len__(self):
+        return len(self.frames)
+
+
+"""
+Parses command line options. Requires input data directory.
+"""
+
+
+def parse_input():
+    usage = "usage: box_store.py [options] arg1 "
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data.",
+    )
+    parser.add_option(
+        "-o",
+        "--output_file",
+        dest="output_file",
+        help="Save the box store to this file (defaults to index/box_store.npy in data_dir)",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def main():
+    options, args = parse_input()
+    store_path = build_box_store(options.data_dir, options.output_file)
+    store = BoxStore(store_path)
+    print(f"Packed {len(store.boxes)} boxes from {len(store)} frames into {store_path}")
+
+
+if __name__ == "__main__":
+    main()
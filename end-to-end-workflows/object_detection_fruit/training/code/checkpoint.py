@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import queue
+import random
+import itertools
+import threading
+import warnings
+import numpy as np
+import torch
+
+
+CHECKPOINT_FILE = "checkpoint.pt"
+
+
+def to_cpu(obj):
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def rng_state():
+    state = {
+        "torch": torch.get_rng_state(),
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+"""
+Restores the grad scaler state of a checkpoint. Only fp16 uses loss scaling; a disabled scaler (fp32 or
+bf16) saves an empty state, so when the precision changed between the runs the scaler starts fresh.
+"""
+
+
+def load_scaler_state(scaler, state):
+    if bool(state) != scaler.is_enabled():
+        warnings.warn(
+            "The checkpoint was saved with a different precision, the grad scaler starts fresh"
+        )
+        return
+    scaler.load_state_dict(state)
+
+
+"""
+Copies everything needed to continue training to host memory: model, optimizer and grad scaler state, the
+position in the data (epoch and the number of steps already taken in it) and the RNG states.
+"""
+
+
+def snapshot(model, optimizer, scaler, epoch, step, global_step):
+    return {
+        "model": to_cpu(model.state_dict()),
+        "optimizer": to_cpu(optimizer.state_dict()),
+        "scaler": scaler.state_dict(),
+        "epoch": epoch,
+        "step": step,
+        "global_step": global_step,
+        "rng": rng_state(),
+    }
+
+
+"""
+Writes checkpoints from a background thread so the training loop only pays for the copy to host memory.
+At most one write is in flight; a new save waits for the previous one. Files are written next to the target
+and renamed, so an interrupted write never replaces the last good checkpoint.
+"""
+
+
+class AsyncCheckpointer:
+    def __init__(self, checkpoint_dir):
+        self.path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.queue = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                self.queue.task_done()
+                return
+            try:
+                tmp_path = self.path + ".tmp"
+                torch.save(state, tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                self.error = e
+            self.queue.task_done()
+
+    def save(self, state):
+        self.wait()
+        self.queue.put(state)
+
+    def wait(self):
+        self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        self.wait()
+        self.queue.put(None)
+        self.thread.join()
+
+
+def load_checkpoint(checkpoint_dir, device):
+    path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location=device, weights_only=False)
+
+
+"""
+Wraps a batch sampler so a resumed run can skip the batches of the current epoch that were already trained
+on without loading them. The skip only applies to the next pass over the sampler.
+"""
+
+
+class ResumableBatchSampler(torch.utils.data.Sampler):
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+        self.sampler = getattr(batch_sampler, "sampler", None)
+        self.skip = 0
+
+    def set_epoch(self, epoch):
+        for obj in (self.batch_sampler, self.sampler):
+            if hasattr(obj, "set_epoch"):
+                obj.set_epoch(epoch)
+
+    # a generator, so the skip is only consumed when iteration actually starts: the multiprocessing
+    # data loader calls iter() on the sampler twice when it starts
+    def __iter__(self):
+        skip, self.skip = self.skip, 0
+        yield from itertools.islice(self.batch_sampler, skip, None)
+
+    def __len__(self):
+        return len(self.batch_sampler) - self.skip
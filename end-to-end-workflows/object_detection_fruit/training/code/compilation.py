@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import warnings
+import torch
+
+
+COMPILE_MODES = ["default", "reduce-overhead", "max-autotune"]
+# the dense parts of the torchvision detectors; anchor generation, box decoding and NMS work on per-image
+# lists of varying length and stay eager
+COMPILE_TARGETS = [
+    "backbone",
+    "rpn.head",
+    "roi_heads.box_head",
+    "roi_heads.box_predictor",
+    "head",
+]
+
+
+def find_submodule(model, name):
+    try:
+        return model.get_submodule(name)
+    except AttributeError:
+        return None
+
+
+"""
+Replaces the forward of a submodule with its torch.compile version. Compilation happens on the first call;
+if it fails the error is reported once and the submodule keeps running eagerly, so one unsupported layer
+does not stop training. The eager forward is kept so uncompile can restore the module before it is saved.
+"""
+
+
+def compile_submodule(module, name, mode="default"):
+    eager = module.forward
+    compiled = torch.compile(eager, mode=mode)
+
+    def forward(*args, **kwargs):
+        if module.compile_failed:
+            return eager(*args, **kwargs)
+        try:
+            return compiled(*args, **kwargs)
+        except Exception as e:
+            warnings.warn(f"Compiling {name} failed, running it eagerly: {e}")
+            module.compile_failed = True
+            return eager(*args, **kwargs)
+
+    module.compile_failed = False
+    module.eager_forward = eager
+    module.forward = forward
+
+
+def compile_model(model, mode="default"):
+    if not hasattr(torch, "compile"):
+        raise ValueError("torch.compile needs PyTorch 2.0 or newer")
+    names = []
+    for name in COMPILE_TARGETS:
+        module = find_submodule(model, name)
+        if module is not None:
+            compile_submodule(module, name, mode)
+            names.append(name)
+    return names
+
+
+def uncompile(model):
+    for module in model.modules():
+        if "eager_forward" in module.__dict__:
+            del module.forward
+            del module.eager_forward
+            del module.compile_failed
+    return model
+
+
+def compile_failures(model):
+    return [
+        name
+        for name in COMPILE_TARGETS
+        if getattr(find_submodule(model, name), "compile_failed", False)
+    ]
+
+
+"""
+Scripts a detection model with TorchScript for inference. The scripted model runs without Python, takes a
+list of float [3, H, W] images and returns a (losses, detections) tuple, as torchvision detectors do when
+scripted.
+"""
+
+
+def script_model(model):
+    model.eval()
+    return torch.jit.script(uncompile(model))
@@ -0,0 +1,236 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import torch
+from image_io import prepare_images
+
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+
+
+"""
+Collects detections and ground truth of a validation run into preallocated flat arrays. Detections are
+capped at max_dets per image, ground truth arrays grow by doubling.
+"""
+
+
+class DetectionAccumulator:
+    def __init__(self, num_images, max_dets=100):
+        self.max_dets = max_dets
+        capacity = num_images * max_dets
+        self.det_boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self.det_scores = np.zeros(capacity, dtype=np.float32)
+        self.det_labels = np.zeros(capacity, dtype=np.int64)
+        self.det_images = np.zeros(capacity, dtype=np.int64)
+        self.num_dets = 0
+        self.gt_boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self.gt_labels = np.zeros(capacity, dtype=np.int64)
+        self.gt_images = np.zeros(capacity, dtype=np.int64)
+        self.num_gts = 0
+        self.num_images = 0
+
+    def grow_gts(self, needed):
+        capacity = len(self.gt_labels)
+        while capacity < needed:
+            capacity *= 2
+        for name in ["gt_boxes", "gt_labels", "gt_images"]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.num_gts] = old[: self.num_gts]
+            setattr(self, name, new)
+
+    def add(self, detections, targets):
+        for detection, target in zip(detections, targets):
+            image = self.num_images
+            self.num_images += 1
+
+            scores = detection["scores"].float().cpu().numpy()
+            keep = np.argsort(-scores, kind="stable")[: self.max_dets]
+            n = len(keep)
+            end = self.num_dets + n
+            self.det_boxes[self.num_dets : end] = (
+                detection["boxes"].float().cpu().numpy()[keep]
+            )
+            self.det_scores[self.num_dets : end] = scores[keep]
+            self.det_labels[self.num_dets : end] = (
+                detection["labels"].cpu().numpy()[keep]
+            )
+            self.det_images[self.num_dets : end] = image
+            self.num_dets = end
+
+            n = len(target["labels"])
+            end = self.num_gts + n
+            if end > len(self.gt_labels):
+                self.grow_gts(end)
+            self.gt_boxes[self.num_gts : end] = target["boxes"].cpu().numpy()
+            self.gt_labels[self.num_gts : end] = target["labels"].cpu().numpy()
+            self.gt_images[self.num_gts : end] = image
+            self.num_gts = end
+
+
+def group_ranks(groups, order):
+    # position of every element within its group, given an order that sorts by group
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    lengths = np.diff(np.r_[starts, len(sorted_groups)])
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - np.repeat(starts, lengths)
+    return ranks
+
+
+def box_iou(boxes1, boxes2):
+    # boxes1 [..., D, 4] and boxes2 [..., T, 4] give IoU [..., D, T]
+    area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+    area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+    lt = np.maximum(boxes1[..., :, None, :2], boxes2[..., None, :, :2])
+    rb = np.minimum(boxes1[..., :, None, 2:], boxes2[..., None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area1[..., :, None] + area2[..., None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+"""
+COCO-style evaluation. Detections and ground truth are grouped by (image, class) and padded into
+[groups, dets] and [groups, gts] arrays, so the IoUs of all groups are computed in one broadcast. Greedy
+matching steps through detection ranks (at most max_dets) and matches every group and IoU threshold at
+once. Returns mAP over IoU 0.5:0.95, mAP at 0.5 and 0.75 and mean recall, averaged over classes with
+ground truth.
+"""
+
+
+def evaluate_detections(acc, num_classes, iou_thresholds=IOU_THRESHOLDS):
+    det_labels = acc.det_labels[: acc.num_dets]
+    det_scores = acc.det_scores[: acc.num_dets]
+    det_groups = acc.det_images[: acc.num_dets] * num_classes + det_labels
+    gt_labels = acc.gt_labels[: acc.num_gts]
+    gt_groups = acc.gt_images[: acc.num_gts] * num_classes + gt_labels
+
+    groups, det_group_idx = np.unique(det_groups, return_inverse=True)
+    det_group_idx = det_group_idx.reshape(-1)
+    num_groups = len(groups)
+    # ground truth of groups without detections can only add false negatives
+    gt_group_idx = np.searchsorted(groups, gt_groups)
+    gt_in_group = np.zeros(len(gt_groups), dtype=bool)
+    if num_groups:
+        position = np.minimum(gt_group_idx, num_groups - 1)
+        gt_in_group = groups[position] == gt_groups
+
+    det_order = np.lexsort((-det_scores, det_group_idx))
+    det_rank = group_ranks(det_group_idx, det_order)
+    num_dets_per_group = max(int(det_rank.max()) + 1, 1) if len(det_rank) else 1
+
+    gt_sel = np.flatnonzero(gt_in_group)
+    gt_order = np.argsort(gt_group_idx[gt_sel], kind="stable")
+    gt_rank = group_ranks(gt_group_idx[gt_sel], gt_order)
+    num_gts_per_group = max(int(gt_rank.max()) + 1, 1) if len(gt_rank) else 1
+
+    padded_dets = np.zeros((num_groups, num_dets_per_group, 4), dtype=np.float32)
+    det_valid = np.zeros((num_groups, num_dets_per_group), dtype=bool)
+    padded_dets[det_group_idx, det_rank] = acc.det_boxes[: acc.num_dets]
+    det_valid[det_group_idx, det_rank] = True
+    padded_gts = np.zeros((num_groups, num_gts_per_group, 4), dtype=np.float32)
+    gt_valid = np.zeros((num_groups, num_gts_per_group), dtype=bool)
+    padded_gts[gt_group_idx[gt_sel], gt_rank] = acc.gt_boxes[: acc.num_gts][gt_sel]
+    gt_valid[gt_group_idx[gt_sel], gt_rank] = True
+
+    ious = box_iou(padded_dets, padded_gts)
+    ious[~np.broadcast_to(gt_valid[:, None, :], ious.shape)] = -1.0
+    thresholds = np.asarray(iou_thresholds)[:, None, None]
+    matched = np.zeros((len(iou_thresholds), num_groups, num_gts_per_group), dtype=bool)
+    tp = np.zeros((len(iou_thresholds), num_groups, num_dets_per_group), dtype=bool)
+    for d in range(num_dets_per_group):
+        candidates = np.where(matched, -1.0, ious[None, :, d, :])
+        best = candidates.argmax(axis=-1)
+        best_iou = np.take_along_axis(candidates, best[..., None], axis=-1)[..., 0]
+        hit = (best_iou >= thresholds[..., 0]) & det_valid[None, :, d]
+        tp[:, :, d] = hit
+        th_index, g_index = np.nonzero(hit)
+        matched[th_index, g_index, best[th_index, g_index]] = True
+
+    tp_flat = tp[:, det_group_idx, det_rank]
+    group_labels = groups % num_classes
+    det_class = group_labels[det_group_idx]
+    gt_counts = np.bincount(gt_labels, minlength=num_classes)
+
+    ap = np.full((len(iou_thresholds), num_classes), np.nan)
+    recall = np.full((len(iou_thresholds), num_classes), np.nan)
+    for c in np.flatnonzero(gt_counts):
+        sel = np.flatnonzero(det_class == c)
+        if len(sel) == 0:
+            ap[:, c] = 0.0
+            recall[:, c] = 0.0
+            continue
+        order = sel[np.argsort(-det_scores[sel], kind="mergesort")]
+        tps = np.cumsum(tp_flat[:, order], axis=1)
+        fps = np.cumsum(~tp_flat[:, order], axis=1)
+        rec = tps / gt_counts[c]
+        prec = tps / np.maximum(tps + fps, 1)
+        # precision envelope, then sample it at the 101 COCO recall points
+        prec = np.flip(np.maximum.accumulate(np.flip(prec, axis=1), axis=1), axis=1)
+        for t in range(len(iou_thresholds)):
+            idx = np.searchsorted(rec[t], RECALL_THRESHOLDS, side="left")
+            valid = idx < rec.shape[1]
+            sampled = np.zeros(len(RECALL_THRESHOLDS))
+            sampled[valid] = prec[t, idx[valid]]
+            ap[t, c] = sampled.mean()
+        recall[:, c] = rec[:, -1]
+
+    iou_list = list(np.round(iou_thresholds, 2))
+    return {
+        "mAP": float(np.nanmean(ap)) if gt_counts.any() else 0.0,
+        "mAP50": (
+            float(np.nanmean(ap[iou_list.index(0.5)])) if 0.5 in iou_list else None
+        ),
+        "mAP75": (
+            float(np.nanmean(ap[iou_list.index(0.75)])) if 0.75 in iou_list else None
+        ),
+        "recall": float(np.nanmean(recall)) if gt_counts.any() else 0.0,
+    }
+
+
+"""
+Runs batched eval-mode inference over a data loader and returns COCO-style mAP and recall.
+"""
+
+
+@torch.inference_mode()
+def evaluate(model, data_loader, device, num_classes, max_dets=100):
+    was_training = model.training
+    model.eval()
+    acc = DetectionAccumulator(len(data_loader.dataset), max_dets)
+    for imgs, targets in data_loader:
+        imgs = prepare_images(imgs, device)
+        acc.add(model(imgs), targets)
+    model.train(was_training)
+    return evaluate_detections(acc, num_classes)
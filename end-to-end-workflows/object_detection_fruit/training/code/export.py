@@ -30,9 +30,19 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
+import inspect
+import numpy as np
 import torch
-import torchvision
+from typing import List
+from torchvision.transforms import functional as F
 from optparse import OptionParser
+from compilation import script_model
+from manifest import load_manifest, frame_paths
+from image_io import read_image
+
+
+OUTPUT_NAMES = ["boxes", "scores", "labels", "num_detections"]
 
 
 def parse_input():
@@ -50,33 +60,248 @@ def parse_input():
         dest="output_dir",
         help="Export and save ONNX model to this path",
     )
+    parser.add_option(
+        "--torchscript",
+        dest="torchscript",
+        action="store_true",
+        default=False,
+        help="Also save an eval-mode TorchScript model as model.pt",
+    )
+    parser.add_option(
+        "--opset",
+        dest="opset",
+        type="int",
+        default=11,
+        help="ONNX opset version",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Image size used to trace the model, height and width stay dynamic",
+    )
+    parser.add_option(
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        help="Export a fixed batch size without the batch loop, as quantize.py needs",
+    )
+    parser.add_option(
+        "--check",
+        dest="check",
+        action="store_true",
+        default=False,
+        help="Compare ONNX Runtime outputs with the PyTorch model on CPU after exporting",
+    )
+    parser.add_option(
+        "--data_dir",
+        dest="data_dir",
+        help="Frames to use for --check instead of random images",
+    )
     (options, args) = parser.parse_args()
     return options, args
 
 
+class SingleImageDetector(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        detections = self.model([image])[0]
+        return detections["boxes"], detections["scores"], detections["labels"]
+
+
+"""
+Runs a traced single image detector over a batch in a scripted loop, which exports as an ONNX Loop so the
+batch size stays dynamic. Detections after NMS are padded to max_detections per image; num_detections says
+how many rows of boxes, scores and labels are valid. Boxes are in input image pixels.
+"""
+
+
+class BatchedDetector(torch.nn.Module):
+    def __init__(self, detector, max_detections: int):
+        super().__init__()
+        self.detector = detector
+        self.max_detections = max_detections
+
+    def forward(self, images):
+        boxes: List[torch.Tensor] = []
+        scores: List[torch.Tensor] = []
+        labels: List[torch.Tensor] = []
+        counts: List[torch.Tensor] = []
+        for i in range(images.shape[0]):
+            image_boxes, image_scores, image_labels = self.detector(images[i])
+            pad = self.max_detections - image_boxes.shape[0]
+            boxes.append(torch.nn.functional.pad(image_boxes, [0, 0, 0, pad]))
+            scores.append(torch.nn.functional.pad(image_scores, [0, pad]))
+            labels.append(torch.nn.functional.pad(image_labels, [0, pad]))
+            # a reduction rather than torch.tensor(shape), which exports as an invalid sequence op
+            counts.append(torch.ones_like(image_labels).sum())
+        return (
+            torch.stack(boxes),
+            torch.stack(scores),
+            torch.stack(labels),
+            torch.stack(counts),
+        )
+
+
+def max_detections(model):
+    if hasattr(model, "roi_heads"):
+        return model.roi_heads.detections_per_img
+    return model.detections_per_img
+
+
+"""
+Exports the detector to ONNX with dynamic height and width. Without batch_size the batch is dynamic too;
+with batch_size the loop over the batch is unrolled for that many images, which leaves every operator in the
+main graph where ONNX Runtime's INT8 calibration can observe it.
+"""
+
+
+def export_onnx(model, path, size=1024, opset=11, batch_size=None):
+    example = torch.rand(3, size, size)
+    if batch_size is None:
+        detector = torch.jit.trace(
+            SingleImageDetector(model), example, check_trace=False
+        )
+        batched = torch.jit.script(
+            BatchedDetector(detector, max_detections(model)).eval()
+        )
+        example_batch = example[None].repeat(2, 1, 1, 1)
+        dynamic_axes = {name: {0: "batch"} for name in OUTPUT_NAMES}
+        dynamic_axes["input"] = {0: "batch", 2: "height", 3: "width"}
+    else:
+        # eval, or the exporter restores the new wrapper's training mode onto the model
+        batched = BatchedDetector(SingleImageDetector(model), max_detections(model))
+        batched.eval()
+        example_batch = example[None].repeat(batch_size, 1, 1, 1)
+        dynamic_axes = {"input": {2: "height", 3: "width"}}
+    # newer PyTorch defaults to the dynamo exporter, which cannot export the scripted loop
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        batched,
+        example_batch,
+        path,
+        opset_version=opset,
+        input_names=["input"],
+        output_names=OUTPUT_NAMES,
+        dynamic_axes=dynamic_axes,
+        **kwargs,
+    )
+
+
+"""
+Returns the two batches the parity check runs: batch_sizes[0] images at the deployed size x size, then
+batch_sizes[1] images at a smaller, non square size to exercise the dynamic height and width. With data_dir
+the frames are read from the dataset and resized to those shapes, as deployment preprocessing does, so
+datasets with mixed frame sizes stack; without it the images are random.
+"""
+
+
+def check_batches(data_dir, size, batch_sizes=(2, 1)):
+    shapes = [(size, size), (size // 2, size * 3 // 4)]
+    if data_dir is None:
+        generator = torch.Generator().manual_seed(0)
+        return [
+            torch.rand(count, 3, *shape, generator=generator)
+            for count, shape in zip(batch_sizes, shapes)
+        ]
+    frames = load_manifest(data_dir)[: sum(batch_sizes)]
+    images = [read_image(frame_paths(data_dir, row)[0])[0] for row in frames]
+    batches = []
+    for count, shape in zip(batch_sizes, shapes):
+        batch = [F.resize(img, list(shape), antialias=True) for img in images[:count]]
+        batches.append(torch.stack(batch).float() / 255)
+        images = images[count:]
+    return batches
+
+
+"""
+Matches every detection to the closest reference detection of the same class and counts those within box_tol
+pixels and score_tol of it. Near-equal scores can swap which box survives NMS, so callers accept a fraction.
+"""
+
+
+def match_detections(detections, reference, box_tol=1.0, score_tol=1e-3):
+    boxes, scores, labels = detections
+    ref_boxes, ref_scores, ref_labels = reference
+    total = max(len(boxes), len(ref_boxes))
+    if len(boxes) == 0 or len(ref_boxes) == 0:
+        return 0, total
+    diff = np.abs(boxes[:, None] - ref_boxes[None]).max(axis=2)
+    diff[labels[:, None] != ref_labels[None]] = np.inf
+    best = diff.argmin(axis=1)
+    ok = (diff.min(axis=1) <= box_tol) & (
+        np.abs(scores - ref_scores[best]) <= score_tol
+    )
+    return int(ok.sum()), total
+
+
+"""
+Runs the PyTorch model and the exported graph with ONNX Runtime on the same CPU batches, including a second
+image size, and passes when at least min_matched of the ONNX detections match PyTorch. A check without any
+detections fails, since it compared nothing.
+"""
+
+
+def check_parity(model, onnx_path, batches, min_matched=0.98):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    total, matched = 0, 0
+    for images in batches:
+        boxes, scores, labels, counts = session.run(None, {"input": images.numpy()})
+        with torch.no_grad():
+            expected = model(list(images))
+        for i, reference in enumerate(expected):
+            n = counts[i]
+            ok, count = match_detections(
+                (boxes[i, :n], scores[i, :n], labels[i, :n]),
+                (
+                    reference["boxes"].numpy(),
+                    reference["scores"].numpy(),
+                    reference["labels"].numpy(),
+                ),
+            )
+            matched += ok
+            total += count
+        print(f"Checked batch of {tuple(images.shape)}")
+    if total == 0:
+        # nothing above the score threshold, so nothing was compared
+        print("Neither model detected anything, the check is inconclusive")
+        return False
+    fraction = matched / total
+    print(f"{matched}/{total} detections match PyTorch ({100 * fraction:.1f}%)")
+    return fraction >= min_matched
+
+
 def main():
     torch.manual_seed(0)
     options, args = parse_input()
-    model = torch.load(options.pytorch_dir)
+    model = torch.load(options.pytorch_dir, map_location="cpu", weights_only=False)
     model.eval()
+    print(f"Exporting {getattr(model, 'arch', 'fasterrcnn_resnet50_fpn')}")
     OUTPUT_DIR = options.output_dir
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(
-        weights="DEFAULT", num_classes=91
-    )
-    model.eval()
+    if options.torchscript:
+        script_model(model).save(os.path.join(OUTPUT_DIR, "model.pt"))
 
-    dummy_input = torch.rand(1, 3, 1024, 1024)
+    onnx_path = os.path.join(OUTPUT_DIR, "model.onnx")
+    export_onnx(model, onnx_path, options.size, options.opset, options.batch_size)
 
-    torch.onnx.export(
-        model,
-        dummy_input,
-        os.path.join(OUTPUT_DIR, "model.onnx"),
-        opset_version=11,
-        input_names=["input"],
-        output_names=["output"],
-    )
+    if options.check:
+        batch_sizes = (
+            (2, 1) if options.batch_size is None else (options.batch_size,) * 2
+        )
+        batches = check_batches(options.data_dir, options.size, batch_sizes)
+        if not check_parity(model, onnx_path, batches):
+            print("ONNX outputs do not match PyTorch")
+            sys.exit(1)
 
 
 if __name__ == "__main__":
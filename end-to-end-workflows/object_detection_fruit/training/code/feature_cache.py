@@ -0,0 +1,265 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+import torch.utils.data
+from torchvision.models.detection.image_list import ImageList
+from box_store import STATIC_LABELS, save_arrays, open_arrays
+from image_io import prepare_images
+
+
+CACHE_META_FILE = "features.json"
+INDEX_FILE = "index.npy"
+INDEX_ARRAYS = ["image_sizes", "offsets", "boxes", "labels"]
+# features are stored as symmetric int8 with one float scale per image and channel
+FEATURE_DTYPE = "int8"
+QUANT_MAX = 127
+
+
+def backbone_fingerprint(model):
+    # cheap checksum of the frozen weights, a cache built from another backbone must not be reused
+    total = sum(p.detach().double().sum().item() for p in model.backbone.parameters())
+    return f"{total:.10e}"
+
+
+def transform_size(model):
+    return [list(model.transform.min_size), model.transform.max_size]
+
+
+def dataset_identity(dataset):
+    # the train split is a Subset of a FruitDataset, identified by its directory and the frames it covers
+    indices = range(len(dataset))
+    if isinstance(dataset, torch.utils.data.Subset):
+        dataset, indices = dataset.dataset, dataset.indices
+    frames = np.ascontiguousarray(
+        dataset.frames["frame"][list(indices)], dtype=np.int64
+    )
+    return {
+        "data_dir": os.path.abspath(dataset.root),
+        "num_frames": len(frames),
+        "frames": hashlib.sha1(frames.tobytes()).hexdigest(),
+    }
+
+
+def is_cache_valid(cache_dir, model, dataset):
+    meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    return (
+        meta["backbone"] == backbone_fingerprint(model)
+        and meta.get("labels") == STATIC_LABELS
+        and meta.get("image_size") == transform_size(model)
+        and meta.get("dataset") == dataset_identity(dataset)
+        and meta.get("dtype") == FEATURE_DTYPE
+    )
+
+
+def quantize_features(feature):
+    amax = feature.float().abs().amax(dim=(2, 3))
+    scale = (amax / QUANT_MAX).clamp(min=torch.finfo(torch.float32).tiny)
+    values = torch.round(feature / scale[:, :, None, None]).clamp(-QUANT_MAX, QUANT_MAX)
+    return values.to(torch.int8), scale
+
+
+def dequantize_features(values, scale):
+    return values.float() * scale[:, :, None, None]
+
+
+"""
+Runs the frozen transform, backbone and FPN of a torchvision detection model over a dataset once and stores
+every FPN level as an int8 [N, C, H, W] memory-mapped array with a float32 [N, C] scale per image and
+channel, half the size of fp16 maps, together with the resized image sizes and the boxes and labels in the
+resized frame. All images must have the same size so the levels line up.
+"""
+
+
+@torch.no_grad()
+def build_feature_cache(model, data_loader, cache_dir, device):
+    os.makedirs(cache_dir, exist_ok=True)
+    model.eval()
+    num_images = len(data_loader.dataset)
+    levels = None
+    image_sizes = np.zeros((num_images, 2), dtype=np.int64)
+    offsets = np.zeros(num_images + 1, dtype=np.int64)
+    all_boxes = []
+    all_labels = []
+    padded_size = None
+
+    i = 0
+    for imgs, annotations in data_loader:
+        imgs = prepare_images(imgs, device)
+        annotations = [{k: v.to(device) for k, v in t.items()} for t in annotations]
+        image_list, annotations = model.transform(imgs, annotations)
+        features = model.backbone(image_list.tensors)
+
+        if levels is None:
+            padded_size = list(image_list.tensors.shape[-2:])
+            levels = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(cache_dir, f"level_{name}.npy"),
+                    "w+",
+                    np.int8,
+                    (num_images,) + tuple(feature.shape[1:]),
+                )
+                for name, feature in features.items()
+            }
+            scales = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(cache_dir, f"scale_{name}.npy"),
+                    "w+",
+                    np.float32,
+                    (num_images, feature.shape[1]),
+                )
+                for name, feature in features.items()
+            }
+        if list(image_list.tensors.shape[-2:]) != padded_size:
+            raise ValueError("All images of a feature cache must have the same size")
+
+        batch = len(imgs)
+        for name, feature in features.items():
+            values, scale = quantize_features(feature)
+            levels[name][i : i + batch] = values.cpu().numpy()
+            scales[name][i : i + batch] = scale.cpu().numpy()
+        for j, target in enumerate(annotations):
+            image_sizes[i + j] = image_list.image_sizes[j]
+            all_boxes.append(target["boxes"].cpu().numpy())
+            all_labels.append(target["labels"].cpu().numpy())
+            offsets[i + j + 1] = offsets[i + j] + len(target["boxes"])
+        i += batch
+
+    for level in list(levels.values()) + list(scales.values()):
+        level.flush()
+    boxes = np.concatenate(all_boxes + [np.zeros((0, 4), dtype=np.float32)])
+    labels = np.concatenate(all_labels + [np.zeros(0, dtype=np.int64)])
+    save_arrays(
+        os.path.join(cache_dir, INDEX_FILE), [image_sizes, offsets, boxes, labels]
+    )
+    with open(os.path.join(cache_dir, CACHE_META_FILE), "w") as f:
+        meta = {
+            "backbone": backbone_fingerprint(model),
+            "labels": STATIC_LABELS,
+            "image_size": transform_size(model),
+            "dataset": dataset_identity(data_loader.dataset),
+            "dtype": FEATURE_DTYPE,
+            "levels": list(levels),
+            "padded_size": padded_size,
+        }
+        json.dump(meta, f, indent=2)
+
+
+"""
+Serves cached FPN features. Each sample is a dict of per-level int8 tensors, their per-channel scales under
+"scales" and the resized image size, with the target already in the resized frame. The features stay int8
+until CachedFeatureHeads dequantizes the batch on the device.
+"""
+
+
+class FeatureCacheDataset(torch.utils.data.Dataset):
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, CACHE_META_FILE), "r") as f:
+            meta = json.load(f)
+        self.levels = {
+            name: np.load(os.path.join(cache_dir, f"level_{name}.npy"), mmap_mode="r")
+            for name in meta["levels"]
+        }
+        self.scales = {
+            name: np.load(os.path.join(cache_dir, f"scale_{name}.npy"), mmap_mode="r")
+            for name in meta["levels"]
+        }
+        self.padded_size = meta["padded_size"]
+        index = open_arrays(os.path.join(cache_dir, INDEX_FILE), len(INDEX_ARRAYS))
+        self.image_sizes, self.offsets, self.boxes, self.labels = index
+
+    def __getitem__(self, idx):
+        features = {
+            name: torch.from_numpy(np.array(level[idx]))
+            for name, level in self.levels.items()
+        }
+        features["scales"] = {
+            name: torch.from_numpy(np.array(scale[idx]))
+            for name, scale in self.scales.items()
+        }
+        features["image_size"] = torch.from_numpy(np.array(self.image_sizes[idx]))
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        target = {}
+        target["boxes"] = torch.from_numpy(np.array(self.boxes[start:end]))
+        target["labels"] = torch.from_numpy(np.array(self.labels[start:end]))
+        return features, target
+
+    def __len__(self):
+        return len(self.image_sizes)
+
+
+"""
+Runs only the RPN and ROI heads of a detection model on batches of cached features. The backbone is frozen
+and not called, so only the heads receive gradients.
+"""
+
+
+class CachedFeatureHeads(torch.nn.Module):
+    def __init__(self, model, padded_size):
+        super().__init__()
+        self.model = model
+        self.padded_size = padded_size
+        for param in model.backbone.parameters():
+            param.requires_grad_(False)
+
+    def forward(self, batch, targets=None):
+        names = [name for name in batch[0] if name not in ("image_size", "scales")]
+        features = {
+            name: dequantize_features(
+                torch.stack([sample[name] for sample in batch]),
+                torch.stack([sample["scales"][name] for sample in batch]),
+            )
+            for name in names
+        }
+        image_sizes = [tuple(sample["image_size"].tolist()) for sample in batch]
+        # the anchor generator only reads the shape, dtype and device of the padded batch
+        shape = (len(batch), 3) + tuple(self.padded_size)
+        placeholder = features[names[0]].new_zeros(()).expand(shape)
+        images = ImageList(placeholder, image_sizes)
+
+        proposals, proposal_losses = self.model.rpn(images, features, targets)
+        detections, detector_losses = self.model.roi_heads(
+            features, proposals, images.image_sizes, targets
+        )
+        if self.training:
+            losses = {}
+            losses.update(detector_losses)
+            losses.update(proposal_losses)
+            return losses
+        return detections
@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import fcntl
+import numpy as np
+
+
+CACHE_POLICIES = ["static", "direct"]
+
+
+"""
+Keeps decoded uint8 HxWx3 frames in a memory-mapped file on local disk so each PNG is decoded once instead
+of once per epoch. Every frame maps to slot idx % capacity, where capacity is set by max_bytes. With the
+static policy only the first capacity frames are admitted and never evicted, which gives the best hit rate
+for shuffled epochs. With the direct policy a frame replaces whatever occupies its slot, which follows a
+changing working set at the cost of rewriting slots. Each slot also keeps the (x, y) scale from the source
+frame to the cached image, since frames of different sizes can be downscaled to the same shape.
+"""
+
+
+class ImageCache:
+    def __init__(
+        self, cache_dir, num_frames, shape, max_bytes, policy="static", key=None
+    ):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(
+                f"Unknown cache policy {policy}, use one of {CACHE_POLICIES}"
+            )
+        self.cache_dir = cache_dir
+        self.shape = tuple(shape)
+        self.policy = policy
+        frame_bytes = int(np.prod(self.shape))
+        self.capacity = int(min(num_frames, max_bytes // frame_bytes))
+        self.images = None
+        self.slots = None
+        self.scales = None
+
+        if self.capacity == 0:
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+        meta = {"key": key, "shape": list(self.shape), "capacity": self.capacity}
+        meta_path = os.path.join(cache_dir, "cache.json")
+        # ranks on the same node share cache_dir, the first one creates the files while the others wait
+        with open(self.path("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(meta_path):
+                with open(meta_path, "r") as f:
+                    if json.load(f) == meta and os.path.exists(self.path("scales.npy")):
+                        return
+            # layout changed or new cache, start from empty slots
+            np.lib.format.open_memmap(
+                self.path("images.npy"), "w+", np.uint8, (self.capacity,) + self.shape
+            ).flush()
+            slots = np.lib.format.open_memmap(
+                self.path("slots.npy"), "w+", np.int64, (self.capacity,)
+            )
+            slots[:] = -1
+            slots.flush()
+            np.lib.format.open_memmap(
+                self.path("scales.npy"), "w+", np.float64, (self.capacity, 2)
+            ).flush()
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def open(self):
+        # opened lazily so each dataloader worker maps the files itself instead of receiving a pickled copy
+        if self.images is None:
+            self.images = np.load(self.path("images.npy"), mmap_mode="r+")
+            self.slots = np.load(self.path("slots.npy"), mmap_mode="r+")
+            self.scales = np.load(self.path("scales.npy"), mmap_mode="r+")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["images"] = None
+        state["slots"] = None
+        state["scales"] = None
+        return state
+
+    # returns (image, scale) for a cached frame, None on a miss
+    def get(self, idx):
+        if self.capacity == 0:
+            return None
+        self.open()
+        slot = idx % self.capacity
+        if self.slots[slot] != idx:
+            return None
+        scale = tuple(float(v) for v in self.scales[slot])
+        if self.policy == "static":
+            return self.images[slot], scale
+        image = np.array(self.images[slot])
+        # another worker may have replaced the slot while it was being copied
+        return (image, scale) if self.slots[slot] == idx else None
+
+    def put(self, idx, image, scale=(1.0, 1.0)):
+        if self.capacity == 0 or image.shape != self.shape:
+            return
+        if self.policy == "static" and idx >= self.capacity:
+            return
+        self.open()
+        slot = idx % self.capacity
+        with open(self.path("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.slots[slot] = -1
+            self.images[slot] = image
+            self.scales[slot] = scale
+            self.slots[slot] = idx
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import torch
+import torchvision
+from torchvision.io import ImageReadMode
+from torchvision.transforms import functional as F
+
+
+def scaled_size(width, height, target_size):
+    # the longer side becomes target_size, frames that are already smaller are left alone
+    if target_size is None or max(width, height) <= target_size:
+        return width, height
+    scale = target_size / max(width, height)
+    return round(width * scale), round(height * scale)
+
+
+"""
+Decodes PNG bytes (a uint8 tensor) to a uint8 [3, H, W] tensor with libpng, dropping the alpha channel of
+the BasicWriter rgb output. With target_size the image is resized in uint8 before it leaves the worker, and
+the (x, y) scale to apply to its boxes is returned with it.
+"""
+
+
+def decode_image(data, target_size=None):
+    img = torchvision.io.decode_png(data, ImageReadMode.RGB)
+    height, width = img.shape[-2:]
+    new_width, new_height = scaled_size(width, height, target_size)
+    if (new_width, new_height) == (width, height):
+        return img, (1.0, 1.0)
+    img = F.resize(img, [new_height, new_width], antialias=True)
+    return img, (new_width / width, new_height / height)
+
+
+def read_image(path, target_size=None):
+    return decode_image(torchvision.io.read_file(path), target_size)
+
+
+def scale_boxes(boxes, scale):
+    if scale == (1.0, 1.0):
+        return boxes
+    sx, sy = scale
+    return boxes * np.array([sx, sy, sx, sy], dtype=boxes.dtype)
+
+
+"""
+Moves a batch of uint8 images to the device and converts them to float there, so workers send and the host
+copies a quarter of the bytes of float images.
+"""
+
+
+def prepare_images(imgs, device):
+    return [
+        F.convert_image_dtype(img.to(device, non_blocking=True), torch.float)
+        for img in imgs
+    ]
@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import contextlib
+import torch
+from distributed import is_distributed, get_world_size, is_main_process
+
+
+PHASES = ["data", "h2d", "forward", "backward", "optimizer"]
+
+
+"""
+Times the phases of each training step without synchronising the device every step. The data phase is the
+host time spent waiting for the dataloader. On CUDA the other phases are measured with events that are only
+read when the logger flushes; on CPU they are plain wall clock times.
+"""
+
+
+class StepTimer:
+    def __init__(self, device):
+        self.use_events = device.type == "cuda"
+        self.pending = []
+        self.marks = []
+        self.last_end = time.perf_counter()
+
+    def now(self):
+        if self.use_events:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    def start_step(self):
+        # data loading has finished once the batch is in hand
+        self.data_time = time.perf_counter() - self.last_end
+        self.marks = [self.now()]
+
+    def mark(self):
+        self.marks.append(self.now())
+
+    def end_step(self):
+        self.pending.append((self.data_time, self.marks))
+        self.last_end = time.perf_counter()
+
+    def collect(self):
+        totals = dict.fromkeys(PHASES, 0.0)
+        if self.use_events and self.pending:
+            self.pending[-1][1][-1].synchronize()
+        for data_time, marks in self.pending:
+            totals["data"] += data_time
+            for phase, start, end in zip(PHASES[1:], marks[:-1], marks[1:]):
+                if self.use_events:
+                    totals[phase] += start.elapsed_time(end) / 1000.0
+                else:
+                    totals[phase] += end - start
+        steps = max(len(self.pending), 1)
+        self.pending = []
+        return {phase: total / steps for phase, total in totals.items()}
+
+
+"""
+Collects losses and timings on the device and writes them to TensorBoard every log_every steps, so the loop
+only waits for the device once per interval. Losses are averaged over ranks in one all_reduce at that point.
+"""
+
+
+class TrainingLogger:
+    def __init__(self, writer, device, log_every=20, num_batches=None):
+        self.writer = writer
+        self.log_every = log_every
+        self.num_batches = num_batches
+        self.timer = StepTimer(device)
+        self.losses = []
+        self.loss_names = []
+        self.images = 0
+        self.global_step = 0
+        self.interval_start = time.perf_counter()
+
+    def start_step(self):
+        self.timer.start_step()
+
+    def mark(self):
+        self.timer.mark()
+
+    def end_step(self, loss_dict, num_images, epoch, step):
+        self.timer.end_step()
+        self.losses.append(torch.stack([loss.detach() for loss in loss_dict.values()]))
+        self.loss_names = list(loss_dict)
+        self.images += num_images
+        self.global_step += 1
+        if len(self.losses) >= self.log_every:
+            self.flush(epoch, step)
+
+    def flush(self, epoch, step):
+        if not self.losses:
+            return
+        losses = torch.stack(self.losses).float()
+        if is_distributed():
+            torch.distributed.all_reduce(losses)
+            losses /= get_world_size()
+        losses = losses.cpu()
+        timings = self.timer.collect()
+        elapsed = time.perf_counter() - self.interval_start
+        images_per_sec = self.images * get_world_size() / elapsed
+
+        if is_main_process():
+            first_step = self.global_step - len(losses)
+            for offset, step_losses in enumerate(losses):
+                global_step = first_step + offset + 1
+                self.writer.add_scalar("Loss/train", step_losses.sum(), global_step)
+                for name, loss in zip(self.loss_names, step_losses):
+                    self.writer.add_scalar(f"Loss/{name}", loss, global_step)
+            for phase, seconds in timings.items():
+                self.writer.add_scalar(f"Time/{phase}", seconds, self.global_step)
+            self.writer.add_scalar(
+                "Throughput/images_per_sec", images_per_sec, self.global_step
+            )
+            data_share = timings["data"] / max(sum(timings.values()), 1e-9)
+            iteration = (
+                step if self.num_batches is None else f"{step}/{self.num_batches}"
+            )
+            print(
+                f"Epoch: {epoch}, Iteration: {iteration}, "
+                f"Loss: {losses[-1].sum():.4f}, {images_per_sec:.1f} images/sec, "
+                f"{100 * data_share:.0f}% waiting for data"
+            )
+
+        self.losses = []
+        self.images = 0
+        self.interval_start = time.perf_counter()
+
+
+"""
+Records a torch.profiler trace of steps [start, end) into log_dir for the TensorBoard profiler plugin.
+Returns a context whose step() must be called once per training step.
+"""
+
+
+def create_profiler(log_dir, start, end, device):
+    if start is None:
+        return contextlib.nullcontext(NullProfiler())
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device.type == "cuda":
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(
+            wait=start, warmup=0, active=end - start, repeat=1
+        ),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(log_dir),
+        record_shapes=True,
+    )
+
+
+class NullProfiler:
+    def step(self):
+        pass
@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import random
+import torch
+import torch.utils.data
+from manifest import FRAME_PATTERNS, scan_frames
+from box_store import read_frame_boxes, make_target
+from image_io import read_image, scale_boxes
+from shards import worker_shard
+
+
+"""
+Samples frames from a BasicWriter directory that is still being written. The directory is rescanned once per
+epoch, at most every poll_interval seconds, and a frame joins the sampling pool once its rgb, npy and json
+files all exist, are not empty and have not been modified for settle_time seconds. Each epoch draws
+samples_per_epoch frames uniformly from the pool as it is at that moment, so later epochs see more data.
+The scan runs in set_epoch in the main process and the dataloader workers sample from their copy of the pool,
+so a directory is listed once per epoch rather than once per worker. Files are never moved.
+"""
+
+
+class LiveFruitDataset(torch.utils.data.IterableDataset):
+    def __init__(
+        self,
+        root,
+        transforms,
+        samples_per_epoch=1000,
+        min_frames=16,
+        settle_time=2.0,
+        poll_interval=5.0,
+        seed=0,
+        target_size=None,
+    ):
+        self.root = root
+        self.transforms = transforms
+        self.target_size = target_size
+        self.samples_per_epoch = samples_per_epoch
+        self.min_frames = min_frames
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.seed = seed
+        self.epoch = 0
+        self.pool = []
+        self.admitted = set()
+        self.last_scan = 0.0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+        self.wait_for_frames()
+
+    def is_settled(self, paths, now):
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return False
+            if stat.st_size == 0 or now - stat.st_mtime < self.settle_time:
+                return False
+        return True
+
+    def refresh(self):
+        now = time.time()
+        if now - self.last_scan < self.poll_interval:
+            return
+        self.last_scan = now
+        frame_ids, found, incomplete = scan_frames(self.root)
+        for frame_id in frame_ids:
+            if frame_id in self.admitted:
+                continue
+            paths = [
+                os.path.join(self.root, found[key][frame_id]) for key in FRAME_PATTERNS
+            ]
+            if self.is_settled(paths, now):
+                self.admitted.add(frame_id)
+                self.pool.append((frame_id, paths))
+
+    def wait_for_frames(self):
+        self.refresh()
+        while len(self.pool) < self.min_frames:
+            print(
+                f"Waiting for frames in {self.root}: {len(self.pool)}/{self.min_frames}"
+            )
+            time.sleep(self.poll_interval)
+            self.refresh()
+
+    def decode(self, frame_id, paths):
+        img_path, box_path, label_path = paths
+        img, scale = read_image(img_path, self.target_size)
+        boxes, labels = read_frame_boxes(box_path, label_path)
+        target = make_target(scale_boxes(boxes, scale), labels, frame_id)
+
+        if self.transforms is not None:
+            img = self.transforms(img)
+        return img, target
+
+    def __iter__(self):
+        shard, num_shards = worker_shard()
+        rng = random.Random(hash((self.seed, self.epoch, shard)))
+        if not self.pool:
+            # iterated without set_epoch
+            self.wait_for_frames()
+        # the same count on every worker keeps distributed ranks in step
+        for _ in range(self.samples_per_epoch // num_shards):
+            frame_id, paths = self.pool[rng.randrange(len(self.pool))]
+            yield self.decode(frame_id, paths)
+
+    def __len__(self):
+        return self.samples_per_epoch
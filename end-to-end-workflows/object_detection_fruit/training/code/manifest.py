@@ -0,0 +1,210 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import re
+import numpy as np
+import torch
+from optparse import OptionParser
+
+MANIFEST_FILE = "manifest.npy"
+# the manifest and the other files derived from the frames live in this sub folder of the data directory,
+# so writing them does not change the modification time of the directories the manifest indexes
+INDEX_DIR = "index"
+
+# BasicWriter writes one file per annotator per frame. Older versions of train.py
+# moved these into png/, npy/ and json/ sub folders, so both layouts are searched.
+FRAME_PATTERNS = {
+    "rgb": re.compile(r"^rgb_(\d+)\.png$"),
+    "npy": re.compile(r"^bounding_box_2d_tight_(\d+)\.npy$"),
+    "json": re.compile(r"^bounding_box_2d_tight_labels_(\d+)\.json$"),
+}
+LEGACY_DIRS = ["png", "npy", "json"]
+
+
+"""
+Scans a BasicWriter output directory and groups the rgb, bounding box and label files by frame number.
+Frames missing one of the three files are left out.
+"""
+
+
+def scan_frames(root):
+    found = {key: {} for key in FRAME_PATTERNS}
+    for sub_dir in [""] + LEGACY_DIRS:
+        dir_path = os.path.join(root, sub_dir)
+        if not os.path.isdir(dir_path):
+            continue
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                for key, pattern in FRAME_PATTERNS.items():
+                    match = pattern.match(entry.name)
+                    if match:
+                        rel_path = os.path.join(sub_dir, entry.name)
+                        found[key][int(match.group(1))] = rel_path
+                        break
+
+    frame_ids = set(found["rgb"])
+    for key in FRAME_PATTERNS:
+        frame_ids &= set(found[key])
+    frame_ids = sorted(frame_ids)
+    incomplete = len(set().union(*found.values())) - len(frame_ids)
+    return frame_ids, found, incomplete
+
+
+def index_path(root, name):
+    os.makedirs(os.path.join(root, INDEX_DIR), exist_ok=True)
+    return os.path.join(root, INDEX_DIR, name)
+
+
+"""
+Writes the manifest, one row per complete frame holding its frame number and the rgb, npy and json paths
+relative to root. The rows are fixed width so the file can be memory-mapped by every dataloader worker.
+"""
+
+
+def build_manifest(root, manifest_path=None):
+    if manifest_path is None:
+        manifest_path = index_path(root, MANIFEST_FILE)
+
+    frame_ids, found, incomplete = scan_frames(root)
+    if incomplete:
+        print(f"Skipping {incomplete} incomplete frames in {root}")
+
+    width = max(
+        [len(path) for paths in found.values() for path in paths.values()] + [1]
+    )
+    dtype = np.dtype(
+        [
+            ("frame", np.int64),
+            ("rgb", f"S{width}"),
+            ("npy", f"S{width}"),
+            ("json", f"S{width}"),
+        ]
+    )
+    manifest = np.zeros(len(frame_ids), dtype=dtype)
+    manifest["frame"] = frame_ids
+    for key in FRAME_PATTERNS:
+        manifest[key] = [found[key][frame_id].encode() for frame_id in frame_ids]
+
+    # write next to the final file and rename so readers never see a partial manifest
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, manifest)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+"""
+Adding or removing a file updates the modification time of its directory, so the manifest is out of date
+when the data directory or one of the legacy sub folders is newer than it. Only a few stat calls, no listing.
+Derived files are written to INDEX_DIR and leave these times alone.
+"""
+
+
+def is_manifest_stale(root, manifest_path):
+    manifest_time = os.stat(manifest_path).st_mtime_ns
+    for sub_dir in [""] + LEGACY_DIRS:
+        dir_path = os.path.join(root, sub_dir)
+        if os.path.isdir(dir_path) and os.stat(dir_path).st_mtime_ns > manifest_time:
+            return True
+    return False
+
+
+def load_manifest(root, manifest_path=None, rebuild=False):
+    if manifest_path is None:
+        manifest_path = index_path(root, MANIFEST_FILE)
+    if (
+        rebuild
+        or not os.path.exists(manifest_path)
+        or is_manifest_stale(root, manifest_path)
+    ):
+        build_manifest(root, manifest_path)
+    return np.load(manifest_path, mmap_mode="r")
+
+
+def frame_paths(root, row):
+    return tuple(os.path.join(root, row[key].decode()) for key in FRAME_PATTERNS)
+
+
+"""
+Splits frame positions 70/20/10 into train, validation and test. Seeded, so every rank, every resumed run and
+shards.py see the same split of a dataset.
+"""
+
+
+def split_indices(num_frames, seed=0):
+    train_size = int(num_frames * 0.7)
+    valid_size = int(num_frames * 0.2)
+    # the permutation torch.utils.data.random_split draws for the same seed
+    order = torch.randperm(
+        num_frames, generator=torch.Generator().manual_seed(seed)
+    ).tolist()
+    return (
+        order[:train_size],
+        order[train_size : train_size + valid_size],
+        order[train_size + valid_size :],
+    )
+
+
+"""
+Parses command line options. Requires input data directory.
+"""
+
+
+def parse_input():
+    usage = "usage: manifest.py [options] arg1 "
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data.",
+    )
+    parser.add_option(
+        "-o",
+        "--output_file",
+        dest="output_file",
+        help="Save the manifest to this file (defaults to index/manifest.npy in data_dir)",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def main():
+    options, args = parse_input()
+    manifest_path = build_manifest(options.data_dir, options.output_file)
+    manifest = np.load(manifest_path, mmap_mode="r")
+    print(f"Indexed {len(manifest)} frames into {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
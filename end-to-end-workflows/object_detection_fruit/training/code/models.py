@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from functools import partial
+import torch
+import torchvision
+from torchvision.models.detection import _utils as det_utils
+from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torchvision.models.detection.fcos import FCOSClassificationHead
+from torchvision.models.detection.retinanet import RetinaNetClassificationHead
+from torchvision.models.detection.ssdlite import SSDLiteClassificationHead
+
+
+DEFAULT_ARCH = "fasterrcnn_resnet50_fpn"
+# architectures whose RPN and ROI heads can be trained on cached backbone features
+TWO_STAGE_ARCHS = ["fasterrcnn_resnet50_fpn", "fasterrcnn_mobilenet_v3_large_fpn"]
+
+
+def weights(pretrained):
+    return {"weights": "DEFAULT" if pretrained else None, "weights_backbone": None}
+
+
+def fasterrcnn(builder, num_classes, pretrained):
+    model = builder(**weights(pretrained))
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    return model
+
+
+def retinanet(num_classes, pretrained):
+    model = torchvision.models.detection.retinanet_resnet50_fpn(**weights(pretrained))
+    model.head.classification_head = RetinaNetClassificationHead(
+        model.backbone.out_channels,
+        model.head.classification_head.num_anchors,
+        num_classes,
+    )
+    return model
+
+
+def ssdlite(num_classes, pretrained):
+    model = torchvision.models.detection.ssdlite320_mobilenet_v3_large(
+        **weights(pretrained)
+    )
+    model.head.classification_head = SSDLiteClassificationHead(
+        det_utils.retrieve_out_channels(model.backbone, (320, 320)),
+        model.anchor_generator.num_anchors_per_location(),
+        num_classes,
+        partial(torch.nn.BatchNorm2d, eps=0.001, momentum=0.03),
+    )
+    return model
+
+
+def fcos(num_classes, pretrained):
+    model = torchvision.models.detection.fcos_resnet50_fpn(**weights(pretrained))
+    model.head.classification_head = FCOSClassificationHead(
+        model.backbone.out_channels,
+        model.head.classification_head.num_anchors,
+        num_classes,
+    )
+    return model
+
+
+ARCHITECTURES = {
+    "fasterrcnn_resnet50_fpn": partial(
+        fasterrcnn, torchvision.models.detection.fasterrcnn_resnet50_fpn
+    ),
+    "fasterrcnn_mobilenet_v3_large_fpn": partial(
+        fasterrcnn, torchvision.models.detection.fasterrcnn_mobilenet_v3_large_fpn
+    ),
+    "retinanet_resnet50_fpn": retinanet,
+    "ssdlite320_mobilenet_v3_large": ssdlite,
+    "fcos_resnet50_fpn": fcos,
+}
+
+
+"""
+Builds a torchvision detector by name with its classification head replaced for num_classes. With pretrained
+the COCO detection weights are loaded first, so everything except the new head starts trained. The name is
+kept on the model so saved models can be told apart by export.py and the benchmarks. image_size sets the
+longer side the model transform resizes to, for frames that were already downscaled when they were loaded;
+SSDlite always runs at its fixed 320x320.
+"""
+
+
+def create_model(arch, num_classes, pretrained=True, image_size=None):
+    if arch not in ARCHITECTURES:
+        raise ValueError(
+            f"Unknown architecture {arch}, choose from {', '.join(ARCHITECTURES)}"
+        )
+    model = ARCHITECTURES[arch](num_classes, pretrained)
+    model.arch = arch
+    if image_size is not None:
+        model.transform.min_size = (image_size,)
+        model.transform.max_size = image_size
+    return model
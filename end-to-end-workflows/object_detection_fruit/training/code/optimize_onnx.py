@@ -0,0 +1,275 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import time
+import collections
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import shape_inference, version_converter
+from optparse import OptionParser
+from export import OUTPUT_NAMES, check_batches, match_detections
+
+
+# basic rewrites keep standard ONNX ops, so the result still runs in TensorRT and Triton's ONNX backend.
+# extended adds ONNX Runtime-only fused ops and is only for serving with ONNX Runtime.
+OPTIMIZATION_LEVELS = {
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+}
+
+
+def parse_input():
+    usage = "usage: optimize_onnx.py [options] arg1 "
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-m",
+        "--model",
+        dest="model",
+        help="ONNX model written by export.py",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        dest="output",
+        help="Path of the optimized model, defaults to model_opt.onnx next to the input",
+    )
+    parser.add_option(
+        "--opset",
+        dest="opset",
+        type="int",
+        default=13,
+        help="Raise the model to this opset first, lower values leave the opset as exported",
+    )
+    parser.add_option(
+        "--level",
+        dest="level",
+        type="choice",
+        choices=list(OPTIMIZATION_LEVELS),
+        default="basic",
+        help="ONNX Runtime rewrites to apply: basic or extended",
+    )
+    parser.add_option(
+        "--no_simplify",
+        dest="simplify",
+        action="store_false",
+        default=True,
+        help="Skip onnx-simplifier even if it is installed",
+    )
+    parser.add_option(
+        "--size",
+        dest="size",
+        type="int",
+        default=1024,
+        help="Image size for the parity check and latency measurement",
+    )
+    parser.add_option(
+        "--data_dir",
+        dest="data_dir",
+        help="Frames to use for the parity check instead of random images",
+    )
+    parser.add_option(
+        "--iterations",
+        dest="iterations",
+        type="int",
+        default=10,
+        help="Timed runs per model",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def node_counts(model):
+    counts = collections.Counter()
+    graphs = [model.graph]
+    # count the nodes inside Loop and If bodies too, the batch loop holds the whole detector
+    while graphs:
+        graph = graphs.pop()
+        for node in graph.node:
+            counts[node.op_type] += 1
+            graphs += [attr.g for attr in node.attribute if attr.HasField("g")]
+    return counts
+
+
+def raise_opset(model, opset):
+    current = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    if opset <= current:
+        return model
+    return version_converter.convert_version(model, opset)
+
+
+def simplify(model):
+    # None marks the stage as skipped
+    try:
+        from onnxsim import simplify as onnxsim_simplify
+    except ImportError:
+        print("onnx-simplifier is not installed, skipping it")
+        return None
+    simplified, ok = onnxsim_simplify(model)
+    if not ok:
+        print("onnx-simplifier could not validate its result, skipping it")
+        return None
+    return simplified
+
+
+"""
+Runs the graph rewrites of ONNX Runtime offline and saves the result: constant folding, removal of
+redundant Identity, Cast, Reshape and Unsqueeze nodes, and Conv fusions with Add, Mul and BatchNormalization.
+"""
+
+
+def ort_optimize(model_path, output_path, level):
+    options = ort.SessionOptions()
+    options.log_severity_level = 3
+    options.graph_optimization_level = OPTIMIZATION_LEVELS[level]
+    options.optimized_model_filepath = output_path
+    ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    return onnx.load(output_path)
+
+
+"""
+Applies each stage in turn and prints the node count after it, or skipped. Intermediate models are written
+next to the output so ONNX Runtime can load them from disk.
+"""
+
+
+def optimize(model_path, output_path, opset, level, use_simplifier=True):
+    model = onnx.load(model_path)
+    print(f"{'stage':<20}{'nodes':>8}")
+    print(f"{'exported':<20}{sum(node_counts(model).values()):>8}")
+
+    stages = [("opset", lambda m: raise_opset(m, opset))]
+    stages.append(("shape inference", shape_inference.infer_shapes))
+    if use_simplifier:
+        stages.append(("onnx-simplifier", simplify))
+    for name, stage in stages:
+        result = stage(model)
+        if result is None:
+            print(f"{name:<20}{'skipped':>8}")
+            continue
+        model = result
+        print(f"{name:<20}{sum(node_counts(model).values()):>8}")
+
+    tmp_path = output_path + ".tmp"
+    onnx.save(model, tmp_path)
+    try:
+        model = ort_optimize(tmp_path, output_path, level)
+    finally:
+        os.remove(tmp_path)
+    print(f"{'onnxruntime ' + level:<20}{sum(node_counts(model).values()):>8}")
+    if level == "basic":
+        onnx.checker.check_model(output_path)
+    return model
+
+
+def create_session(model_path):
+    options = ort.SessionOptions()
+    options.log_severity_level = 3
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def batch_sizes(session):
+    batch = session.get_inputs()[0].shape[0]
+    return (2, 1) if not isinstance(batch, int) else (batch, batch)
+
+
+"""
+Compares the optimized graph with the unoptimized one on the same batches. Folding can reorder float
+arithmetic, so detections are matched with the same tolerances export.py uses against PyTorch.
+"""
+
+
+def check_parity(reference, session, batches, min_matched=0.98):
+    total, matched = 0, 0
+    for images in batches:
+        feeds = {"input": images.numpy()}
+        expected = reference.run(OUTPUT_NAMES, feeds)
+        outputs = session.run(OUTPUT_NAMES, feeds)
+        for i in range(len(images)):
+            ok, count = match_detections(
+                [o[i, : outputs[3][i]] for o in outputs[:3]],
+                [o[i, : expected[3][i]] for o in expected[:3]],
+            )
+            matched += ok
+            total += count
+    fraction = matched / total if total else 1.0
+    print(f"{matched}/{total} detections match the unoptimized model")
+    return fraction >= min_matched
+
+
+def latency(session, images, iterations):
+    feeds = {"input": images.numpy()}
+    session.run(None, feeds)
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        session.run(None, feeds)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    options, args = parse_input()
+    output = options.output or os.path.join(
+        os.path.dirname(options.model), "model_opt.onnx"
+    )
+    model = optimize(
+        options.model, output, options.opset, options.level, options.simplify
+    )
+
+    before = node_counts(onnx.load(options.model))
+    after = node_counts(model)
+    print(f"\n{'op':<24}{'before':>8}{'after':>8}")
+    for op in sorted(set(before) | set(after), key=lambda op: -before[op]):
+        if before[op] != after[op]:
+            print(f"{op:<24}{before[op]:>8}{after[op]:>8}")
+    print(f"{'total':<24}{sum(before.values()):>8}{sum(after.values()):>8}")
+
+    reference, session = create_session(options.model), create_session(output)
+    batches = check_batches(options.data_dir, options.size, batch_sizes(reference))
+    parity = check_parity(reference, session, batches)
+
+    # sessions enable all runtime optimizations, so the gain left is what they cannot do on their own
+    for name, path in [("unoptimized", options.model), ("optimized", output)]:
+        start = time.perf_counter()
+        session = create_session(path)
+        load_time = time.perf_counter() - start
+        ms = latency(session, batches[0], options.iterations)
+        print(f"{name:<12} load {load_time:6.2f} s, {ms:8.1f} ms per batch")
+    if not parity:
+        print("Optimized outputs do not match the unoptimized model")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
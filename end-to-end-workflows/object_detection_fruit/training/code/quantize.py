@@ -0,0 +1,382 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import time
+import struct
+import numpy as np
+import onnx
+import onnxruntime as ort
+import torch
+from onnx import numpy_helper, version_converter
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from optparse import OptionParser
+from box_store import NUM_CLASSES
+from evaluate import DetectionAccumulator, evaluate_detections
+from train import FruitDataset, get_transform, split_dataset
+
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+CALIBRATION_INPUTS_FILE = "calibration_inputs.npy"
+CALIBRATION_META_FILE = "calibration_inputs.json"
+RANGES_FILE = "ranges.json"
+TRT_CACHE_FILE = "calibration.cache"
+# TensorRT calibrators matching our methods, percentile ranges have no TensorRT counterpart
+TRT_CALIBRATORS = {"minmax": "MinMaxCalibration", "entropy": "EntropyCalibration2"}
+# only convolutions and matrix products run in INT8, anchors, box decoding and NMS stay in float
+QUANTIZED_OPS = ["Conv", "MatMul", "Gemm"]
+# the histogram calibrators stack the outputs of all batches per tensor, which fails for the ROI head
+# matrix products whose row count follows the number of proposals, so they only quantize convolutions
+HISTOGRAM_QUANTIZED_OPS = ["Conv"]
+MIN_OPSET = 13
+
+
+"""
+Parses command line options. Requires an ONNX model exported with a fixed batch size and the Replicator
+dataset it was trained on.
+"""
+
+
+def parse_input():
+    usage = "usage: quantize.py [options]"
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-m",
+        "--model",
+        dest="model",
+        help="ONNX model exported by export.py with --batch_size",
+    )
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data.",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        dest="output",
+        help="Path of the INT8 model, defaults to model_int8.onnx next to the input",
+    )
+    parser.add_option(
+        "--cache_dir",
+        dest="cache_dir",
+        help="Directory for calibration frames and caches, defaults to calibration/ next to the output",
+    )
+    parser.add_option(
+        "-n",
+        "--num_calibration",
+        dest="num_calibration",
+        type="int",
+        default=100,
+        help="Number of training frames sampled for calibration",
+    )
+    parser.add_option(
+        "--method",
+        dest="method",
+        type="choice",
+        choices=list(CALIBRATION_METHODS),
+        default="minmax",
+        help="Calibration method: " + ", ".join(CALIBRATION_METHODS),
+    )
+    parser.add_option(
+        "--max_eval",
+        dest="max_eval",
+        type="int",
+        help="Evaluate on at most this many validation frames",
+    )
+    parser.add_option(
+        "--trt_version",
+        dest="trt_version",
+        help="TensorRT version the calibration cache is written for, e.g. 8.6.1, defaults to the installed one",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+"""
+Checks the model has a fixed batch size and, because per-channel weight scales need the axis attribute of
+DequantizeLinear, upgrades models exported below opset 13 into cache_dir. Returns the path to quantize.
+"""
+
+
+def prepare_model(model_path, cache_dir):
+    model = onnx.load(model_path)
+    dim = model.graph.input[0].type.tensor_type.shape.dim[0]
+    if not dim.HasField("dim_value"):
+        raise ValueError(
+            f"{model_path} has a dynamic batch, export it with export.py --batch_size 1 "
+            "so calibration can see the operators inside the batch loop"
+        )
+    opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    if opset >= MIN_OPSET:
+        return model_path, dim.dim_value
+    os.makedirs(cache_dir, exist_ok=True)
+    upgraded_path = os.path.join(cache_dir, f"model_opset{MIN_OPSET}.onnx")
+    onnx.save(version_converter.convert_version(model, MIN_OPSET), upgraded_path)
+    return upgraded_path, dim.dim_value
+
+
+def to_batches(images, batch_size):
+    # the last batch is filled up with copies of its last image, valid says how many are real
+    for start in range(0, len(images), batch_size):
+        batch = list(images[start : start + batch_size])
+        valid = len(batch)
+        batch += [batch[-1]] * (batch_size - valid)
+        yield np.stack(batch), valid
+
+
+def load_frame(dataset, idx):
+    img, target = dataset[idx]
+    return img.numpy().astype(np.float32) / 255, target
+
+
+"""
+Samples calibration frames from the training split, so validation frames are never seen by the calibrator.
+The frames are stored as one float array in cache_dir and reused while the dataset and sample size are
+unchanged.
+"""
+
+
+def calibration_frames(dataset, indices, num_frames, cache_dir, seed=0):
+    inputs_path = os.path.join(cache_dir, CALIBRATION_INPUTS_FILE)
+    meta_path = os.path.join(cache_dir, CALIBRATION_META_FILE)
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(indices, min(num_frames, len(indices)), replace=False)
+    frames = [int(f) for f in dataset.frames["frame"][chosen]]
+    meta = {"data_dir": os.path.abspath(dataset.root), "frames": frames}
+    if os.path.exists(inputs_path) and os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            if json.load(f) == meta:
+                return np.load(inputs_path, mmap_mode="r")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    images = np.stack([load_frame(dataset, idx)[0] for idx in chosen])
+    np.save(inputs_path, images)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return images
+
+
+class FrameReader(CalibrationDataReader):
+    def __init__(self, images, input_name, batch_size):
+        self.images = images
+        self.input_name = input_name
+        self.batch_size = batch_size
+        self.rewind()
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        if batch is None:
+            return None
+        return {self.input_name: batch[0]}
+
+    def rewind(self):
+        self.batches = to_batches(self.images, self.batch_size)
+
+
+def quantized_ops(method):
+    return QUANTIZED_OPS if method == "minmax" else HISTOGRAM_QUANTIZED_OPS
+
+
+def quantize(model_path, output_path, reader, method):
+    quantize_static(
+        model_path,
+        output_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        op_types_to_quantize=quantized_ops(method),
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CALIBRATION_METHODS[method],
+    )
+
+
+"""
+Reads the calibrated range of every quantized activation back from the QuantizeLinear nodes of the INT8
+model: a uint8 value q stands for scale * (q - zero_point).
+"""
+
+
+def activation_ranges(model_path):
+    graph = onnx.load(model_path).graph
+    initializers = {
+        init.name: numpy_helper.to_array(init) for init in graph.initializer
+    }
+    ranges = {}
+    for node in graph.node:
+        if node.op_type != "QuantizeLinear" or node.input[0] in initializers:
+            continue
+        scale = float(initializers[node.input[1]])
+        zero_point = int(initializers[node.input[2]])
+        ranges[node.input[0]] = (scale * (0 - zero_point), scale * (255 - zero_point))
+    return ranges
+
+
+"""
+Returns the header TensorRT expects on a calibration cache, "TRT-<version>-<calibrator>", with the version
+number as TensorRT encodes it (8.6.1 is 8601, 10.3.0 is 100300). None when the method has no TensorRT
+calibrator or no TensorRT version is given or installed.
+"""
+
+
+def trt_cache_header(method, version=None):
+    if version is None:
+        try:
+            import tensorrt
+        except ImportError:
+            return None
+        version = tensorrt.__version__
+    if method not in TRT_CALIBRATORS:
+        return None
+    major, minor, patch = (int(part) for part in version.split(".")[:3])
+    number = major * (10000 if major >= 10 else 1000) + minor * 100 + patch
+    return f"TRT-{number}-{TRT_CALIBRATORS[method]}"
+
+
+"""
+Writes ranges as a TensorRT calibration cache: the header line, then one "tensor: scale" line per tensor with
+the symmetric INT8 scale amax / 127 as a big-endian float32 in hex. trtexec reads it with --calib.
+"""
+
+
+def write_trt_cache(ranges, path, header):
+    with open(path, "w") as f:
+        f.write(header + "\n")
+        for name in sorted(ranges):
+            amax = max(abs(value) for value in ranges[name])
+            scale = struct.pack(">f", amax / 127.0).hex()
+            f.write(f"{name}: {scale}\n")
+
+
+def evaluate_session(session, dataset, indices, batch_size):
+    input_name = session.get_inputs()[0].name
+    acc = DetectionAccumulator(len(indices))
+    elapsed = 0.0
+    for start in range(0, len(indices), batch_size):
+        frames = [
+            load_frame(dataset, idx) for idx in indices[start : start + batch_size]
+        ]
+        images, valid = next(to_batches([img for img, _ in frames], batch_size))
+        begin = time.perf_counter()
+        boxes, scores, labels, counts = session.run(None, {input_name: images})
+        elapsed += time.perf_counter() - begin
+        detections = [
+            {
+                "boxes": torch.from_numpy(boxes[i, : counts[i]]),
+                "scores": torch.from_numpy(scores[i, : counts[i]]),
+                "labels": torch.from_numpy(labels[i, : counts[i]]),
+            }
+            for i in range(valid)
+        ]
+        acc.add(detections, [target for _, target in frames])
+    return evaluate_detections(acc, NUM_CLASSES), 1000 * elapsed / len(indices)
+
+
+def create_session(model_path):
+    options = ort.SessionOptions()
+    options.log_severity_level = 3
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def main():
+    options, args = parse_input()
+    output = options.output or os.path.join(
+        os.path.dirname(options.model), "model_int8.onnx"
+    )
+    cache_dir = options.cache_dir or os.path.join(
+        os.path.dirname(output), "calibration"
+    )
+    model_path, batch_size = prepare_model(options.model, cache_dir)
+
+    dataset = FruitDataset(options.data_dir, get_transform(train=False))
+    train, valid, test = split_dataset(dataset)
+    images = calibration_frames(
+        dataset, train.indices, options.num_calibration, cache_dir
+    )
+    print(f"Calibrating on {len(images)} frames with {options.method}")
+    input_name = create_session(model_path).get_inputs()[0].name
+    reader = FrameReader(images, input_name, batch_size)
+    quantize(model_path, output, reader, options.method)
+
+    ranges = activation_ranges(output)
+    with open(os.path.join(cache_dir, RANGES_FILE), "w") as f:
+        json.dump(ranges, f, indent=2)
+    header = trt_cache_header(options.method, options.trt_version)
+    trt_cache = os.path.join(cache_dir, TRT_CACHE_FILE)
+    # a cache left by an earlier run no longer matches these ranges
+    if os.path.exists(trt_cache):
+        os.remove(trt_cache)
+    if options.method not in TRT_CALIBRATORS:
+        print(
+            f"{options.method} has no TensorRT calibrator, not writing a TensorRT cache"
+        )
+    elif header is None:
+        print("Neither TensorRT nor --trt_version given, not writing a TensorRT cache")
+    else:
+        write_trt_cache(ranges, trt_cache, header)
+    print(f"Wrote {output} and calibration ranges for {len(ranges)} tensors")
+
+    indices = list(valid.indices)[: options.max_eval]
+    results = {}
+    for name, path in [("fp32", options.model), ("int8", output)]:
+        results[name] = evaluate_session(
+            create_session(path), dataset, indices, batch_size
+        )
+    print(f"{'':>8}{'mAP':>8}{'mAP50':>8}{'recall':>8}{'ms/image':>10}{'MB':>8}")
+    for name, path in [("fp32", options.model), ("int8", output)]:
+        metrics, latency = results[name]
+        size = os.path.getsize(path) / 1024**2
+        print(
+            f"{name:>8}{metrics['mAP']:>8.3f}{metrics['mAP50']:>8.3f}"
+            f"{metrics['recall']:>8.3f}{latency:>10.1f}{size:>8.1f}"
+        )
+    (fp32, fp32_latency), (int8, int8_latency) = results["fp32"], results["int8"]
+    print(
+        f"mAP delta {int8['mAP'] - fp32['mAP']:+.4f}, mAP50 delta "
+        f"{int8['mAP50'] - fp32['mAP50']:+.4f}, speedup {fp32_latency / int8_latency:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
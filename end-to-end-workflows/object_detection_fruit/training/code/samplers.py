@@ -0,0 +1,271 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import numpy as np
+import torch.utils.data
+from PIL import Image
+from manifest import frame_paths, index_path
+from box_store import NUM_CLASSES, read_frame_boxes
+
+
+FRAME_META_FILE = "frame_meta.npy"
+FRAME_META_DTYPE = np.dtype(
+    [
+        ("frame", np.int64),
+        ("width", np.int32),
+        ("height", np.int32),
+        ("num_boxes", np.int32),
+    ]
+)
+CLASS_HIST_FILE = "class_hist.npy"
+CLASS_HIST_DTYPE = np.dtype([("frame", np.int64), ("counts", np.int32, (NUM_CLASSES,))])
+SAMPLING_MODES = ["balanced", "boxes"]
+
+
+"""
+Returns the image size and box count of every frame of a FruitDataset. They are read once from the PNG
+headers and the box store (or the per-frame npy files) and cached in frame_meta.npy next to the manifest.
+"""
+
+
+def load_frame_metadata(dataset, meta_path=None):
+    if meta_path is None:
+        meta_path = index_path(dataset.root, FRAME_META_FILE)
+    if os.path.exists(meta_path):
+        meta = np.load(meta_path)
+        if np.array_equal(meta["frame"], dataset.frames["frame"]):
+            return meta
+
+    meta = np.zeros(len(dataset.frames), dtype=FRAME_META_DTYPE)
+    meta["frame"] = dataset.frames["frame"]
+    for i, row in enumerate(dataset.frames):
+        img_path, box_path, label_path = frame_paths(dataset.root, row)
+        with Image.open(img_path) as img:
+            meta["width"][i], meta["height"][i] = img.size
+        if dataset.box_store is None:
+            meta["num_boxes"][i] = len(read_frame_boxes(box_path, label_path)[0])
+    if dataset.box_store is not None:
+        meta["num_boxes"] = np.diff(dataset.box_store.offsets)
+
+    # ranks of a distributed run may build it at the same time, each writes its own file
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, meta)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+"""
+Batches frames of similar aspect ratio and box count. Every epoch the indices are shuffled, cut into pools of
+pool_batches batches, and each pool is sorted by aspect ratio bucket, then box count, before being split
+into batches. The batch order is shuffled again so training still sees a random mix of buckets, while each
+batch needs little padding in GeneralizedRCNNTransform and has a similar number of boxes. With num_replicas
+ranks, each rank takes every num_replicas-th batch.
+"""
+
+
+class BucketBatchSampler(torch.utils.data.Sampler):
+    def __init__(
+        self,
+        meta,
+        batch_size,
+        indices=None,
+        aspect_buckets=(0.5, 0.8, 1.25, 2.0),
+        pool_batches=50,
+        shuffle=True,
+        drop_last=False,
+        seed=0,
+        num_replicas=1,
+        rank=0,
+    ):
+        self.batch_size = batch_size
+        self.indices = np.arange(len(meta)) if indices is None else np.asarray(indices)
+        self.pool_batches = pool_batches
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+        meta = meta[self.indices]
+        aspect = meta["width"] / np.maximum(meta["height"], 1)
+        self.aspect_bucket = np.digitize(aspect, aspect_buckets)
+        self.num_boxes = meta["num_boxes"]
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        order = rng.permutation(len(self.indices)) if self.shuffle else None
+        if order is None:
+            order = np.arange(len(self.indices))
+
+        pool_size = self.batch_size * self.pool_batches
+        batches = []
+        for start in range(0, len(order), pool_size):
+            pool = order[start : start + pool_size]
+            pool = pool[np.lexsort((self.num_boxes[pool], self.aspect_bucket[pool]))]
+            for batch_start in range(0, len(pool), self.batch_size):
+                batches.append(pool[batch_start : batch_start + self.batch_size])
+
+        if self.drop_last:
+            batches = [batch for batch in batches if len(batch) == self.batch_size]
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        # every rank must run the same number of steps, so repeat batches to fill the last round
+        num_batches = len(self) * self.num_replicas
+        batches = (batches * (num_batches // max(len(batches), 1) + 1))[:num_batches]
+        for batch in batches[self.rank :: self.num_replicas]:
+            yield self.indices[batch].tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            num_batches = len(self.indices) // self.batch_size
+        else:
+            num_batches = (len(self.indices) + self.batch_size - 1) // self.batch_size
+        return (num_batches + self.num_replicas - 1) // self.num_replicas
+
+
+"""
+Returns the number of boxes of every class in every frame of a FruitDataset as a [N] array with a
+[NUM_CLASSES] counts field. It is built once from the box store (or the per-frame npy and json files) and
+cached in class_hist.npy next to the manifest, so weighted sampling never opens a frame's files.
+"""
+
+
+def load_class_histogram(dataset, hist_path=None):
+    if hist_path is None:
+        hist_path = index_path(dataset.root, CLASS_HIST_FILE)
+    if os.path.exists(hist_path):
+        hist = np.load(hist_path)
+        if np.array_equal(hist["frame"], dataset.frames["frame"]):
+            return hist
+
+    hist = np.zeros(len(dataset.frames), dtype=CLASS_HIST_DTYPE)
+    hist["frame"] = dataset.frames["frame"]
+    if dataset.box_store is not None:
+        store = dataset.box_store
+        rows = np.repeat(np.arange(len(store)), np.diff(store.offsets))
+        np.add.at(hist["counts"], (rows, np.asarray(store.labels)), 1)
+    else:
+        for i, row in enumerate(dataset.frames):
+            _, box_path, label_path = frame_paths(dataset.root, row)
+            labels = read_frame_boxes(box_path, label_path)[1]
+            hist["counts"][i] = np.bincount(labels, minlength=NUM_CLASSES)
+
+    tmp_path = f"{hist_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, hist)
+    os.replace(tmp_path, hist_path)
+    return hist
+
+
+"""
+Turns a class histogram into sampling probabilities. balanced weights every frame by the rarest class it
+shows, the inverse of the fraction of frames that contain that class, so a fruit that random_props rarely
+places is drawn about as often as a common one. boxes weights frames by the square root of their box count,
+favouring crowded frames with many small and occluded objects. Frames without boxes get empty_weight times
+the mean weight of the other frames; 0 never draws them.
+"""
+
+
+def frame_weights(hist, mode="balanced", empty_weight=0.1):
+    counts = hist["counts"]
+    num_boxes = counts.sum(axis=1)
+    if mode == "balanced":
+        present = counts > 0
+        frequency = present.mean(axis=0)
+        inverse = np.divide(
+            1.0, frequency, out=np.zeros(len(frequency)), where=frequency > 0
+        )
+        weights = (present * inverse).max(axis=1)
+    elif mode == "boxes":
+        weights = np.sqrt(num_boxes).astype(np.float64)
+    else:
+        raise ValueError(
+            f"Unknown sampling mode {mode}, choose from {', '.join(SAMPLING_MODES)}"
+        )
+
+    empty = num_boxes == 0
+    if empty.all():
+        return np.full(len(weights), 1.0 / len(weights))
+    weights[empty] = empty_weight * weights[~empty].mean()
+    return weights / weights.sum()
+
+
+"""
+Draws frames with replacement in proportion to per-frame weights, for example from frame_weights. Every
+epoch draws num_samples frames (the number of indices by default) from a generator seeded with seed and the
+epoch, and with num_replicas ranks each rank takes every num_replicas-th draw, so ranks see different frames
+and the same number of them.
+"""
+
+
+class WeightedFrameSampler(torch.utils.data.Sampler):
+    def __init__(
+        self,
+        weights,
+        indices=None,
+        num_samples=None,
+        seed=0,
+        num_replicas=1,
+        rank=0,
+    ):
+        self.indices = (
+            np.arange(len(weights)) if indices is None else np.asarray(indices)
+        )
+        weights = np.asarray(weights, dtype=np.float64)[self.indices]
+        if weights.sum() <= 0:
+            raise ValueError("Sampling weights of the selected frames sum to zero")
+        self.probabilities = weights / weights.sum()
+        if num_samples is None:
+            num_samples = len(self.indices)
+        self.num_samples = (num_samples + num_replicas - 1) // num_replicas
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        draws = rng.choice(
+            len(self.indices),
+            size=self.num_samples * self.num_replicas,
+            p=self.probabilities,
+        )
+        yield from self.indices[draws[self.rank :: self.num_replicas]].tolist()
+
+    def __len__(self):
+        return self.num_samples
@@ -0,0 +1,268 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import json
+import random
+import itertools
+import tarfile
+import numpy as np
+import torch
+import torch.utils.data
+from optparse import OptionParser
+from manifest import load_manifest, frame_paths, split_indices
+from box_store import parse_frame_boxes, make_target
+from image_io import decode_image, scale_boxes
+
+
+SHARD_INDEX_FILE = "shards.json"
+SHARD_EXTENSIONS = ["png", "npy", "json"]
+SPLITS = ["train", "all"]
+
+
+"""
+Packs BasicWriter frames into tar shards in WebDataset layout: each frame is stored as <frame>.png, <frame>.npy
+and <frame>.json next to each other so a shard can be read front to back in one sequential pass. By default
+only the frames of train.py's train split are packed, so the validation split of the same data_dir stays unseen.
+"""
+
+
+def pack_shards(
+    root, out_dir, frames_per_shard=1000, manifest_path=None, split="train"
+):
+    frames = load_manifest(root, manifest_path)
+    if split == "train":
+        frames = frames[np.sort(split_indices(len(frames))[0])]
+    os.makedirs(out_dir, exist_ok=True)
+
+    shards = []
+    for start in range(0, len(frames), frames_per_shard):
+        name = f"shard-{len(shards):06d}.tar"
+        tmp_path = os.path.join(out_dir, name + ".tmp")
+        rows = frames[start : start + frames_per_shard]
+        with tarfile.open(tmp_path, "w") as tar:
+            for row in rows:
+                key = f"{row['frame']:08d}"
+                for ext, path in zip(SHARD_EXTENSIONS, frame_paths(root, row)):
+                    tar.add(path, arcname=f"{key}.{ext}")
+        os.replace(tmp_path, os.path.join(out_dir, name))
+        shards.append({"file": name, "frames": len(rows)})
+
+    with open(os.path.join(out_dir, SHARD_INDEX_FILE), "w") as f:
+        json.dump({"split": split, "shards": shards}, f, indent=2)
+    return shards
+
+
+def read_shard(path):
+    sample = {}
+    key = None
+    with tarfile.open(path, "r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_key, ext = member.name.rsplit(".", 1)
+            if member_key != key:
+                if len(sample) == len(SHARD_EXTENSIONS):
+                    yield key, sample
+                key = member_key
+                sample = {}
+            sample[ext] = tar.extractfile(member).read()
+    if len(sample) == len(SHARD_EXTENSIONS):
+        yield key, sample
+
+
+"""
+Returns the position of the current dataloader worker among all workers of all distributed ranks.
+"""
+
+
+def worker_shard():
+    rank, world_size = 0, 1
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        rank = torch.distributed.get_rank()
+        world_size = torch.distributed.get_world_size()
+    worker_info = torch.utils.data.get_worker_info()
+    worker_id, num_workers = 0, 1
+    if worker_info is not None:
+        worker_id, num_workers = worker_info.id, worker_info.num_workers
+    return rank * num_workers + worker_id, world_size * num_workers
+
+
+def shuffle_buffer(samples, size, rng):
+    buffer = []
+    for sample in samples:
+        if len(buffer) < size:
+            buffer.append(sample)
+            continue
+        idx = rng.randrange(size)
+        yield buffer[idx]
+        buffer[idx] = sample
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+"""
+Streams frames from tar shards. Shards are split between distributed ranks and dataloader workers, so each
+worker reads whole shards sequentially, and samples are mixed through a shuffle buffer. Under distributed
+training every worker stops after as many frames as the least loaded worker has, so all ranks step together.
+"""
+
+
+class ShardedFruitDataset(torch.utils.data.IterableDataset):
+    def __init__(
+        self,
+        shard_dir,
+        transforms,
+        shuffle=True,
+        buffer_size=1000,
+        seed=0,
+        target_size=None,
+    ):
+        self.shard_dir = shard_dir
+        self.transforms = transforms
+        self.target_size = target_size
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+
+        with open(os.path.join(shard_dir, SHARD_INDEX_FILE), "r") as f:
+            index = json.load(f)
+        self.shards = index["shards"]
+        # shards written before the split was recorded hold every frame
+        self.split = index.get("split", "all")
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def assigned_shards(self):
+        shards = list(self.shards)
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(shards)
+
+        shard, num_shards = worker_shard()
+        frames = [
+            sum(item["frames"] for item in shards[i::num_shards])
+            for i in range(num_shards)
+        ]
+        return [item["file"] for item in shards[shard::num_shards]], min(frames)
+
+    def decode(self, key, sample):
+        data = torch.frombuffer(bytearray(sample["png"]), dtype=torch.uint8)
+        img, scale = decode_image(data, self.target_size)
+        dat = np.load(io.BytesIO(sample["npy"]))
+        boxes, labels = parse_frame_boxes(dat, json.loads(sample["json"]))
+        target = make_target(scale_boxes(boxes, scale), labels, int(key))
+
+        if self.transforms is not None:
+            img = self.transforms(img)
+        return img, target
+
+    def __iter__(self):
+        shards, min_frames = self.assigned_shards()
+        samples = (
+            sample
+            for shard in shards
+            for sample in read_shard(os.path.join(self.shard_dir, shard))
+        )
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            # DistributedDataParallel needs the same number of steps on every rank
+            if min_frames == 0:
+                raise ValueError(
+                    f"{len(self.shards)} shards cannot feed every worker of every rank, pack more shards"
+                )
+            samples = itertools.islice(samples, min_frames)
+        if self.shuffle:
+            shard, num_shards = worker_shard()
+            rng = random.Random(hash((self.seed, self.epoch, shard)))
+            samples = shuffle_buffer(samples, self.buffer_size, rng)
+        for key, sample in samples:
+            yield self.decode(key, sample)
+
+    def __len__(self):
+        return sum(shard["frames"] for shard in self.shards)
+
+
+"""
+Parses command line options. Requires input data directory and output shard directory.
+"""
+
+
+def parse_input():
+    usage = "usage: shards.py [options] arg1 arg2 "
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-d",
+        "--data_dir",
+        dest="data_dir",
+        help="Directory location for Omniverse synthetic data.",
+    )
+    parser.add_option(
+        "-o",
+        "--output_dir",
+        dest="output_dir",
+        help="Write tar shards to this directory",
+    )
+    parser.add_option(
+        "-n",
+        "--frames_per_shard",
+        dest="frames_per_shard",
+        type="int",
+        default=1000,
+        help="Number of frames packed into each shard",
+    )
+    parser.add_option(
+        "--split",
+        dest="split",
+        type="choice",
+        choices=SPLITS,
+        default="train",
+        help="Pack only the train split of data_dir (train) or every frame (all)",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def main():
+    options, args = parse_input()
+    shards = pack_shards(
+        options.data_dir,
+        options.output_dir,
+        options.frames_per_shard,
+        split=options.split,
+    )
+    frames = sum(shard["frames"] for shard in shards)
+    print(f"Packed {frames} frames into {len(shards)} shards in {options.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2022-2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#     1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#     2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+#     3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import numpy as np
+from PIL import Image
+from optparse import OptionParser
+from box_store import STATIC_LABELS
+
+
+# dtype of the bounding_box_2d_tight annotator output
+BBOX_DTYPE = np.dtype(
+    [
+        ("semanticId", "<u4"),
+        ("x_min", "<i4"),
+        ("y_min", "<i4"),
+        ("x_max", "<i4"),
+        ("y_max", "<i4"),
+        ("occlusionRatio", "<f4"),
+    ]
+)
+
+
+"""
+Writes random frames in BasicWriter format (rgb_N.png, bounding_box_2d_tight_N.npy and
+bounding_box_2d_tight_labels_N.json) for benchmarking the data pipeline without Omniverse.
+Each frame picks one of sizes, given as (width, height), and up to max_boxes fruit boxes.
+"""
+
+
+def write_dataset(root, num_frames, sizes=((1024, 1024),), max_boxes=10, seed=0):
+    os.makedirs(root, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    classes = list(STATIC_LABELS)
+    for frame in range(num_frames):
+        width, height = sizes[rng.integers(len(sizes))]
+        rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        Image.fromarray(rgb).save(os.path.join(root, f"rgb_{frame:04d}.png"))
+
+        num_boxes = int(rng.integers(0, max_boxes + 1))
+        boxes = np.zeros(num_boxes, dtype=BBOX_DTYPE)
+        labels = {}
+        for i in range(num_boxes):
+            box_w = int(rng.integers(8, max(9, width // 4)))
+            box_h = int(rng.integers(8, max(9, height // 4)))
+            x_min = int(rng.integers(0, width - box_w))
+            y_min = int(rng.integers(0, height - box_h))
+            boxes[i] = (i, x_min, y_min, x_min + box_w, y_min + box_h, 0.0)
+            labels[str(i)] = {"class": classes[rng.integers(len(classes))]}
+
+        np.save(os.path.join(root, f"bounding_box_2d_tight_{frame:04d}.npy"), boxes)
+        label_path = os.path.join(
+            root, f"bounding_box_2d_tight_labels_{frame:04d}.json"
+        )
+        with open(label_path, "w") as f:
+            json.dump(labels, f)
+
+
+def parse_sizes(text):
+    return [tuple(int(v) for v in size.split("x")) for size in text.split(",")]
+
+
+"""
+Parses command line options. Requires output data directory.
+"""
+
+
+def parse_input():
+    usage = "usage: synthetic_dataset.py [options] arg1 "
+    parser = OptionParser(usage)
+    parser.add_option(
+        "-o",
+        "--output_dir",
+        dest="output_dir",
+        help="Write the synthetic BasicWriter dataset to this directory",
+    )
+    parser.add_option(
+        "-n",
+        "--num_frames",
+        dest="num_frames",
+        type="int",
+        default=100,
+        help="Number of frames to write",
+    )
+    parser.add_option(
+        "--sizes",
+        dest="sizes",
+        default="1024x1024",
+        help="Comma separated WIDTHxHEIGHT image sizes to pick from",
+    )
+    parser.add_option(
+        "--max_boxes",
+        dest="max_boxes",
+        type="int",
+        default=10,
+        help="Maximum number of boxes per frame",
+    )
+    (options, args) = parser.parse_args()
+    return options, args
+
+
+def main():
+    options, args = parse_input()
+    write_dataset(
+        options.output_dir,
+        options.num_frames,
+        parse_sizes(options.sizes),
+        options.max_boxes,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -31,103 +31,119 @@
 
 from PIL import Image
 import os
-import numpy as np
+import time
+import fcntl
+import contextlib
 import torch
 import torch.utils.data
-import torchvision
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
 from torchvision import transforms as T
-import json
-import shutil
 from optparse import OptionParser
 from torch.utils.tensorboard import SummaryWriter
+from manifest import index_path, load_manifest, frame_paths, split_indices
+from box_store import (
+    BOX_STORE_FILE,
+    NUM_CLASSES,
+    BoxStore,
+    read_frame_boxes,
+    make_target,
+)
+from shards import ShardedFruitDataset
+from image_cache import CACHE_POLICIES, ImageCache
+from image_io import prepare_images, read_image, scale_boxes, scaled_size
+from live_dataset import LiveFruitDataset
+from samplers import (
+    SAMPLING_MODES,
+    BucketBatchSampler,
+    WeightedFrameSampler,
+    frame_weights,
+    load_class_histogram,
+    load_frame_metadata,
+)
+from evaluate import evaluate
+from models import ARCHITECTURES, DEFAULT_ARCH, TWO_STAGE_ARCHS, create_model
+from compilation import COMPILE_MODES, compile_failures, compile_model, uncompile
+from checkpoint import (
+    AsyncCheckpointer,
+    ResumableBatchSampler,
+    load_checkpoint,
+    load_scaler_state,
+    set_rng_state,
+    snapshot,
+)
+from instrumentation import TrainingLogger, create_profiler
+from feature_cache import (
+    CachedFeatureHeads,
+    FeatureCacheDataset,
+    build_feature_cache,
+    is_cache_valid,
+)
+from distributed import (
+    init_distributed,
+    is_distributed,
+    is_main_process,
+    cleanup,
+)
+
+
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+MEMORY_FORMATS = {
+    "contiguous": torch.contiguous_format,
+    "channels_last": torch.channels_last,
+}
 
 
 class FruitDataset(torch.utils.data.Dataset):
-    def __init__(self, root, transforms):
+    def __init__(
+        self,
+        root,
+        transforms,
+        manifest_path=None,
+        box_store_path=None,
+        image_cache=None,
+        target_size=None,
+    ):
         self.root = root
         self.transforms = transforms
+        self.frames = load_manifest(root, manifest_path)
 
-        list_ = os.listdir(root)
-        for file_ in list_:
-            name, ext = os.path.splitext(file_)
-            ext = ext[1:]
-            if ext == "":
-                continue
+        if box_store_path is None:
+            box_store_path = index_path(root, BOX_STORE_FILE)
+        self.box_store = None
+        if os.path.exists(box_store_path):
+            self.box_store = BoxStore(box_store_path, self.frames)
 
-            if os.path.exists(root + "/" + ext):
-                shutil.move(root + "/" + file_, root + "/" + ext + "/" + file_)
+        self.image_cache = image_cache
+        self.target_size = target_size
 
-            else:
-                os.makedirs(root + "/" + ext)
-                shutil.move(root + "/" + file_, root + "/" + ext + "/" + file_)
+    def load_image(self, idx, img_path):
+        if self.image_cache is not None:
+            cached = self.image_cache.get(idx)
+            if cached is not None:
+                img, scale = cached
+                return torch.from_numpy(img).permute(2, 0, 1), scale
 
-        self.imgs = list(sorted(os.listdir(os.path.join(root, "png"))))
-        self.label = list(sorted(os.listdir(os.path.join(root, "json"))))
-        self.box = list(sorted(os.listdir(os.path.join(root, "npy"))))
+        img, scale = read_image(img_path, self.target_size)
+        if self.image_cache is not None:
+            self.image_cache.put(idx, img.permute(1, 2, 0).numpy(), scale)
+        return img, scale
 
     def __getitem__(self, idx):
-        img_path = os.path.join(self.root, "png", self.imgs[idx])
-        img = Image.open(img_path).convert("RGB")
-
-        label_path = os.path.join(self.root, "json", self.label[idx])
-
-        with open(os.path.join("root", label_path), "r") as json_data:
-            json_labels = json.load(json_data)
-
-        box_path = os.path.join(self.root, "npy", self.box[idx])
-        dat = np.load(str(box_path))
-
-        boxes = []
-        labels = []
-        for i in dat:
-            obj_val = i[0]
-            xmin = torch.as_tensor(np.min(i[1]), dtype=torch.float32)
-            xmax = torch.as_tensor(np.max(i[3]), dtype=torch.float32)
-            ymin = torch.as_tensor(np.min(i[2]), dtype=torch.float32)
-            ymax = torch.as_tensor(np.max(i[4]), dtype=torch.float32)
-            if (ymax > ymin) & (xmax > xmin):
-                boxes.append([xmin, ymin, xmax, ymax])
-                area = (xmax - xmin) * (ymax - ymin)
-            labels += [json_labels.get(str(obj_val)).get("class")]
-
-        label_dict = {}
-
-        static_labels = {
-            "apple": 0,
-            "avocado": 1,
-            "kiwi": 2,
-            "lime": 3,
-            "lychee": 4,
-            "pomegranate": 5,
-            "onion": 6,
-            "strawberry": 7,
-            "lemon": 8,
-            "orange": 9,
-        }
-
-        labels_out = []
-
-        for i in range(len(labels)):
-            label_dict[i] = labels[i]
-
-        for i in label_dict:
-            fruit = label_dict[i]
-            final_fruit_label = static_labels[fruit]
-            labels_out += [final_fruit_label]
-
-        target = {}
-        target["boxes"] = torch.as_tensor(boxes, dtype=torch.float32)
-        target["labels"] = torch.as_tensor(labels_out, dtype=torch.int64)
-        target["image_id"] = torch.tensor([idx])
-        target["area"] = area
+        img_path, box_path, label_path = frame_paths(self.root, self.frames[idx])
+        img, scale = self.load_image(idx, img_path)
+
+        if self.box_store is not None:
+            boxes, labels = self.box_store[idx]
+        else:
+            boxes, labels = read_frame_boxes(box_path, label_path)
+
+        target = make_target(scale_boxes(boxes, scale), labels, idx)
 
         if self.transforms is not None:
             img = self.transforms(img)
         return img, target
 
     def __len__(self):
-        return len(self.imgs)
+        return len(self.frames)
 
 
 """
@@ -156,79 +172,574 @@ def parse_input():
         dest="epochs",
         help="Give number of epochs to be used for training",
     )
+    parser.add_option(
+        "-b",
+        "--batch_size",
+        dest="batch_size",
+        type="int",
+        default=16,
+        help="Number of images per batch",
+    )
+    parser.add_option(
+        "--arch",
+        dest="arch",
+        type="choice",
+        choices=list(ARCHITECTURES),
+        default=DEFAULT_ARCH,
+        help="Detector architecture: " + ", ".join(ARCHITECTURES),
+    )
+    parser.add_option(
+        "--target_size",
+        dest="target_size",
+        type="int",
+        help="Downscale frames in the data workers so the longer side is this many pixels, the model input size is set to match",
+    )
+    parser.add_option(
+        "--compile",
+        dest="compile",
+        action="store_true",
+        default=False,
+        help="Compile the backbone and heads with torch.compile, submodules that fail to compile run eagerly",
+    )
+    parser.add_option(
+        "--compile_mode",
+        dest="compile_mode",
+        type="choice",
+        choices=COMPILE_MODES,
+        default="default",
+        help="torch.compile mode: " + ", ".join(COMPILE_MODES),
+    )
+    parser.add_option(
+        "--precision",
+        dest="precision",
+        type="choice",
+        choices=list(PRECISIONS),
+        default="fp32",
+        help="Run forward passes under autocast in fp32, bf16 or fp16 (fp16 needs CUDA)",
+    )
+    parser.add_option(
+        "--memory_format",
+        dest="memory_format",
+        type="choice",
+        choices=list(MEMORY_FORMATS),
+        default="contiguous",
+        help="Memory format of the model weights and activations",
+    )
+    parser.add_option(
+        "--backend",
+        dest="backend",
+        type="choice",
+        choices=["nccl", "gloo"],
+        help="torch.distributed backend when launched with torchrun (default nccl with CUDA, else gloo)",
+    )
+    parser.add_option(
+        "--eval_every",
+        dest="eval_every",
+        type="int",
+        default=1,
+        help="Compute mAP and recall on the validation split every N epochs (0 disables)",
+    )
+    parser.add_option(
+        "--log_every",
+        dest="log_every",
+        type="int",
+        default=20,
+        help="Write losses, step timings and images/sec to TensorBoard every N steps",
+    )
+    parser.add_option(
+        "--profile_steps",
+        dest="profile_steps",
+        help="Record a torch.profiler trace of steps START:END into the TensorBoard log dir",
+    )
+    parser.add_option(
+        "--checkpoint_dir",
+        dest="checkpoint_dir",
+        help="Periodically save model, optimizer, data position and RNG state to this directory",
+    )
+    parser.add_option(
+        "--checkpoint_every",
+        dest="checkpoint_every",
+        type="int",
+        default=500,
+        help="Save a checkpoint every N steps, and at the end of every epoch",
+    )
+    parser.add_option(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        default=False,
+        help="Continue from the checkpoint in checkpoint_dir, including mid-epoch",
+    )
+    parser.add_option(
+        "-s",
+        "--shard_dir",
+        dest="shard_dir",
+        help="Stream training data from tar shards written by shards.py instead of data_dir",
+    )
+    parser.add_option(
+        "--follow",
+        dest="follow",
+        action="store_true",
+        default=False,
+        help="Train while data_dir is still being written, sampling from the frames finished so far",
+    )
+    parser.add_option(
+        "--samples_per_epoch",
+        dest="samples_per_epoch",
+        type="int",
+        default=1000,
+        help="Number of frames drawn per epoch with --follow",
+    )
+    parser.add_option(
+        "--bucket",
+        dest="bucket",
+        action="store_true",
+        default=False,
+        help="Batch frames of similar aspect ratio and box count together",
+    )
+    parser.add_option(
+        "--sampling",
+        dest="sampling",
+        type="choice",
+        choices=SAMPLING_MODES,
+        help="Draw frames weighted by class rarity (balanced) or box count (boxes) instead of uniformly",
+    )
+    parser.add_option(
+        "--empty_weight",
+        dest="empty_weight",
+        type="float",
+        default=0.1,
+        help="Sampling weight of frames without boxes relative to the mean, with --sampling",
+    )
+    parser.add_option(
+        "--head_only",
+        dest="head_only",
+        action="store_true",
+        default=False,
+        help="Keep the backbone frozen and train only the RPN and ROI heads on cached features",
+    )
+    parser.add_option(
+        "--feature_cache",
+        dest="feature_cache",
+        help="Directory for the backbone feature cache used by --head_only, index/feature_cache/ in data_dir "
+        "by default, about 14 MB of int8 features per 1024x1024 frame",
+    )
+    parser.add_option(
+        "--image_cache",
+        dest="image_cache",
+        help="Keep decoded images in a memory-mapped cache in this local directory",
+    )
+    parser.add_option(
+        "--image_cache_gb",
+        dest="image_cache_gb",
+        type="float",
+        default=64.0,
+        help="Disk budget of the image cache in GB",
+    )
+    parser.add_option(
+        "--image_cache_policy",
+        dest="image_cache_policy",
+        type="choice",
+        choices=CACHE_POLICIES,
+        default="static",
+        help="static keeps the first frames that fit, direct replaces frames sharing a slot",
+    )
     (options, args) = parser.parse_args()
     return options, args
 
 
 def get_transform(train):
+    # images stay uint8 until prepare_images converts whole batches on the device
     transforms = []
-    transforms.append(T.PILToTensor())
-    transforms.append(T.ConvertImageDtype(torch.float))
     return T.Compose(transforms)
 
 
-def collate_fn(batch):
-    return tuple(zip(*batch))
+def create_image_cache(dataset, options):
+    img_path = frame_paths(dataset.root, dataset.frames[0])[0]
+    width, height = scaled_size(*Image.open(img_path).size, dataset.target_size)
+    return ImageCache(
+        options.image_cache,
+        len(dataset),
+        (height, width, 3),
+        int(options.image_cache_gb * 1024**3),
+        options.image_cache_policy,
+        key=f"{os.path.abspath(dataset.root)}:{dataset.target_size}",
+    )
+
+
+def set_epoch(data_loader, epoch):
+    for obj in (
+        data_loader.dataset,
+        data_loader.batch_sampler,
+        getattr(data_loader.batch_sampler, "sampler", None),
+    ):
+        if hasattr(obj, "set_epoch"):
+            obj.set_epoch(epoch)
 
 
-def create_model(num_classes):
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(weights="DEFAULT")
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+def unwrap_model(model):
+    if isinstance(model, torch.nn.parallel.DistributedDataParallel):
+        model = model.module
+    if isinstance(model, CachedFeatureHeads):
+        model = model.model
     return model
 
 
-def main():
-    writer = SummaryWriter()
-    options, args = parse_input()
-    dataset = FruitDataset(options.data_dir, get_transform(train=True))
+def to_device(obj, device):
+    if isinstance(obj, dict):
+        return {k: to_device(v, device) for k, v in obj.items()}
+    return obj.to(device, non_blocking=True)
 
-    train_size = int(len(dataset) * 0.7)
-    valid_size = int(len(dataset) * 0.2)
-    test_size = len(dataset) - valid_size - train_size
 
-    train, valid, test = torch.utils.data.random_split(
-        dataset, [train_size, valid_size, test_size]
-    )
+def collate_fn(batch):
+    return tuple(zip(*batch))
 
-    data_loader = torch.utils.data.DataLoader(
-        dataset, batch_size=16, shuffle=True, num_workers=4, collate_fn=collate_fn
+
+def autocast(device, precision):
+    if PRECISIONS[precision] is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=PRECISIONS[precision])
+
+
+def create_grad_scaler(precision):
+    # fp16 gradients underflow without loss scaling, bf16 has the range of fp32
+    enabled = precision == "fp16"
+    # torch.cuda.amp.GradScaler is deprecated in newer PyTorch, the 22.07 container only has that one
+    if hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler("cuda", enabled=enabled)
+    return torch.cuda.amp.GradScaler(enabled=enabled)
+
+
+def train_one_epoch(
+    model,
+    optimizer,
+    scaler,
+    data_loader,
+    device,
+    epoch,
+    precision,
+    logger,
+    profiler,
+    start_step=0,
+    on_step=None,
+):
+    # map-style loaders skip already trained batches in the sampler, iterable ones read and drop them
+    skip = start_step
+    if isinstance(data_loader.batch_sampler, ResumableBatchSampler):
+        data_loader.batch_sampler.skip, skip = start_step, 0
+    i = start_step
+    for imgs, annotations in data_loader:
+        if skip > 0:
+            skip -= 1
+            continue
+        i += 1
+        logger.start_step()
+        if torch.is_tensor(imgs[0]):
+            imgs = prepare_images(imgs, device)
+        else:
+            # cached backbone features for head-only training
+            imgs = [to_device(img, device) for img in imgs]
+        annotations = [to_device(t, device) for t in annotations]
+        logger.mark()
+        optimizer.zero_grad()
+        with autocast(device, precision):
+            loss_dict = model(imgs, annotations)
+            losses = sum(loss for loss in loss_dict.values())
+        logger.mark()
+
+        scaler.scale(losses).backward()
+        logger.mark()
+        scaler.step(optimizer)
+        scaler.update()
+        logger.mark()
+
+        logger.end_step(loss_dict, len(imgs), epoch, i)
+        profiler.step()
+        if on_step is not None:
+            on_step(epoch, i)
+    logger.flush(epoch, i)
+
+
+def validate(model, validloader, device, epoch, options, writer):
+    # the validation split is small enough to evaluate on rank 0 alone
+    if is_main_process():
+        start = time.perf_counter()
+        with autocast(device, options.precision):
+            metrics = evaluate(unwrap_model(model), validloader, device, NUM_CLASSES)
+        for name, value in metrics.items():
+            writer.add_scalar(f"Validation/{name}", value, epoch)
+        summary = ", ".join(f"{name}: {value:.4f}" for name, value in metrics.items())
+        print(f"Epoch: {epoch}, {summary} ({time.perf_counter() - start:.1f}s)")
+    if is_distributed():
+        torch.distributed.barrier()
+
+
+def split_dataset(dataset):
+    return [
+        torch.utils.data.Subset(dataset, indices)
+        for indices in split_indices(len(dataset))
+    ]
+
+
+def create_data_loaders(options, rank, world_size, pin_memory=False):
+    # a directory that is still being written has no fixed validation split
+    train, validloader = None, None
+    if options.data_dir and not options.follow:
+        dataset = FruitDataset(
+            options.data_dir,
+            get_transform(train=True),
+            target_size=options.target_size,
+        )
+        if options.image_cache:
+            dataset.image_cache = create_image_cache(dataset, options)
+        train, valid, test = split_dataset(dataset)
+        validloader = torch.utils.data.DataLoader(
+            valid,
+            batch_size=options.batch_size,
+            num_workers=4,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory,
+        )
+
+    if options.shard_dir:
+        dataset = ShardedFruitDataset(
+            options.shard_dir,
+            get_transform(train=True),
+            target_size=options.target_size,
+        )
+        if validloader is not None and dataset.split != "train":
+            raise ValueError(
+                f"{options.shard_dir} holds {dataset.split} frames, including the validation split of "
+                f"{options.data_dir}; pack it with shards.py --split train or leave out -d"
+            )
+        data_loader = torch.utils.data.DataLoader(
+            dataset,
+            batch_size=options.batch_size,
+            num_workers=4,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory,
+        )
+    elif options.follow:
+        dataset = LiveFruitDataset(
+            options.data_dir,
+            get_transform(train=True),
+            samples_per_epoch=options.samples_per_epoch,
+            target_size=options.target_size,
+        )
+        data_loader = torch.utils.data.DataLoader(
+            dataset,
+            batch_size=options.batch_size,
+            num_workers=4,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory,
+        )
+    else:
+        if options.bucket and options.sampling:
+            raise ValueError("--bucket and --sampling cannot be combined")
+        if options.bucket:
+            batch_sampler = BucketBatchSampler(
+                load_frame_metadata(dataset),
+                options.batch_size,
+                indices=train.indices,
+                num_replicas=world_size,
+                rank=rank,
+            )
+        elif options.sampling:
+            weights = frame_weights(
+                load_class_histogram(dataset), options.sampling, options.empty_weight
+            )
+            sampler = WeightedFrameSampler(
+                weights, indices=train.indices, num_replicas=world_size, rank=rank
+            )
+            batch_sampler = torch.utils.data.BatchSampler(
+                sampler, options.batch_size, drop_last=False
+            )
+        else:
+            # sample positions in the train subset, mapped back to dataset indices
+            sampler = torch.utils.data.DistributedSampler(
+                train, num_replicas=world_size, rank=rank, shuffle=True
+            )
+            batch_sampler = torch.utils.data.BatchSampler(
+                sampler, options.batch_size, drop_last=False
+            )
+            dataset = train
+        data_loader = torch.utils.data.DataLoader(
+            dataset,
+            batch_sampler=ResumableBatchSampler(batch_sampler),
+            num_workers=4,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory,
+        )
+    return data_loader, validloader, train
+
+
+def create_feature_loader(options, model, device, rank, world_size, train):
+    cache_dir = options.feature_cache or index_path(options.data_dir, "feature_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    # the first rank to take the lock builds the cache, the others wait on the lock rather than in a
+    # barrier, so a long build does not run into the process group timeout
+    with open(os.path.join(cache_dir, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not is_cache_valid(cache_dir, model, train):
+            print(f"Caching backbone features in {cache_dir}")
+            data_loader = torch.utils.data.DataLoader(
+                train,
+                batch_size=options.batch_size,
+                num_workers=4,
+                collate_fn=collate_fn,
+            )
+            build_feature_cache(model, data_loader, cache_dir, device)
+
+    dataset = FeatureCacheDataset(cache_dir)
+    sampler = torch.utils.data.DistributedSampler(
+        dataset, num_replicas=world_size, rank=rank, shuffle=True
     )
-    validloader = torch.utils.data.DataLoader(
-        valid, batch_size=16, shuffle=True, num_workers=4, collate_fn=collate_fn
+    return torch.utils.data.DataLoader(
+        dataset,
+        batch_sampler=ResumableBatchSampler(
+            torch.utils.data.BatchSampler(sampler, options.batch_size, drop_last=False)
+        ),
+        num_workers=4,
+        collate_fn=collate_fn,
+        pin_memory=device.type == "cuda",
     )
 
-    device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
 
-    num_classes = 10
-    num_epochs = int(options.epochs)
-    model = create_model(num_classes)
+"""
+Rejects options that --head_only would otherwise ignore: it trains from the feature cache in a plain shuffled
+order, so the frame samplers and the image cache never come into play.
+"""
 
-    model.to(device)
 
-    params = [p for p in model.parameters() if p.requires_grad]
-    optimizer = torch.optim.SGD(params, lr=0.001)
-    len_dataloader = len(data_loader)
-    model.train()
-    for epoch in range(num_epochs):
-        optimizer.zero_grad()
+def check_head_only(options):
+    if options.follow or options.shard_dir:
+        # the cache holds a fixed train split of data_dir, which streamed data does not have
+        raise ValueError("--head_only needs -d without --follow or -s")
+    ignored = [
+        flag
+        for flag, value in [
+            ("--bucket", options.bucket),
+            ("--sampling", options.sampling),
+            ("--image_cache", options.image_cache),
+        ]
+        if value
+    ]
+    if ignored:
+        raise ValueError(f"--head_only cannot be combined with {', '.join(ignored)}")
+    if options.arch not in TWO_STAGE_ARCHS:
+        raise ValueError(f"--head_only needs one of {', '.join(TWO_STAGE_ARCHS)}")
 
-        i = 0
-        for imgs, annotations in data_loader:
-            i += 1
-            imgs = list(img.to(device) for img in imgs)
-            annotations = [{k: v.to(device) for k, v in t.items()} for t in annotations]
-            loss_dict = model(imgs, annotations)
-            losses = sum(loss for loss in loss_dict.values())
-            writer.add_scalar("Loss/train", losses, epoch)
 
-            losses.backward()
-            optimizer.step()
+def main():
+    options, args = parse_input()
+    rank, world_size, device = init_distributed(options.backend)
+    writer = SummaryWriter() if is_main_process() else None
+    if options.head_only:
+        check_head_only(options)
+    data_loader, validloader, train = create_data_loaders(
+        options, rank, world_size, pin_memory=device.type == "cuda"
+    )
 
-            print(f"Iteration: {i}/{len_dataloader}, Loss: {losses}")
+    num_classes = NUM_CLASSES
+    num_epochs = int(options.epochs)
+    model = create_model(options.arch, num_classes, image_size=options.target_size)
+
+    if options.precision == "fp16" and device.type != "cuda":
+        raise ValueError("fp16 training needs a CUDA device, use bf16 on CPU")
+    memory_format = MEMORY_FORMATS[options.memory_format]
+    model.to(device, memory_format=memory_format)
+    if options.head_only:
+        data_loader = create_feature_loader(
+            options, model, device, rank, world_size, train
+        )
+        model = CachedFeatureHeads(model, data_loader.dataset.padded_size)
+    if options.compile:
+        names = compile_model(unwrap_model(model), options.compile_mode)
+        if is_main_process():
+            print(f"Compiling {', '.join(names)}")
+    scaler = create_grad_scaler(options.precision)
 
-    writer.close()
-    torch.save(model, options.output_file)
+    params = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.SGD(params, lr=0.001)
+    if world_size > 1:
+        device_ids = [device.index] if device.type == "cuda" else None
+        model = torch.nn.parallel.DistributedDataParallel(model, device_ids=device_ids)
+    # streamed datasets end a partial batch per worker, so their batch count is not known up front
+    len_dataloader = None
+    if not isinstance(data_loader.dataset, torch.utils.data.IterableDataset):
+        len_dataloader = len(data_loader)
+    logger = TrainingLogger(writer, device, options.log_every, len_dataloader)
+
+    start_epoch, start_step = 0, 0
+    checkpointer = None
+    if options.checkpoint_dir:
+        state = None
+        if options.resume:
+            state = load_checkpoint(options.checkpoint_dir, torch.device("cpu"))
+        if state is not None:
+            unwrap_model(model).load_state_dict(state["model"])
+            optimizer.load_state_dict(state["optimizer"])
+            load_scaler_state(scaler, state["scaler"])
+            set_rng_state(state["rng"])
+            start_epoch, start_step = state["epoch"], state["step"]
+            logger.global_step = state["global_step"]
+            if is_main_process():
+                print(f"Resuming from epoch {start_epoch}, step {start_step}")
+        if is_main_process():
+            checkpointer = AsyncCheckpointer(options.checkpoint_dir)
+
+    def save_checkpoint(epoch, step):
+        if checkpointer is not None:
+            checkpointer.save(
+                snapshot(
+                    unwrap_model(model),
+                    optimizer,
+                    scaler,
+                    epoch,
+                    step,
+                    logger.global_step,
+                )
+            )
+
+    def on_step(epoch, step):
+        if step % options.checkpoint_every == 0:
+            save_checkpoint(epoch, step)
+
+    profile_start, profile_end = None, None
+    if options.profile_steps and is_main_process():
+        profile_start, profile_end = map(int, options.profile_steps.split(":"))
+    log_dir = writer.log_dir if is_main_process() else None
+    model.train()
+    with create_profiler(log_dir, profile_start, profile_end, device) as profiler:
+        for epoch in range(start_epoch, num_epochs):
+            set_epoch(data_loader, epoch)
+            train_one_epoch(
+                model,
+                optimizer,
+                scaler,
+                data_loader,
+                device,
+                epoch,
+                options.precision,
+                logger,
+                profiler,
+                start_step=start_step if epoch == start_epoch else 0,
+                on_step=on_step,
+            )
+            save_checkpoint(epoch + 1, 0)
+            if validloader is not None and options.eval_every > 0:
+                if (epoch + 1) % options.eval_every == 0:
+                    validate(model, validloader, device, epoch, options, writer)
+
+    if checkpointer is not None:
+        checkpointer.close()
+    if is_main_process():
+        writer.close()
+        failures = compile_failures(unwrap_model(model))
+        if failures:
+            print(f"Ran eagerly after failing to compile: {', '.join(failures)}")
+        torch.save(uncompile(unwrap_model(model)), options.output_file)
+    cleanup()
 
 
 if __name__ == "__main__":
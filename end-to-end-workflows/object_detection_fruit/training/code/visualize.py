@@ -37,7 +37,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from optparse import OptionParser
-
+from manifest import load_manifest, frame_paths
 
 """
 Takes in the data from a specific label id and maps it to the proper color for the bounding box
@@ -120,19 +120,17 @@ def parse_input():
 
 def main():
     options, args = parse_input()
-    out_dir = options.data_dir
-    rgb = "png/rgb_" + options.number + ".png"
-    rgb_path = os.path.join(out_dir, rgb)
-    bbox2d_tight_file_name = "npy/bounding_box_2d_tight_" + options.number + ".npy"
-    data = np.load(os.path.join(options.data_dir, bbox2d_tight_file_name))
+    frames = load_manifest(options.data_dir)
+    row = frames[frames["frame"] == int(options.number)]
+    if len(row) == 0:
+        raise ValueError(f"Frame {options.number} not found in {options.data_dir}")
+    rgb_path, bbox2d_tight_path, bbox2d_tight_labels_path = frame_paths(
+        options.data_dir, row[0]
+    )
+    data = np.load(bbox2d_tight_path)
 
     # Check for labels
-    bbox2d_tight_labels_file_name = (
-        "json/bounding_box_2d_tight_labels_" + options.number + ".json"
-    )
-    with open(
-        os.path.join(options.data_dir, bbox2d_tight_labels_file_name), "r"
-    ) as json_data:
+    with open(bbox2d_tight_labels_path, "r") as json_data:
         bbox2d_tight_id_to_labels = json.load(json_data)
 
     # colorize and save image
@@ -18,6 +18,12 @@
 
 ONNX_PATH=${1:-'pallet_model_v1.onnx'}
 OUTPUT_PATH=${2:-'pallet_model_v1.engine'}
+# optional TensorRT calibration cache of this model. Without it TensorRT builds with placeholder INT8 ranges.
+CALIB_PATH=${3:-''}
+CALIB_ARG=''
+if [ -n "$CALIB_PATH" ]; then
+  CALIB_ARG="--calib=$CALIB_PATH"
+fi
 
 /usr/src/tensorrt/bin/trtexec \
   --onnx=$ONNX_PATH \
@@ -25,4 +31,4 @@ OUTPUT_PATH=${2:-'pallet_model_v1.engine'}
   --maxShapes=input:1x3x1536x1536 \
   --optShapes=input:1x3x256x256 \
   --saveEngine=$OUTPUT_PATH \
-  --int8
+  --int8 $CALIB_ARG